@@ -0,0 +1,45 @@
+"""Production runner: gunicorn master with uvicorn workers.
+
+    cd backend && gunicorn -c gunicorn.conf.py
+
+The app is imported and its models are loaded once in the master before any worker
+is forked, so spaCy, sklearn and the parsers are shared copy-on-write between workers
+instead of being loaded once per worker. Send HUP to the master to replace workers
+gracefully; with a preloaded app, code changes need USR2 to re-exec the master and
+then QUIT to the old one.
+
+Metrics, caches and the stats endpoint remain per worker.
+"""
+import gc
+import multiprocessing
+import os
+
+wsgi_app = 'server:app'
+worker_class = 'uvicorn.workers.UvicornWorker'
+bind = os.environ.get('WEB_BIND', '0.0.0.0:8001')
+workers = int(os.environ.get('WEB_CONCURRENCY', str(multiprocessing.cpu_count())))
+# Recycle workers after this many requests (plus jitter, so they do not all restart at
+# once) to bound slow leaks in native parsers; 0 disables recycling
+max_requests = int(os.environ.get('WEB_MAX_REQUESTS', '1000'))
+max_requests_jitter = int(os.environ.get('WEB_MAX_REQUESTS_JITTER', '100'))
+# Seconds a worker gets to finish in-flight requests on reload or shutdown
+graceful_timeout = int(os.environ.get('WEB_GRACEFUL_TIMEOUT', '30'))
+timeout = int(os.environ.get('WEB_TIMEOUT', '120'))
+keepalive = int(os.environ.get('WEB_KEEPALIVE', '5'))
+preload_app = True
+
+# Split the cores between the workers' CPU pools unless a size is set explicitly
+os.environ.setdefault('CPU_POOL_WORKERS', str(max(1, multiprocessing.cpu_count() // max(1, workers))))
+
+def when_ready(server):
+    """Load every model in the master so forked workers share the pages."""
+    import server as app_module
+    components = app_module.warm_up_components()
+    server.log.info(f"Preloaded models in master: {components}")
+    # Run a full collection now so the frozen heap holds no garbage
+    gc.collect()
+
+def pre_fork(server, worker):
+    # Move everything allocated so far out of the collector's reach; otherwise the
+    # first collection in a worker touches every object and unshares its page
+    gc.freeze()
@@ -1,26 +1,76 @@
-from fastapi import FastAPI, APIRouter, UploadFile, File, Form, HTTPException
+from fastapi import FastAPI, APIRouter, UploadFile, File, Form, HTTPException, Query, Depends
+from fastapi.responses import JSONResponse, StreamingResponse, PlainTextResponse, ORJSONResponse
+from starlette.datastructures import MutableHeaders
 from dotenv import load_dotenv
 from starlette.middleware.cors import CORSMiddleware
 from motor.motor_asyncio import AsyncIOMotorClient
+from pymongo import UpdateOne
+from pymongo.errors import BulkWriteError
 import os
 import logging
 from pathlib import Path
 from pydantic import BaseModel, Field
-from typing import List, Optional, Dict, Any
+from typing import Callable, List, Optional, Dict, Any, Tuple, Union
 import uuid
-from datetime import datetime
+import json
+import base64
+import bisect
+import functools
+import contextvars
+import time
+import hashlib
+from collections import OrderedDict, deque
+from datetime import datetime, timedelta
 import asyncio
 import io
-import PyPDF2
-import docx
-import pytesseract
-from PIL import Image
-import spacy
+import mmap
+import tempfile
+import zipfile
+import zlib
+import threading
+from contextlib import asynccontextmanager, contextmanager
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+import importlib
 import numpy as np
-from sklearn.feature_extraction.text import TfidfVectorizer
-from sklearn.metrics.pairwise import cosine_similarity
 import re
-from emergentintegrations.llm.chat import LlmChat, UserMessage
+
+class LazyModule:
+    """Stand-in for a module that imports it on first attribute access.
+    
+    on_load, if given, is called with the module once it has been imported.
+    """
+    def __init__(self, name: str, on_load=None):
+        self._name = name
+        self._on_load = on_load
+        self._module = None
+        self._lock = threading.Lock()
+
+    def _import(self):
+        if self._module is None:
+            with self._lock:
+                if self._module is None:
+                    module = importlib.import_module(self._name)
+                    if self._on_load:
+                        self._on_load(module)
+                    self._module = module
+        return self._module
+
+    def __getattr__(self, attr: str):
+        return getattr(self._import(), attr)
+
+# Heavy dependencies are imported on first use, so the app binds before they load;
+# warm_up_components imports them all in the background after startup. sklearn is
+# imported inside the functions that use it.
+PyPDF2 = LazyModule('PyPDF2')
+docx = LazyModule('docx')
+pytesseract = LazyModule('pytesseract')
+# Let PIL's own decompression-bomb check use the same limit as open_image
+Image = LazyModule('PIL.Image', on_load=lambda module: setattr(module, 'MAX_IMAGE_PIXELS', MAX_IMAGE_PIXELS))
+ImageOps = LazyModule('PIL.ImageOps')
+spacy = LazyModule('spacy')
+llm_chat = LazyModule('emergentintegrations.llm.chat')
 
 ROOT_DIR = Path(__file__).parent
 load_dotenv(ROOT_DIR / '.env')
@@ -31,21 +81,42 @@ client = AsyncIOMotorClient(mongo_url)
 db = client[os.environ['DB_NAME']]
 
 # Create the main app without a prefix
-app = FastAPI()
+app = FastAPI(default_response_class=ORJSONResponse)
 
 # Create a router with the /api prefix
 api_router = APIRouter(prefix="/api")
 
-# Load spaCy model for NLP
-try:
-    nlp = spacy.load("en_core_web_sm")
-except OSError:
-    nlp = None
+# spaCy settings. Only named entities are consumed, so components that do not
+# feed the NER output are excluded when the model is loaded.
+SPACY_MODEL = os.environ.get('SPACY_MODEL', 'en_core_web_sm')
+SPACY_EXCLUDE = [
+    component.strip()
+    for component in os.environ.get('SPACY_EXCLUDE', 'tagger,parser,attribute_ruler,lemmatizer,senter').split(',')
+    if component.strip()
+]
+SPACY_BATCH_SIZE = int(os.environ.get('SPACY_BATCH_SIZE', '16'))
+SPACY_N_PROCESS = int(os.environ.get('SPACY_N_PROCESS', '1'))
+
+# Skill taxonomy shared by both entity extractors; edits to the file are picked up
+# without a restart
+SKILL_TAXONOMY_PATH = os.environ.get('SKILL_TAXONOMY_PATH', str(ROOT_DIR / 'data' / 'skill_taxonomy.json'))
+SKILL_TAXONOMY_RELOAD_INTERVAL = float(os.environ.get('SKILL_TAXONOMY_RELOAD_INTERVAL', '30'))
+
+# Job match scoring uses IDF weights learned from every analyzed resume and job
+# description. Document frequencies are refit on a schedule and published as a snapshot
+# file that the server and CPU pool workers reload. The snapshot holds the
+# CORPUS_IDF_MAX_TERMS most frequent terms; counts for all terms stay in MongoDB.
+CORPUS_IDF_PATH = os.environ.get('CORPUS_IDF_PATH', os.path.join(tempfile.gettempdir(), 'resume_corpus_idf.json'))
+CORPUS_IDF_RELOAD_INTERVAL = float(os.environ.get('CORPUS_IDF_RELOAD_INTERVAL', '10'))
+CORPUS_IDF_REFIT_INTERVAL = float(os.environ.get('CORPUS_IDF_REFIT_INTERVAL', '300'))
+CORPUS_IDF_MIN_DOCUMENTS = int(os.environ.get('CORPUS_IDF_MIN_DOCUMENTS', '50'))
+CORPUS_IDF_MAX_TERMS = int(os.environ.get('CORPUS_IDF_MAX_TERMS', '100000'))
+CORPUS_IDF_MAX_PENDING = int(os.environ.get('CORPUS_IDF_MAX_PENDING', '1000'))
 
 # Models
-class ResumeAnalysis(BaseModel):
+class AnalysisSummary(BaseModel):
     id: str = Field(default_factory=lambda: str(uuid.uuid4()))
-    extracted_text: str
+    filename: Optional[str] = None
     skills: List[str]
     experience: List[str]
     education: List[str]
@@ -53,88 +124,1643 @@ class ResumeAnalysis(BaseModel):
     job_match_score: float
     suggestions: List[str]
     processing_time: float
+    file_hash: Optional[str] = None
+    cache_hit: bool = False
+    job_id: Optional[str] = None
+    tier: Optional[str] = None
+    near_duplicate_of: Optional[str] = None
+    near_duplicate_similarity: Optional[float] = None
+    stage_timings: Optional[Dict[str, float]] = None
     timestamp: datetime = Field(default_factory=datetime.utcnow)
 
+class ResumeAnalysis(AnalysisSummary):
+    extracted_text: str
+
+class AnalysisPage(BaseModel):
+    items: List[AnalysisSummary]
+    next_cursor: Optional[str] = None
+
 class AnalysisRequest(BaseModel):
     job_description: str
 
+class AnalysisJob(BaseModel):
+    id: str
+    status: str
+    filename: Optional[str] = None
+    created_at: datetime
+    updated_at: datetime
+    result: Optional[ResumeAnalysis] = None
+    error: Optional[str] = None
+
+class RankedResume(BaseModel):
+    rank: int
+    id: str
+    filename: Optional[str] = None
+    job_match_score: float
+
+class BatchFileError(BaseModel):
+    filename: Optional[str] = None
+    detail: str
+
+class BatchResumeAnalysis(BaseModel):
+    results: List[ResumeAnalysis]
+    ranking: List[RankedResume]
+    errors: List[BatchFileError] = []
+    processing_time: float
+
+SUPPORTED_EXTENSIONS = ['pdf', 'docx', 'txt', 'jpg', 'jpeg', 'png']
+
+# Limit concurrent LLM calls made by the batch endpoint
+BATCH_LLM_CONCURRENCY = int(os.environ.get('BATCH_LLM_CONCURRENCY', '8'))
+
+# CPU-bound pipeline stages run in a process pool so the event loop stays responsive.
+# A pool size of 0 runs them on the default thread executor instead.
+CPU_POOL_WORKERS = int(os.environ.get('CPU_POOL_WORKERS', str(os.cpu_count() or 1)))
+CPU_POOL_START_METHOD = os.environ.get('CPU_POOL_START_METHOD') or None
+# A task that outlives CPU_TASK_TIMEOUT keeps its worker busy, so the pool is replaced and
+# the old one's workers are terminated once every task submitted to it has timed out.
+CPU_TASK_TIMEOUT = float(os.environ.get('CPU_TASK_TIMEOUT', '60'))
+
+cpu_pool: Optional[ProcessPoolExecutor] = None
+
+# Bump when extraction or entity parsing changes so stale cache entries are not reused
+EXTRACTOR_VERSION = "5"
+EXTRACTION_CACHE_SIZE = int(os.environ.get('EXTRACTION_CACHE_SIZE', '512'))
+EXTRACTION_CACHE_TTL = int(os.environ.get('EXTRACTION_CACHE_TTL', '604800'))
+
+# Near-duplicate detection. Extracted text is MinHashed over word shingles and looked up
+# in an LSH band index; a resume whose estimated Jaccard similarity to an earlier one is
+# at least NEAR_DUPLICATE_THRESHOLD reuses that resume's entities and, for the same job
+# description, its suggestions. With 8 bands of 8 rows, a pair shares a band with
+# probability 1 - (1 - s^8)^8: about 0.99 at s = 0.9, 0.92 at 0.85 and 0.65 at 0.77, so
+# thresholds much below 0.85 miss many true matches.
+NEAR_DUPLICATE_ENABLED = os.environ.get('NEAR_DUPLICATE_ENABLED', 'true').lower() == 'true'
+NEAR_DUPLICATE_THRESHOLD = float(os.environ.get('NEAR_DUPLICATE_THRESHOLD', '0.9'))
+NEAR_DUPLICATE_NUM_PERM = 64
+NEAR_DUPLICATE_BANDS = 8
+NEAR_DUPLICATE_SHINGLE_SIZE = 3
+NEAR_DUPLICATE_MIN_SHINGLES = int(os.environ.get('NEAR_DUPLICATE_MIN_SHINGLES', '20'))
+# Signatures added by other server processes are picked up this often
+NEAR_DUPLICATE_SYNC_INTERVAL = float(os.environ.get('NEAR_DUPLICATE_SYNC_INTERVAL', '30'))
+
+# LLM feedback settings. Bump FEEDBACK_PROMPT_VERSION when the prompt changes so
+# cached suggestions are regenerated.
+LLM_PROVIDER = os.environ.get('LLM_PROVIDER', 'openai')
+LLM_MODEL = os.environ.get('LLM_MODEL', 'gpt-4o-mini')
+FEEDBACK_PROMPT_VERSION = "2"
+# Suggestions come from the local keyword-gap engine; full-tier analyses have the LLM
+# refine them 'always', 'never', or when 'sparse', only when the engine found fewer than
+# LLM_REFINEMENT_MIN_FINDINGS job-specific gaps.
+LLM_REFINEMENT_MODE = os.environ.get('LLM_REFINEMENT_MODE', 'sparse')
+LLM_REFINEMENT_MIN_FINDINGS = int(os.environ.get('LLM_REFINEMENT_MIN_FINDINGS', '3'))
+FEEDBACK_CACHE_SIZE = int(os.environ.get('FEEDBACK_CACHE_SIZE', '1024'))
+FEEDBACK_CACHE_TTL = int(os.environ.get('FEEDBACK_CACHE_TTL', '86400'))
+
+# Background analysis jobs (POST /api/analyze-resume?async=true). A running job whose
+# lease has expired is assumed to belong to a dead worker and is picked up again, so
+# the worker running it renews the lease every JOB_LEASE_SECONDS / 3 and only the
+# current lease holder may store the outcome.
+JOB_QUEUE_MAXSIZE = int(os.environ.get('JOB_QUEUE_MAXSIZE', '100'))
+JOB_CONCURRENCY = int(os.environ.get('JOB_CONCURRENCY', '4'))
+JOB_RETENTION_SECONDS = int(os.environ.get('JOB_RETENTION_SECONDS', '86400'))
+JOB_LEASE_SECONDS = int(os.environ.get('JOB_LEASE_SECONDS', '600'))
+
+# Analyses are written behind the response in batches of ANALYSIS_FLUSH_BATCH_SIZE, at
+# least every ANALYSIS_FLUSH_INTERVAL seconds; requests wait once
+# ANALYSIS_WRITE_BUFFER_SIZE documents are pending.
+ANALYSIS_WRITE_BUFFER_SIZE = int(os.environ.get('ANALYSIS_WRITE_BUFFER_SIZE', '1000'))
+ANALYSIS_FLUSH_BATCH_SIZE = int(os.environ.get('ANALYSIS_FLUSH_BATCH_SIZE', '100'))
+ANALYSIS_FLUSH_INTERVAL = float(os.environ.get('ANALYSIS_FLUSH_INTERVAL', '1.0'))
+
+# Upload limits. Request bodies are counted while they stream in and refused with 413 once
+# over the route's cap: MAX_UPLOAD_BYTES (MAX_ARCHIVE_BYTES for archives) plus
+# MULTIPART_OVERHEAD_BYTES on single-file routes, MAX_REQUEST_BYTES elsewhere. Starlette
+# parses the body before the handler runs, so each file's own limit is then checked
+# from its parsed size before it is copied; accepted uploads above the spool threshold
+# are copied to a named temp file that extractors in the pool workers mmap.
+MAX_REQUEST_BYTES = int(os.environ.get('MAX_REQUEST_BYTES', str(200 * 1024 * 1024)))
+MAX_UPLOAD_BYTES = int(os.environ.get('MAX_UPLOAD_BYTES', str(10 * 1024 * 1024)))
+# Room for the job description and multipart framing
+MULTIPART_OVERHEAD_BYTES = int(os.environ.get('MULTIPART_OVERHEAD_BYTES', str(1024 * 1024)))
+MAX_IMAGE_PIXELS = int(os.environ.get('MAX_IMAGE_PIXELS', str(40_000_000)))
+MAX_DOCX_UNCOMPRESSED_BYTES = int(os.environ.get('MAX_DOCX_UNCOMPRESSED_BYTES', str(50 * 1024 * 1024)))
+UPLOAD_SPOOL_THRESHOLD = int(os.environ.get('UPLOAD_SPOOL_THRESHOLD', str(1024 * 1024)))
+UPLOAD_CHUNK_SIZE = 64 * 1024
+UPLOAD_TMP_DIR = os.environ.get('UPLOAD_TMP_DIR') or None
+
+# Archive ingestion. Every member is held to MAX_UPLOAD_BYTES as it inflates, whatever
+# its header claims, and members whose headers promise more than ARCHIVE_MAX_COMPRESSION_RATIO
+# are refused before being read.
+MAX_ARCHIVE_BYTES = int(os.environ.get('MAX_ARCHIVE_BYTES', str(100 * 1024 * 1024)))
+ARCHIVE_MAX_MEMBERS = int(os.environ.get('ARCHIVE_MAX_MEMBERS', '1000'))
+ARCHIVE_MAX_UNCOMPRESSED_BYTES = int(os.environ.get('ARCHIVE_MAX_UNCOMPRESSED_BYTES', str(1024 * 1024 * 1024)))
+ARCHIVE_MAX_COMPRESSION_RATIO = float(os.environ.get('ARCHIVE_MAX_COMPRESSION_RATIO', '100'))
+ARCHIVE_CONCURRENCY = int(os.environ.get('ARCHIVE_CONCURRENCY', '4'))
+
+# Responses at least this large are gzip-compressed for clients that accept it
+GZIP_MINIMUM_SIZE = int(os.environ.get('GZIP_MINIMUM_SIZE', '1024'))
+GZIP_COMPRESS_LEVEL = int(os.environ.get('GZIP_COMPRESS_LEVEL', '6'))
+
+# Admission control for the analysis endpoints, per server process. At most
+# ADMISSION_MAX_IN_FLIGHT analyses run at once and up to ADMISSION_MAX_QUEUE more
+# requests wait, each for at most ADMISSION_QUEUE_TIMEOUT seconds; beyond that requests get
+# 503. A batch takes one slot per file and an archive one per member being analyzed. Each client also has a token bucket refilled at ADMISSION_CLIENT_RATE requests per
+# second holding up to ADMISSION_CLIENT_BURST; an empty bucket gets 429.
+ADMISSION_MAX_IN_FLIGHT = int(os.environ.get('ADMISSION_MAX_IN_FLIGHT', '16'))
+ADMISSION_MAX_QUEUE = int(os.environ.get('ADMISSION_MAX_QUEUE', '64'))
+ADMISSION_QUEUE_TIMEOUT = float(os.environ.get('ADMISSION_QUEUE_TIMEOUT', '15'))
+ADMISSION_CLIENT_RATE = float(os.environ.get('ADMISSION_CLIENT_RATE', '2'))
+ADMISSION_CLIENT_BURST = int(os.environ.get('ADMISSION_CLIENT_BURST', '20'))
+ADMISSION_MAX_CLIENTS = 10000
+# Identify clients by the first X-Forwarded-For address; only enable behind a proxy
+# that sets the header
+ADMISSION_TRUST_FORWARDED_FOR = os.environ.get('ADMISSION_TRUST_FORWARDED_FOR', 'false').lower() == 'true'
+ADMISSION_PATH_PREFIX = '/api/analyze'
+# Multi-file routes acquire their slots in the handler, once the file count is known
+ADMISSION_HANDLER_PATHS = ('/api/analyze-resumes', '/api/analyze-archive')
+
+# Analysis quality tiers: 'full' parses entities with spaCy and lets the LLM refine the
+# suggestions, 'standard' uses regex extraction and local suggestions only, and 'minimal'
+# returns only the text and match score. With tier=auto the tier drops to standard while
+# requests queue for admission or recent full analyses took over QUALITY_STANDARD_LATENCY
+# seconds (90th percentile over QUALITY_LATENCY_WINDOW seconds), and to minimal once the
+# queue is QUALITY_MINIMAL_QUEUE_FRACTION full or they took over QUALITY_MINIMAL_LATENCY.
+QUALITY_TIERS = ('full', 'standard', 'minimal')
+QUALITY_TIER_PATTERN = '^(auto|full|standard|minimal)$'
+QUALITY_STANDARD_LATENCY = float(os.environ.get('QUALITY_STANDARD_LATENCY', '8'))
+QUALITY_MINIMAL_LATENCY = float(os.environ.get('QUALITY_MINIMAL_LATENCY', '20'))
+QUALITY_MINIMAL_QUEUE_FRACTION = float(os.environ.get('QUALITY_MINIMAL_QUEUE_FRACTION', '0.5'))
+QUALITY_LATENCY_WINDOW = float(os.environ.get('QUALITY_LATENCY_WINDOW', '60'))
+
+# PDF extraction. Pages with less text than PDF_OCR_MIN_CHARS are treated as scanned
+# and their embedded page image is OCR'd, on up to PDF_PAGE_WORKERS pages at once but
+# never more than the process's OCR slots (see OCR_WORKERS). With the default CPU pool
+# that is one slot per worker, so pages are OCR'd one after another and parallelism comes
+# from the pool running several documents; raise OCR_WORKERS to OCR pages in parallel.
+PDF_MAX_PAGES = int(os.environ.get('PDF_MAX_PAGES', '20'))
+PDF_OCR_FALLBACK = os.environ.get('PDF_OCR_FALLBACK', 'true').lower() == 'true'
+PDF_OCR_MIN_CHARS = int(os.environ.get('PDF_OCR_MIN_CHARS', '20'))
+PDF_PAGE_WORKERS = int(os.environ.get('PDF_PAGE_WORKERS', '4'))
+
+# OCR settings. OCR_WORKERS bounds the tesseract processes one server process runs at
+# once. OCR happens in the CPU pool workers, so the budget is split between them: each
+# runs at most OCR_WORKERS // CPU_POOL_WORKERS (at least 1), and with gunicorn the host
+# total is that times WEB_CONCURRENCY. Images are deskewed by EXIF, greyscaled,
+# binarised and downscaled to OCR_TARGET_DPI.
+OCR_WORKERS = int(os.environ.get('OCR_WORKERS', str(max(2, CPU_POOL_WORKERS))))
+OCR_WORKERS_PER_PROCESS = max(1, OCR_WORKERS // max(1, CPU_POOL_WORKERS))
+PDF_PAGE_OCR_THREADS = max(1, min(PDF_PAGE_WORKERS, OCR_WORKERS_PER_PROCESS))
+OCR_LANG = os.environ.get('OCR_LANG', 'eng')
+OCR_PSM = int(os.environ.get('OCR_PSM', '3'))
+# Tesseract is killed after OCR_TIMEOUT seconds so one image cannot hold a pool worker
+OCR_TIMEOUT = float(os.environ.get('OCR_TIMEOUT', str(CPU_TASK_TIMEOUT / 2)))
+OCR_TARGET_DPI = int(os.environ.get('OCR_TARGET_DPI', '300'))
+OCR_BINARIZE = os.environ.get('OCR_BINARIZE', 'true').lower() == 'true'
+# Used to estimate resolution from the pixel width when DPI metadata is missing or
+# implausible. Phone photos usually carry the 72 dpi JFIF/EXIF default, so metadata below
+# OCR_MIN_TRUSTED_DPI, or implying a page over twice OCR_PAGE_WIDTH_INCHES wide, is ignored.
+OCR_PAGE_WIDTH_INCHES = 8.5
+OCR_MIN_TRUSTED_DPI = 150
+# Tesseract's own OpenMP threads would compete with the worker pools
+os.environ.setdefault('OMP_THREAD_LIMIT', '1')
+
+# Metrics
+class Metric:
+    """Base for metrics exposed in Prometheus text format at /metrics.
+    
+    family is the name used in the HELP and TYPE lines, which must match the samples.
+    """
+    type = 'untyped'
+    family_suffix = ''
+
+    def __init__(self, name: str, documentation: str, labelnames: Tuple[str, ...] = ()):
+        self.name = name
+        self.family = name + self.family_suffix
+        self.documentation = documentation
+        self.labelnames = labelnames
+        self._lock = threading.Lock()
+        metrics_registry[name] = self
+
+    def record(self, value: float, *labels: str):
+        raise NotImplementedError
+
+    def samples(self):
+        """Yield (sample name, label pairs, value) tuples."""
+        raise NotImplementedError
+
+class Counter(Metric):
+    type = 'counter'
+    family_suffix = '_total'
+
+    def __init__(self, name: str, documentation: str, labelnames: Tuple[str, ...] = ()):
+        super().__init__(name, documentation, labelnames)
+        self._values: Dict[Tuple[str, ...], float] = {}
+
+    def inc(self, *labels: str, amount: float = 1.0):
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0.0) + amount
+
+    def record(self, value: float, *labels: str):
+        self.inc(*labels, amount=value)
+
+    def samples(self):
+        for labels, value in list(self._values.items()):
+            yield self.family, tuple(zip(self.labelnames, labels)), value
+
+class Gauge(Metric):
+    """A value that goes up and down, or is read from a callback at scrape time."""
+    type = 'gauge'
+
+    def __init__(self, name: str, documentation: str, function=None):
+        super().__init__(name, documentation)
+        self.function = function
+        self.value = 0.0
+
+    def inc(self, amount: float = 1.0):
+        with self._lock:
+            self.value += amount
+
+    def dec(self, amount: float = 1.0):
+        self.inc(-amount)
+
+    def record(self, value: float, *labels: str):
+        self.inc(value)
+
+    def samples(self):
+        yield self.name, (), self.function() if self.function else self.value
+
+class Histogram(Metric):
+    type = 'histogram'
+    DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+    def __init__(self, name: str, documentation: str, labelnames: Tuple[str, ...] = (),
+                 buckets: Tuple[float, ...] = DEFAULT_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = buckets
+        self._counts: Dict[Tuple[str, ...], List[int]] = {}
+        self._sums: Dict[Tuple[str, ...], float] = {}
+
+    def observe(self, value: float, *labels: str):
+        with self._lock:
+            counts = self._counts.get(labels)
+            if counts is None:
+                counts = self._counts[labels] = [0] * (len(self.buckets) + 1)
+            counts[bisect.bisect_left(self.buckets, value)] += 1
+            self._sums[labels] = self._sums.get(labels, 0.0) + value
+
+    def record(self, value: float, *labels: str):
+        self.observe(value, *labels)
+
+    def samples(self):
+        for labels, counts in list(self._counts.items()):
+            label_pairs = tuple(zip(self.labelnames, labels))
+            cumulative = 0
+            for bound, count in zip(self.buckets, counts):
+                cumulative += count
+                yield self.name + '_bucket', label_pairs + (('le', repr(bound)),), cumulative
+            cumulative += counts[-1]
+            yield self.name + '_bucket', label_pairs + (('le', '+Inf'),), cumulative
+            yield self.name + '_sum', label_pairs, self._sums[labels]
+            yield self.name + '_count', label_pairs, cumulative
+
+metrics_registry: Dict[str, Metric] = {}
+
+def render_metrics() -> str:
+    """Render every registered metric in the Prometheus text exposition format."""
+    lines = []
+    for metric in metrics_registry.values():
+        lines.append(f"# HELP {metric.family} {metric.documentation}")
+        lines.append(f"# TYPE {metric.family} {metric.type}")
+        for sample_name, label_pairs, value in metric.samples():
+            labels = ','.join(
+                f'{name}="{str(label).replace(chr(92), chr(92) * 2).replace(chr(34), chr(92) + chr(34))}"'
+                for name, label in label_pairs
+            )
+            lines.append(f"{sample_name}{{{labels}}} {float(value)!r}" if labels else f"{sample_name} {float(value)!r}")
+    return '\n'.join(lines) + '\n'
+
+STAGE_SECONDS = Histogram(
+    'resume_stage_duration_seconds', 'Time spent in each analysis pipeline stage', ('stage',)
+)
+UPLOADS = Counter('resume_uploads', 'Uploaded files by file type', ('file_type',))
+CACHE_LOOKUPS = Counter('resume_cache_lookups', 'Cache lookups by cache and result', ('cache', 'result'))
+FALLBACK_SUGGESTIONS = Counter('resume_fallback_suggestions', 'Responses that used rule-based fallback suggestions')
+OCR_INVOCATIONS = Counter('resume_ocr_invocations', 'Images sent to OCR by source', ('source',))
+ANALYSES_IN_FLIGHT = Gauge('resume_analyses_in_flight', 'Resume analyses currently being processed')
+CPU_TASKS_IN_FLIGHT = Gauge('resume_cpu_tasks_in_flight', 'Pipeline stages currently running on the CPU pool')
+CPU_POOL_RECYCLES = Counter('resume_cpu_pool_recycles', 'CPU pools replaced after a task timed out')
+LLM_CALLS_IN_FLIGHT = Gauge('resume_llm_calls_in_flight', 'LLM requests currently awaiting a response')
+
+# Metrics recorded inside a CPU pool task are collected here and replayed by the server
+# process, which owns the registry that /metrics renders
+task_metric_events = threading.local()
+task_metric_lock = threading.Lock()
+
+# Per-request stage breakdown, set by run_analysis_pipeline
+request_stage_timings: contextvars.ContextVar[Optional[Dict[str, float]]] = contextvars.ContextVar(
+    'request_stage_timings', default=None
+)
+
+def record_metric(metric: Metric, value: float, *labels: str):
+    events = getattr(task_metric_events, 'events', None)
+    if events is not None:
+        events.append((metric.name, value, labels))
+    else:
+        apply_metric_event(metric.name, value, labels)
+
+def apply_metric_event(name: str, value: float, labels: Tuple[str, ...]):
+    metrics_registry[name].record(value, *labels)
+    if name == STAGE_SECONDS.name:
+        timings = request_stage_timings.get()
+        if timings is not None:
+            timings[labels[0]] = timings.get(labels[0], 0.0) + value
+
+def with_task_metrics(func):
+    """Wrap func to run on a helper thread, with the metrics it records reaching the calling task.
+    
+    Thread-local event lists and context variables are not inherited by new threads.
+    """
+    context = contextvars.copy_context()
+    events = getattr(task_metric_events, 'events', None)
+    
+    def wrapper(*args):
+        task_metric_events.events = [] if events is not None else None
+        try:
+            # A context can only be entered by one thread at a time
+            return context.copy().run(func, *args)
+        finally:
+            if events is not None:
+                with task_metric_lock:
+                    events.extend(task_metric_events.events)
+            task_metric_events.events = None
+    return wrapper
+
+@contextmanager
+def stage_timer(stage: str):
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        record_metric(STAGE_SECONDS, time.perf_counter() - started, stage)
+
+def timed(stage: str):
+    """Decorator recording a function's duration as a pipeline stage."""
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            with stage_timer(stage):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorator
+
+# NLP engine
+class SpacyEngine:
+    """Lazily loaded spaCy pipeline restricted to the components whose output is used."""
+    def __init__(self, model_name: str, exclude: List[str], batch_size: int, n_process: int):
+        self.model_name = model_name
+        self.exclude = exclude
+        self.batch_size = batch_size
+        self.n_process = n_process
+        self._nlp = None
+        self._loaded = False
+        self._lock = threading.Lock()
+
+    @property
+    def nlp(self):
+        """The loaded pipeline, or None when the model is not installed."""
+        if not self._loaded:
+            with self._lock:
+                if not self._loaded:
+                    try:
+                        self._nlp = spacy.load(self.model_name, exclude=self.exclude)
+                    except OSError:
+                        logging.warning(f"spaCy model {self.model_name} is not installed, using regex extraction")
+                        self._nlp = None
+                    self._loaded = True
+        return self._nlp
+
+    def parse(self, text: str):
+        return self.nlp(text)
+
+    def parse_many(self, texts: List[str]) -> list:
+        return list(self.nlp.pipe(texts, batch_size=self.batch_size, n_process=self.n_process))
+
+spacy_engine = SpacyEngine(SPACY_MODEL, SPACY_EXCLUDE, SPACY_BATCH_SIZE, SPACY_N_PROCESS)
+
+# Skill matching. Dots stay inside tokens ("node.js", ".net") but slashes and hyphens
+# separate them, so "Python/Django" and "React-Native" yield each skill and joined
+# forms such as "ci/cd" match as two-token taxonomy phrases.
+SKILL_TOKEN_PATTERN = re.compile(r'\.?[a-z0-9][a-z0-9+#]*(?:\.[a-z0-9+#]+)*')
+
+class SkillMatcher:
+    """Match a skill taxonomy against text in one pass over its tokens.
+    
+    Every skill and synonym is stored as a path in a token trie, so matching respects
+    word boundaries ("go" does not match "good") and costs O(tokens x longest phrase)
+    regardless of taxonomy size. The taxonomy file maps each canonical skill to its
+    synonyms and is reloaded when its modification time changes.
+    """
+    def __init__(self, path: str, reload_interval: float):
+        self.path = path
+        self.reload_interval = reload_interval
+        self.version: Optional[str] = None
+        self.size = 0
+        self._trie: Dict[str, Any] = {}
+        self._mtime: Optional[float] = None
+        self._checked_at = 0.0
+        self._lock = threading.Lock()
+
+    def load(self):
+        """Build a new trie from the taxonomy file and swap it in."""
+        with open(self.path, 'rb') as f:
+            raw = f.read()
+        taxonomy = json.loads(raw)['skills']
+        trie: Dict[str, Any] = {}
+        for canonical, synonyms in taxonomy.items():
+            for phrase in [canonical, *synonyms]:
+                tokens = SKILL_TOKEN_PATTERN.findall(phrase.lower())
+                if not tokens:
+                    continue
+                node = trie
+                for token in tokens:
+                    node = node.setdefault(token, {})
+                # The empty string never occurs as a token, so it marks the end of a phrase
+                node[''] = canonical
+        self._trie = trie
+        self.size = len(taxonomy)
+        self.version = hashlib.sha256(raw).hexdigest()[:12]
+
+    def maybe_reload(self):
+        """Reload the taxonomy if the file changed, checking at most once per reload interval."""
+        now = time.monotonic()
+        if self.version is not None and now - self._checked_at < self.reload_interval:
+            return
+        with self._lock:
+            if self.version is not None and now - self._checked_at < self.reload_interval:
+                return
+            self._checked_at = now
+            try:
+                mtime = os.stat(self.path).st_mtime
+                if mtime != self._mtime:
+                    self.load()
+                    self._mtime = mtime
+                    logging.info(f"Loaded skill taxonomy {self.version} with {self.size} skills")
+            except (OSError, ValueError, KeyError) as e:
+                if self.version is None:
+                    raise
+                logging.error(f"Could not reload skill taxonomy, keeping {self.version}: {str(e)}")
+
+    def match(self, text: str) -> List[str]:
+        """Return the canonical names of all skills mentioned in text."""
+        return list(self.find(text))
+
+    def find(self, text: str) -> Dict[str, int]:
+        """Map each skill mentioned in text to the token offset of its first mention."""
+        self.maybe_reload()
+        trie = self._trie
+        tokens = SKILL_TOKEN_PATTERN.findall(text.lower())
+        found: Dict[str, int] = {}
+        for start in range(len(tokens)):
+            node = trie.get(tokens[start])
+            position = start
+            while node is not None:
+                canonical = node.get('')
+                if canonical:
+                    found.setdefault(canonical, start)
+                position += 1
+                if position == len(tokens):
+                    break
+                node = node.get(tokens[position])
+        return found
+
+skill_matcher = SkillMatcher(SKILL_TAXONOMY_PATH, SKILL_TAXONOMY_RELOAD_INTERVAL)
+
+# Resume sections
+SECTION_HEADERS = {
+    'experience': [
+        'experience', 'work experience', 'professional experience', 'relevant experience',
+        'work history', 'employment', 'employment history', 'career history'
+    ],
+    'education': ['education', 'education and training', 'academic background', 'qualifications'],
+    'skills': ['skills', 'technical skills', 'core competencies', 'competencies', 'expertise'],
+    'contact': ['contact', 'contact information', 'contact details', 'personal information'],
+    'summary': ['summary', 'professional summary', 'profile', 'objective', 'about me'],
+    'projects': ['projects', 'personal projects', 'key projects'],
+    'certifications': ['certifications', 'certificates', 'licenses and certifications']
+}
+SECTION_BY_HEADER = {
+    header: section for section, headers in SECTION_HEADERS.items() for header in headers
+}
+MAX_HEADER_LENGTH = max(len(header) for header in SECTION_BY_HEADER) + 4
+
+# Entity patterns are compiled once and never span lines, which bounds their
+# worst-case cost on long or oddly formatted documents. Number runs are anchored with a
+# lookbehind and capped so a long digit string is not retried from every offset.
+EMAIL_PATTERN = re.compile(r'\b[A-Za-z0-9._%+-]+@[A-Za-z0-9.-]+\.[A-Za-z]{2,}\b')
+PHONE_PATTERN = re.compile(r'(?:\+?1[-.\s]?)?\(?[0-9]{3}\)?[-.\s]?[0-9]{3}[-.\s]?[0-9]{4}')
+YEARS_OF_EXPERIENCE_PATTERN = re.compile(
+    r'(?<!\d)(\d{1,2})\+?[ \t-]*(?:year|yr)s?[ \t]*(?:of[ \t]*)?(?:experience|exp)', re.IGNORECASE
+)
+DATE_RANGE_COMPANY_PATTERN = re.compile(
+    r'(\d{4})[ \t]*[-–][ \t]*(\d{4}|[Pp]resent|[Cc]urrent)[ \t]*[:\-]?[ \t]*([A-Z][A-Za-z&,. \t]+)'
+)
+DEGREE_PATTERN = re.compile(
+    r'\b(?:bachelor|master|phd|doctorate|degree|diploma|certification)[ \t]+(?:of[ \t]+)?'
+    r'(?:science|arts|engineering|business|computer|information)\b[^\n]*',
+    re.IGNORECASE
+)
+REGEX_DEGREE_PATTERN = re.compile(
+    r'\b(?:bachelor|master|phd|doctorate|bs|ms|mba|ba|ma)\b[^\n]*?(?:degree|of|in)[ \t]*([A-Za-z \t]+)',
+    re.IGNORECASE
+)
+COMPANY_DATE_RANGE_PATTERN = re.compile(
+    r'\bat[ \t]+([A-Z][A-Za-z0-9&.]*(?:[ \t]+[A-Z][A-Za-z0-9&.]*)*)[ \t]*\(?'
+    r'(\d{4})[ \t]*[-–][ \t]*(\d{4}|[Pp]resent|[Cc]urrent)'
+)
+INSTITUTION_PATTERN = re.compile(
+    r'\b(?:[A-Z][a-z]+[ \t]+(?:University|College|Institute)'
+    r'|(?:University|College|Institute)[ \t]+of(?:[ \t]+[A-Z][A-Za-z]*)+)\b'
+)
+ACADEMIC_ORG_PATTERN = re.compile(r'\b(?:university|college|institute|school|academy)\b', re.IGNORECASE)
+
+def segment_sections(text: str) -> List[Tuple[str, int, int]]:
+    """Split a resume into (section, start, end) spans in one scan over its lines.
+    
+    Header lines are recognised by dictionary lookup rather than regex. Text before the
+    first header is the 'header' section, which usually holds the name and contact details.
+    """
+    sections = []
+    current, current_start = 'header', 0
+    position = 0
+    for line in text.split('\n'):
+        line_end = position + len(line)
+        candidate = line.strip()
+        if candidate and len(candidate) <= MAX_HEADER_LENGTH:
+            section = SECTION_BY_HEADER.get(' '.join(candidate.rstrip(':').lower().split()))
+            if section:
+                sections.append((current, current_start, position))
+                current, current_start = section, line_end
+        position = line_end + 1
+    sections.append((current, current_start, len(text)))
+    return sections
+
+def has_sections(sections: List[Tuple[str, int, int]]) -> bool:
+    return len(sections) > 1
+
+def section_text(text: str, sections: List[Tuple[str, int, int]], *names: str) -> str:
+    """Text of the named sections, or the whole text when the resume has no headers."""
+    if not has_sections(sections):
+        return text
+    return '\n'.join(text[start:end] for name, start, end in sections if name in names)
+
+def in_section(sections: List[Tuple[str, int, int]], offset: int, *names: str) -> bool:
+    """Whether a character offset falls in one of the named sections (always true without headers)."""
+    if not has_sections(sections):
+        return True
+    return any(start <= offset < end for name, start, end in sections if name in names)
+
+# Caching
+class TTLCache:
+    """Bounded in-process LRU cache whose entries expire after a TTL."""
+    def __init__(self, maxsize: int, ttl: float):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._entries: OrderedDict = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+
+    def get(self, key: str) -> Optional[Any]:
+        entry = self._entries.get(key)
+        if entry is None:
+            self.misses += 1
+            return None
+        expires_at, value = entry
+        if expires_at < time.monotonic():
+            del self._entries[key]
+            self.expirations += 1
+            self.misses += 1
+            return None
+        self._entries.move_to_end(key)
+        self.hits += 1
+        return value
+
+    def set(self, key: str, value: Any):
+        self._entries[key] = (time.monotonic() + self.ttl, value)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.maxsize:
+            self._entries.popitem(last=False)
+            self.evictions += 1
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            'size': len(self._entries),
+            'maxsize': self.maxsize,
+            'ttl': self.ttl,
+            'hits': self.hits,
+            'misses': self.misses,
+            'evictions': self.evictions,
+            'expirations': self.expirations
+        }
+
+extraction_cache = TTLCache(EXTRACTION_CACHE_SIZE, EXTRACTION_CACHE_TTL)
+
+def extraction_cache_key(file_hash: str) -> str:
+    skill_matcher.maybe_reload()
+    return f"{file_hash}:{EXTRACTOR_VERSION}:{skill_matcher.version}"
+
+async def get_cached_document(cache: TTLCache, collection, key: str) -> Optional[Dict[str, Any]]:
+    """Look up a cached value in the LRU, then in its MongoDB collection."""
+    cached = cache.get(key)
+    if cached is not None:
+        CACHE_LOOKUPS.inc(collection.name, 'hit')
+        return cached
+    try:
+        document = await collection.find_one({'_id': key}, {'_id': 0, 'created_at': 0})
+    except Exception as e:
+        logging.warning(f"Cache lookup in {collection.name} failed: {str(e)}")
+        document = None
+    if not document:
+        CACHE_LOOKUPS.inc(collection.name, 'miss')
+        return None
+    CACHE_LOOKUPS.inc(collection.name, 'hit')
+    cache.set(key, document)
+    return document
+
+async def store_cached_document(cache: TTLCache, collection, key: str, value: Dict[str, Any]):
+    """Store a cached value in the LRU and in its MongoDB collection."""
+    cache.set(key, value)
+    try:
+        await collection.replace_one({'_id': key}, {**value, 'created_at': datetime.utcnow()}, upsert=True)
+    except Exception as e:
+        logging.warning(f"Cache store in {collection.name} failed: {str(e)}")
+
+async def get_cached_extraction(key: str) -> Optional[Dict[str, Any]]:
+    """Look up extracted text and entities for a file."""
+    return await get_cached_document(extraction_cache, db.extraction_cache, key)
+
+async def store_cached_extraction(key: str, extracted_text: str, entities: Dict):
+    """Store extracted text and entities for a file."""
+    await store_cached_document(
+        extraction_cache, db.extraction_cache, key,
+        {'extracted_text': extracted_text, 'entities': entities}
+    )
+
+feedback_cache = TTLCache(FEEDBACK_CACHE_SIZE, FEEDBACK_CACHE_TTL)
+
+# In-flight LLM calls by cache key, shared by concurrent identical requests
+feedback_in_flight: Dict[str, asyncio.Task] = {}
+feedback_stats = {'llm_calls': 0, 'coalesced': 0, 'local_only': 0}
+
+def feedback_cache_key(resume_text: str, job_description: str) -> str:
+    digest = hashlib.sha256()
+    for part in (resume_text[:2000], job_description[:1000], LLM_MODEL, FEEDBACK_PROMPT_VERSION):
+        digest.update(part.encode('utf-8'))
+        digest.update(b'\0')
+    return digest.hexdigest()
+
+# Near-duplicate detection
+SHINGLE_TOKEN_PATTERN = re.compile(r'[a-z0-9]+')
+
+# Fixed seeds keep signatures comparable across processes and restarts
+_minhash_random = np.random.RandomState(1729)
+MINHASH_MULTIPLIERS = _minhash_random.randint(1, 2 ** 63, size=NEAR_DUPLICATE_NUM_PERM, dtype=np.uint64) | np.uint64(1)
+MINHASH_OFFSETS = _minhash_random.randint(0, 2 ** 63, size=NEAR_DUPLICATE_NUM_PERM, dtype=np.uint64)
+
+def minhash_signature(text: str) -> Optional[np.ndarray]:
+    """MinHash signature of the text's word shingles, or None if the text is too short to compare."""
+    tokens = SHINGLE_TOKEN_PATTERN.findall(text.lower())
+    size = NEAR_DUPLICATE_SHINGLE_SIZE
+    shingles = {' '.join(tokens[i:i + size]) for i in range(len(tokens) - size + 1)}
+    if len(shingles) < NEAR_DUPLICATE_MIN_SHINGLES:
+        return None
+    hashes = np.fromiter((zlib.crc32(shingle.encode('utf-8')) for shingle in shingles), dtype=np.uint64, count=len(shingles))
+    # Multiply-shift hashing, one function per permutation; the uint64 products wrap by design
+    permuted = (hashes[:, None] * MINHASH_MULTIPLIERS + MINHASH_OFFSETS) >> np.uint64(32)
+    return permuted.min(axis=0).astype(np.uint32)
+
+class NearDuplicateIndex:
+    """MinHash LSH index over resume signatures.
+    
+    Each signature is cut into bands whose rows hash to one 64-bit key. Keys are kept in
+    per-band sorted arrays searched with searchsorted, plus a dict of recent inserts that
+    is merged into the arrays in bulk, so lookups stay well under a millisecond and cost
+    a few dozen bytes per entry at hundreds of thousands of resumes. Candidates sharing a
+    band are verified by the fraction of equal signature rows.
+    """
+    def __init__(self, num_perm: int, bands: int, threshold: float, merge_size: int = 4096):
+        self.num_perm = num_perm
+        self.bands = bands
+        self.rows = num_perm // bands
+        self.threshold = threshold
+        self.merge_size = merge_size
+        self._band_multipliers = np.random.RandomState(31).randint(
+            1, 2 ** 63, size=self.rows, dtype=np.uint64
+        ) | np.uint64(1)
+        self._ids: List[str] = []
+        self._positions: Dict[str, int] = {}
+        self._signatures = np.empty((1024, num_perm), dtype=np.uint32)
+        self._keys = [np.empty(0, dtype=np.uint64) for _ in range(bands)]
+        self._members = [np.empty(0, dtype=np.int64) for _ in range(bands)]
+        self._recent: List[Dict[int, List[int]]] = [{} for _ in range(bands)]
+        self._recent_count = 0
+
+    def __len__(self):
+        return len(self._ids)
+
+    def band_keys(self, signature: np.ndarray) -> np.ndarray:
+        bands = signature[:self.bands * self.rows].reshape(self.bands, self.rows).astype(np.uint64)
+        return (bands * self._band_multipliers).sum(axis=1)
+
+    def add(self, record_id: str, signature: np.ndarray):
+        if record_id in self._positions:
+            return
+        position = len(self._ids)
+        if position == len(self._signatures):
+            self._signatures = np.concatenate([self._signatures, np.empty_like(self._signatures)])
+        self._signatures[position] = signature
+        self._ids.append(record_id)
+        self._positions[record_id] = position
+        for band, key in enumerate(self.band_keys(signature).tolist()):
+            self._recent[band].setdefault(key, []).append(position)
+        self._recent_count += 1
+        if self._recent_count >= self.merge_size:
+            self._merge()
+
+    def _merge(self):
+        for band in range(self.bands):
+            recent = self._recent[band]
+            keys = np.fromiter((key for key, positions in recent.items() for _ in positions), dtype=np.uint64)
+            members = np.fromiter((position for positions in recent.values() for position in positions), dtype=np.int64)
+            keys = np.concatenate([self._keys[band], keys])
+            members = np.concatenate([self._members[band], members])
+            order = np.argsort(keys, kind='stable')
+            self._keys[band] = keys[order]
+            self._members[band] = members[order]
+            self._recent[band] = {}
+        self._recent_count = 0
+
+    def query(self, signature: np.ndarray) -> Optional[Tuple[str, float]]:
+        """Return the most similar indexed record and its estimated similarity, if above the threshold."""
+        candidates = set()
+        # Search with numpy scalars; Python ints make searchsorted convert the whole array
+        for band, key in enumerate(self.band_keys(signature)):
+            keys = self._keys[band]
+            start = keys.searchsorted(key, side='left')
+            end = keys.searchsorted(key, side='right')
+            if end > start:
+                candidates.update(self._members[band][start:end].tolist())
+            candidates.update(self._recent[band].get(int(key), ()))
+        if not candidates:
+            return None
+        positions = np.fromiter(candidates, dtype=np.int64, count=len(candidates))
+        similarities = (self._signatures[positions] == signature).mean(axis=1)
+        best = int(np.argmax(similarities))
+        if similarities[best] < self.threshold:
+            return None
+        return self._ids[positions[best]], float(similarities[best])
+
+near_duplicate_index = NearDuplicateIndex(NEAR_DUPLICATE_NUM_PERM, NEAR_DUPLICATE_BANDS, NEAR_DUPLICATE_THRESHOLD)
+near_duplicate_stats = {'lookups': 0, 'matches': 0, 'reused_suggestions': 0}
+
+# Uploads
+# File content as bytes, or the path of an upload spooled to disk
+FileSource = Union[bytes, str]
+
+class SpooledUpload:
+    """An uploaded file held in memory, or in a temp file once it exceeds the spool threshold."""
+    def __init__(self, filename: str, file_extension: str, sha256: str, size: int,
+                 content: Optional[bytes] = None, path: Optional[str] = None):
+        self.filename = filename
+        self.file_extension = file_extension
+        self.sha256 = sha256
+        self.size = size
+        self.content = content
+        self.path = path
+
+    @classmethod
+    def from_bytes(cls, filename: str, file_extension: str, content: bytes) -> 'SpooledUpload':
+        return cls(filename, file_extension, hashlib.sha256(content).hexdigest(), len(content), content=content)
+
+    @property
+    def source(self) -> FileSource:
+        return self.content if self.content is not None else self.path
+
+    def read_bytes(self) -> bytes:
+        if self.content is not None:
+            return self.content
+        with open(self.path, 'rb') as f:
+            return f.read()
+
+    def cleanup(self):
+        if self.path:
+            try:
+                os.unlink(self.path)
+            except OSError:
+                pass
+            self.path = None
+
+class UploadSpooler:
+    """Build a SpooledUpload from chunks, hashing them and enforcing max_bytes as they arrive."""
+    def __init__(self, filename: str, file_extension: str, max_bytes: int):
+        self.filename = filename
+        self.file_extension = file_extension
+        self.max_bytes = max_bytes
+        self.digest = hashlib.sha256()
+        self.size = 0
+        self.chunks: List[bytes] = []
+        self.spool = None
+
+    def write(self, chunk: bytes):
+        self.size += len(chunk)
+        if self.size > self.max_bytes:
+            raise HTTPException(
+                status_code=413,
+                detail=f"File {self.filename} exceeds the {self.max_bytes} byte upload limit"
+            )
+        self.digest.update(chunk)
+        if self.spool is None and self.size > UPLOAD_SPOOL_THRESHOLD:
+            self.spool = tempfile.NamedTemporaryFile(prefix='resume-', dir=UPLOAD_TMP_DIR, delete=False)
+            self.spool.writelines(self.chunks)
+            self.chunks = []
+        if self.spool is not None:
+            self.spool.write(chunk)
+        else:
+            self.chunks.append(chunk)
+
+    def finish(self) -> SpooledUpload:
+        if self.spool is not None:
+            self.spool.close()
+            return SpooledUpload(self.filename, self.file_extension, self.digest.hexdigest(), self.size, path=self.spool.name)
+        return SpooledUpload(
+            self.filename, self.file_extension, self.digest.hexdigest(), self.size, content=b''.join(self.chunks)
+        )
+
+    def discard(self):
+        if self.spool is not None:
+            self.spool.close()
+            os.unlink(self.spool.name)
+
+async def spool_upload(file: UploadFile, max_bytes: int = MAX_UPLOAD_BYTES,
+                       file_extension: Optional[str] = None) -> SpooledUpload:
+    """Read an upload in chunks, hashing it and enforcing max_bytes as it streams.
+    
+    The extension is validated against SUPPORTED_EXTENSIONS unless given.
+    """
+    file_extension = file_extension or get_file_extension(file)
+    UPLOADS.inc(file_extension)
+    if file.size is not None and file.size > max_bytes:
+        raise HTTPException(status_code=413, detail=f"File {file.filename} exceeds the {max_bytes} byte upload limit")
+    spooler = UploadSpooler(file.filename, file_extension, max_bytes)
+    try:
+        while True:
+            chunk = await file.read(UPLOAD_CHUNK_SIZE)
+            if not chunk:
+                break
+            spooler.write(chunk)
+    except BaseException:
+        spooler.discard()
+        raise
+    return spooler.finish()
+
+def check_archive_member(member: zipfile.ZipInfo) -> str:
+    """Validate a member from its header and return its lowercase extension."""
+    file_extension = member.filename.lower().rsplit('.', 1)[-1]
+    if '.' not in member.filename or file_extension not in SUPPORTED_EXTENSIONS:
+        raise HTTPException(status_code=400, detail="Unsupported file format")
+    if member.file_size > MAX_UPLOAD_BYTES:
+        raise HTTPException(
+            status_code=413,
+            detail=f"File {member.filename} exceeds the {MAX_UPLOAD_BYTES} byte upload limit"
+        )
+    if member.file_size > ARCHIVE_MAX_COMPRESSION_RATIO * max(member.compress_size, 1):
+        raise HTTPException(
+            status_code=413,
+            detail=f"File {member.filename} is compressed more than {ARCHIVE_MAX_COMPRESSION_RATIO:g}:1"
+        )
+    return file_extension
+
+def spool_archive_member(archive: zipfile.ZipFile, member: zipfile.ZipInfo, file_extension: str) -> SpooledUpload:
+    """Inflate one member into a SpooledUpload, counting the bytes actually produced."""
+    spooler = UploadSpooler(member.filename, file_extension, MAX_UPLOAD_BYTES)
+    try:
+        with archive.open(member) as stream:
+            while True:
+                chunk = stream.read(UPLOAD_CHUNK_SIZE)
+                if not chunk:
+                    break
+                spooler.write(chunk)
+    except BaseException:
+        spooler.discard()
+        raise
+    return spooler.finish()
+
+@contextmanager
+def open_source(source: FileSource, mapped: bool = True):
+    """Open file content for reading, memory-mapping uploads that were spooled to disk.
+    
+    Pass mapped=False for readers that need a full file object (zipfile wants seekable()).
+    """
+    if isinstance(source, bytes):
+        yield io.BytesIO(source)
+        return
+    with open(source, 'rb') as f:
+        if not mapped:
+            yield f
+        elif os.fstat(f.fileno()).st_size == 0:
+            # mmap cannot map an empty file
+            yield io.BytesIO(b'')
+        else:
+            with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mapping:
+                yield mapping
+
+class RequestSizeLimitMiddleware:
+    """Reject request bodies over their route's limit with 413 while they are still streaming in.
+    
+    route_limits maps exact paths to their limit; other paths get max_bytes.
+    """
+    def __init__(self, app, max_bytes: int, route_limits: Optional[Dict[str, int]] = None):
+        self.app = app
+        self.max_bytes = max_bytes
+        self.route_limits = route_limits or {}
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] != 'http':
+            await self.app(scope, receive, send)
+            return
+        
+        max_bytes = self.route_limits.get(scope['path'], self.max_bytes)
+        detail = f"Request body exceeds the {max_bytes} byte limit"
+        content_length = dict(scope['headers']).get(b'content-length')
+        if content_length and content_length.isdigit() and int(content_length) > max_bytes:
+            await JSONResponse(status_code=413, content={'detail': detail})(scope, receive, send)
+            return
+        
+        received = 0
+        
+        async def limited_receive():
+            nonlocal received
+            message = await receive()
+            if message['type'] == 'http.request':
+                received += len(message.get('body', b''))
+                if received > max_bytes:
+                    raise HTTPException(status_code=413, detail=detail)
+            return message
+        
+        await self.app(scope, limited_receive, send)
+
+ADMISSION_REJECTIONS = Counter('resume_admission_rejections', 'Analysis requests refused by admission control', ('reason',))
+
+class TokenBucketLimiter:
+    """Per-client token buckets, keeping the most recently seen max_clients clients."""
+    def __init__(self, rate: float, burst: int, max_clients: int):
+        self.rate = rate
+        self.burst = burst
+        self.max_clients = max_clients
+        self._buckets: OrderedDict = OrderedDict()
+
+    def acquire(self, client: str) -> Optional[float]:
+        """Take a token for the client; returns None if one was available, else seconds until one is."""
+        now = time.monotonic()
+        tokens, updated = self._buckets.pop(client, (self.burst, now))
+        tokens = min(self.burst, tokens + (now - updated) * self.rate)
+        retry_after = None
+        if tokens >= 1:
+            tokens -= 1
+        else:
+            retry_after = (1 - tokens) / self.rate
+        self._buckets[client] = (tokens, now)
+        if len(self._buckets) > self.max_clients:
+            self._buckets.popitem(last=False)
+        return retry_after
+
+    def __len__(self):
+        return len(self._buckets)
+
+class AdmissionRejected(Exception):
+    def __init__(self, reason: str, retry_after: float):
+        super().__init__(reason)
+        self.reason = reason
+        self.retry_after = retry_after
+
+class AdmissionController:
+    """Limit concurrent work, queueing the excess in a bounded FIFO.
+    
+    Each acquire takes weight slots, capped at max_in_flight so any request can run
+    alone. Retry-After hints for rejected requests are derived from the rate at which
+    recent requests completed, i.e. how quickly the queue ahead of a retry would drain.
+    """
+    def __init__(self, max_in_flight: int, max_queue: int, queue_timeout: float, drain_window: int = 100):
+        self.max_in_flight = max_in_flight
+        self.max_queue = max_queue
+        self.queue_timeout = queue_timeout
+        self.in_flight = 0
+        self._waiters = deque()
+        # Completion times of the most recent requests
+        self._completions = deque(maxlen=drain_window)
+        self.admitted = 0
+        self.queued = 0
+        self.rejected = {'rate_limited': 0, 'queue_full': 0, 'queue_timeout': 0}
+
+    @property
+    def queue_depth(self) -> int:
+        return len(self._waiters)
+
+    def drain_rate(self) -> Optional[float]:
+        """Requests completed per second over the recent window, if known."""
+        if len(self._completions) < 2:
+            return None
+        elapsed = time.monotonic() - self._completions[0]
+        return (len(self._completions) - 1) / elapsed if elapsed > 0 else None
+
+    def retry_after(self) -> float:
+        rate = self.drain_rate()
+        if rate is None:
+            return self.queue_timeout
+        return min(max(1.0, (self.queue_depth + 1) / rate), 300.0)
+
+    def slots(self, weight: int) -> int:
+        return max(1, min(weight, self.max_in_flight))
+
+    async def acquire(self, weight: int = 1):
+        weight = self.slots(weight)
+        if self.in_flight + weight <= self.max_in_flight and not self._waiters:
+            self.in_flight += weight
+            self.admitted += 1
+            return
+        if len(self._waiters) >= self.max_queue:
+            raise AdmissionRejected('queue_full', self.retry_after())
+        
+        waiter = asyncio.get_running_loop().create_future()
+        entry = (waiter, weight)
+        self._waiters.append(entry)
+        self.queued += 1
+        try:
+            with stage_timer('admission_wait'):
+                await asyncio.wait_for(asyncio.shield(waiter), timeout=self.queue_timeout)
+        except (asyncio.TimeoutError, asyncio.CancelledError) as e:
+            if waiter.done() and not waiter.cancelled():
+                # The slots were handed over just as the wait ended; pass them on
+                self.release(weight, completed=False)
+            else:
+                waiter.cancel()
+                self._waiters.remove(entry)
+                # A heavy waiter at the head may have been holding back lighter ones
+                self.admit_waiters()
+            if isinstance(e, asyncio.CancelledError):
+                raise
+            raise AdmissionRejected('queue_timeout', self.retry_after())
+        self.admitted += 1
+
+    def release(self, weight: int = 1, completed: bool = True):
+        if completed:
+            self._completions.append(time.monotonic())
+        self.in_flight -= self.slots(weight)
+        self.admit_waiters()
+
+    def admit_waiters(self):
+        # Hand freed slots to waiters in arrival order so new arrivals cannot overtake them
+        while self._waiters:
+            waiter, weight = self._waiters[0]
+            if waiter.done():
+                self._waiters.popleft()
+                continue
+            if self.in_flight + weight > self.max_in_flight:
+                return
+            self._waiters.popleft()
+            self.in_flight += weight
+            waiter.set_result(None)
+
+    def record_rejection(self, reason: str):
+        self.rejected[reason] += 1
+        ADMISSION_REJECTIONS.inc(reason)
+
+    def stats(self) -> Dict[str, Any]:
+        rate = self.drain_rate()
+        return {
+            'in_flight': self.in_flight,
+            'max_in_flight': self.max_in_flight,
+            'queue_depth': self.queue_depth,
+            'max_queue': self.max_queue,
+            'admitted': self.admitted,
+            'queued': self.queued,
+            'rejected': dict(self.rejected),
+            'drain_rate': round(rate, 3) if rate is not None else None
+        }
+
+def retry_after_header(seconds: float) -> str:
+    return str(max(1, int(seconds + 0.999)))
+
+class AdmissionControlMiddleware:
+    """Apply per-client rate limits and the global concurrency limit to analysis requests.
+    
+    Requests are held for the whole response, including streamed ones, so the limit
+    covers the work they cause. Rate-limited clients get 429 and requests that cannot
+    be queued or wait too long get 503, both with Retry-After. Requests to handler_paths
+    are only rate-limited here; their handlers take slots with admission_slots.
+    """
+    def __init__(self, app, controller: AdmissionController, limiter: TokenBucketLimiter,
+                 path_prefix: str, trust_forwarded_for: bool, handler_paths: Tuple[str, ...] = ()):
+        self.app = app
+        self.controller = controller
+        self.limiter = limiter
+        self.path_prefix = path_prefix
+        self.trust_forwarded_for = trust_forwarded_for
+        self.handler_paths = handler_paths
+
+    def client_id(self, scope) -> str:
+        if self.trust_forwarded_for:
+            forwarded_for = dict(scope['headers']).get(b'x-forwarded-for')
+            if forwarded_for:
+                return forwarded_for.decode('latin-1').split(',')[0].strip()
+        client = scope.get('client')
+        return client[0] if client else 'unknown'
+
+    async def reject(self, scope, receive, send, status_code: int, reason: str, retry_after: float, detail: str):
+        self.controller.record_rejection(reason)
+        await JSONResponse(
+            status_code=status_code,
+            content={'detail': detail},
+            headers={'Retry-After': retry_after_header(retry_after)}
+        )(scope, receive, send)
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] != 'http' or scope['method'] != 'POST' or not scope['path'].startswith(self.path_prefix):
+            await self.app(scope, receive, send)
+            return
+        
+        retry_after = self.limiter.acquire(self.client_id(scope))
+        if retry_after is not None:
+            await self.reject(scope, receive, send, 429, 'rate_limited', retry_after, "Too many requests from this client")
+            return
+        if scope['path'] in self.handler_paths:
+            await self.app(scope, receive, send)
+            return
+        try:
+            await self.controller.acquire()
+        except AdmissionRejected as e:
+            await self.reject(scope, receive, send, 503, e.reason, e.retry_after, "Server is at capacity, retry later")
+            return
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            self.controller.release()
+
+admission_controller = AdmissionController(ADMISSION_MAX_IN_FLIGHT, ADMISSION_MAX_QUEUE, ADMISSION_QUEUE_TIMEOUT)
+client_rate_limiter = TokenBucketLimiter(ADMISSION_CLIENT_RATE, ADMISSION_CLIENT_BURST, ADMISSION_MAX_CLIENTS)
+
+@asynccontextmanager
+async def admission_slots(weight: int = 1):
+    """Hold weight admission slots, raising 503 with Retry-After when they cannot be had."""
+    try:
+        await admission_controller.acquire(weight)
+    except AdmissionRejected as e:
+        admission_controller.record_rejection(e.reason)
+        raise HTTPException(
+            status_code=503, detail="Server is at capacity, retry later",
+            headers={'Retry-After': retry_after_header(e.retry_after)}
+        )
+    try:
+        yield
+    finally:
+        admission_controller.release(weight)
+Gauge('resume_admission_in_flight', 'Analysis requests admitted and running',
+      function=lambda: admission_controller.in_flight)
+Gauge('resume_admission_queue_depth', 'Analysis requests waiting for admission',
+      function=lambda: admission_controller.queue_depth)
+
+ANALYSIS_TIERS = Counter('resume_analysis_tiers', 'Analyses by quality tier and whether it was chosen automatically', ('tier', 'mode'))
+
+class QualityTierSelector:
+    """Pick the analysis tier for tier=auto from admission queue depth and recent full-tier latency.
+    
+    Only full analyses are timed. Once degraded, their samples age out of the window and
+    the next request runs at full quality again, which re-measures the latency.
+    """
+    def __init__(self, controller: AdmissionController, standard_latency: float, minimal_latency: float,
+                 minimal_queue_fraction: float, window: float, min_samples: int = 5):
+        self.controller = controller
+        self.standard_latency = standard_latency
+        self.minimal_latency = minimal_latency
+        self.minimal_queue_fraction = minimal_queue_fraction
+        self.window = window
+        self.min_samples = min_samples
+        self._samples = deque(maxlen=1000)
+        self.counts = {mode: dict.fromkeys(QUALITY_TIERS, 0) for mode in ('auto', 'requested')}
+
+    def record(self, tier: str, seconds: float):
+        if tier == 'full':
+            self._samples.append((time.monotonic(), seconds))
+
+    def recent_latency(self) -> Optional[float]:
+        """90th percentile of full analysis times within the window, if there are enough."""
+        cutoff = time.monotonic() - self.window
+        while self._samples and self._samples[0][0] < cutoff:
+            self._samples.popleft()
+        if len(self._samples) < self.min_samples:
+            return None
+        return float(np.percentile([seconds for _, seconds in self._samples], 90))
+
+    def select(self) -> str:
+        queue_depth = self.controller.queue_depth
+        latency = self.recent_latency() or 0.0
+        if (
+            queue_depth >= max(1, self.controller.max_queue * self.minimal_queue_fraction)
+            or latency > self.minimal_latency
+        ):
+            return 'minimal'
+        if queue_depth > 0 or latency > self.standard_latency:
+            return 'standard'
+        return 'full'
+
+    def stats(self) -> Dict[str, Any]:
+        latency = self.recent_latency()
+        return {
+            'current': self.select(),
+            'full_latency_p90': round(latency, 3) if latency is not None else None,
+            **self.counts
+        }
+
+    def resolve(self, tier: str) -> str:
+        """Return the tier to run for a requested tier, choosing one from current load for 'auto'."""
+        mode = 'requested'
+        if tier == 'auto':
+            mode = 'auto'
+            tier = self.select()
+        self.counts[mode][tier] += 1
+        ANALYSIS_TIERS.inc(tier, mode)
+        return tier
+
+quality_tier_selector = QualityTierSelector(
+    admission_controller, QUALITY_STANDARD_LATENCY, QUALITY_MINIMAL_LATENCY,
+    QUALITY_MINIMAL_QUEUE_FRACTION, QUALITY_LATENCY_WINDOW
+)
+
+class GZipMiddleware:
+    """Gzip response bodies of at least minimum_size bytes when the client accepts it.
+    
+    Unlike Starlette's GZipMiddleware, streamed NDJSON and SSE responses are passed
+    through as they are, since the compressor would hold events back until its buffer
+    fills.
+    """
+    STREAMING_MEDIA_TYPES = ('application/x-ndjson', 'text/event-stream')
+
+    def __init__(self, app, minimum_size: int, compresslevel: int):
+        self.app = app
+        self.minimum_size = minimum_size
+        self.compresslevel = compresslevel
+
+    async def __call__(self, scope, receive, send):
+        accept_encoding = dict(scope['headers']).get(b'accept-encoding', b'') if scope['type'] == 'http' else b''
+        if b'gzip' not in accept_encoding:
+            await self.app(scope, receive, send)
+            return
+        
+        start_message = None
+        compressor = None
+        passthrough = False
+        
+        async def compressed_send(message):
+            nonlocal start_message, compressor, passthrough
+            if message['type'] == 'http.response.start':
+                headers = MutableHeaders(raw=message['headers'])
+                media_type = headers.get('content-type', '').split(';')[0].strip()
+                if media_type in self.STREAMING_MEDIA_TYPES or 'content-encoding' in headers:
+                    passthrough = True
+                    await send(message)
+                else:
+                    # Hold the headers until the first body chunk shows whether to compress
+                    start_message = message
+                return
+            if passthrough or message['type'] != 'http.response.body':
+                await send(message)
+                return
+            
+            body = message.get('body', b'')
+            more_body = message.get('more_body', False)
+            if compressor is None:
+                headers = MutableHeaders(raw=start_message['headers'])
+                if len(body) < self.minimum_size and not more_body:
+                    passthrough = True
+                    await send(start_message)
+                    await send(message)
+                    return
+                compressor = zlib.compressobj(self.compresslevel, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+                headers['Content-Encoding'] = 'gzip'
+                headers.add_vary_header('Accept-Encoding')
+                if more_body:
+                    del headers['Content-Length']
+                else:
+                    body = compressor.compress(body) + compressor.flush()
+                    headers['Content-Length'] = str(len(body))
+                    await send(start_message)
+                    await send({'type': 'http.response.body', 'body': body})
+                    return
+                await send(start_message)
+            
+            body = compressor.compress(body)
+            if not more_body:
+                body += compressor.flush()
+            await send({'type': 'http.response.body', 'body': body, 'more_body': more_body})
+        
+        await self.app(scope, receive, compressed_send)
+
 # File processing functions
-def extract_text_from_pdf(file_content: bytes) -> str:
-    """Extract text from PDF file."""
+@timed('extract_pdf')
+def extract_text_from_pdf(source: FileSource) -> str:
+    """Extract text from PDF file.
+    
+    Pages are read from the text layer up to PDF_MAX_PAGES. Pages without a usable text
+    layer are OCR'd from their embedded scan, in parallel where PDF_PAGE_OCR_THREADS
+    allows, and keep whichever of the two texts is longer, so a logo-only scan cannot
+    wipe out a short text layer. The PDF reader itself is not thread-safe, so only the
+    OCR step runs concurrently.
+    """
     try:
-        pdf_reader = PyPDF2.PdfReader(io.BytesIO(file_content))
-        text = ""
-        for page in pdf_reader.pages:
-            text += page.extract_text() + "\n"
-        return text.strip()
+        with open_source(source) as stream:
+            pdf_reader = PyPDF2.PdfReader(stream)
+            page_count = len(pdf_reader.pages)
+            page_texts = []
+            scanned_pages = {}
+            for index in range(min(page_count, PDF_MAX_PAGES)):
+                page = pdf_reader.pages[index]
+                page_text = page.extract_text() or ""
+                page_texts.append(page_text)
+                if PDF_OCR_FALLBACK and len(page_text.strip()) < PDF_OCR_MIN_CHARS:
+                    image_data = get_page_scan(page)
+                    if image_data:
+                        scanned_pages[index] = image_data
+        
+        if page_count > PDF_MAX_PAGES:
+            logging.info(f"Extracted the first {PDF_MAX_PAGES} of {page_count} PDF pages")
+        
+        if scanned_pages:
+            record_metric(OCR_INVOCATIONS, len(scanned_pages), 'pdf_page')
+            workers = min(PDF_PAGE_OCR_THREADS, len(scanned_pages))
+            with stage_timer('pdf_ocr'):
+                if workers > 1:
+                    with ThreadPoolExecutor(max_workers=workers) as executor:
+                        ocr_texts = list(executor.map(with_task_metrics(ocr_page_scan), scanned_pages.values()))
+                else:
+                    # More threads would only queue for the one OCR slot
+                    ocr_texts = [ocr_page_scan(image_data) for image_data in scanned_pages.values()]
+            for index, ocr_text in zip(scanned_pages, ocr_texts):
+                if len(ocr_text.strip()) > len(page_texts[index].strip()):
+                    page_texts[index] = ocr_text
+        
+        return "\n".join(page_texts).strip()
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=400, detail=f"Error processing PDF: {str(e)}")
 
-def extract_text_from_docx(file_content: bytes) -> str:
+def get_page_scan(page) -> Optional[bytes]:
+    """Return the largest image embedded in a PDF page, which for scanned pages is the scan."""
+    try:
+        images = page.images
+    except Exception as e:
+        logging.warning(f"Could not read images from PDF page: {str(e)}")
+        return None
+    if not images:
+        return None
+    return max(images, key=lambda image: len(image.data)).data
+
+def ocr_page_scan(image_data: bytes) -> str:
+    """OCR one scanned PDF page; a page that cannot be read contributes no text."""
+    try:
+        return ocr_image(open_image(io.BytesIO(image_data)))
+    except Exception as e:
+        logging.warning(f"Could not OCR scanned PDF page: {str(e)}")
+        return ""
+
+@timed('extract_docx')
+def extract_text_from_docx(source: FileSource) -> str:
     """Extract text from DOCX file."""
     try:
-        doc = docx.Document(io.BytesIO(file_content))
+        with open_source(source, mapped=False) as stream:
+            # A DOCX is a zip archive; refuse ones that would inflate beyond the limit
+            with zipfile.ZipFile(stream) as archive:
+                uncompressed_size = sum(member.file_size for member in archive.infolist())
+            if uncompressed_size > MAX_DOCX_UNCOMPRESSED_BYTES:
+                raise HTTPException(
+                    status_code=413,
+                    detail=f"DOCX expands to {uncompressed_size} bytes, limit is {MAX_DOCX_UNCOMPRESSED_BYTES}"
+                )
+            stream.seek(0)
+            doc = docx.Document(stream)
         text = "\n".join([paragraph.text for paragraph in doc.paragraphs])
         return text.strip()
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=400, detail=f"Error processing DOCX: {str(e)}")
 
-def extract_text_from_image_ocr(file_content: bytes) -> str:
+def open_image(stream) -> 'Image.Image':
+    """Open an image, rejecting it from its header if it exceeds MAX_IMAGE_PIXELS."""
+    image = Image.open(stream)
+    # Only the header has been read so far; check the size before decoding pixels
+    if image.width * image.height > MAX_IMAGE_PIXELS:
+        raise HTTPException(
+            status_code=413,
+            detail=f"Image has {image.width * image.height} pixels, limit is {MAX_IMAGE_PIXELS}"
+        )
+    return image
+
+def otsu_threshold(histogram: List[int]) -> int:
+    """Grey level that best separates ink from paper (Otsu's method)."""
+    total = sum(histogram)
+    total_sum = sum(level * count for level, count in enumerate(histogram))
+    background_weight = 0
+    background_sum = 0
+    best_variance = 0.0
+    threshold = 127
+    for level, count in enumerate(histogram):
+        background_weight += count
+        if background_weight == 0:
+            continue
+        foreground_weight = total - background_weight
+        if foreground_weight == 0:
+            break
+        background_sum += level * count
+        background_mean = background_sum / background_weight
+        foreground_mean = (total_sum - background_sum) / foreground_weight
+        variance = background_weight * foreground_weight * (background_mean - foreground_mean) ** 2
+        if variance > best_variance:
+            best_variance = variance
+            threshold = level
+    return threshold
+
+def image_dpi(metadata_dpi: float, width: int) -> float:
+    """Horizontal resolution of a page image, estimated from its width unless the metadata is plausible."""
+    if metadata_dpi < OCR_MIN_TRUSTED_DPI or width / metadata_dpi > 2 * OCR_PAGE_WIDTH_INCHES:
+        return width / OCR_PAGE_WIDTH_INCHES
+    return metadata_dpi
+
+def preprocess_for_ocr(image: 'Image.Image') -> 'Image.Image':
+    """Rotate by EXIF orientation, greyscale, downscale to OCR_TARGET_DPI and binarise."""
+    metadata_dpi = float(image.info.get('dpi', (0, 0))[0] or 0)
+    image = ImageOps.exif_transpose(image).convert('L')
+    dpi = image_dpi(metadata_dpi, image.width)
+    if dpi > OCR_TARGET_DPI:
+        scale = OCR_TARGET_DPI / dpi
+        image = image.resize(
+            (max(1, round(image.width * scale)), max(1, round(image.height * scale))),
+            Image.Resampling.LANCZOS,
+            reducing_gap=2.0
+        )
+    if OCR_BINARIZE:
+        threshold = otsu_threshold(image.histogram())
+        image = image.point([0] * (threshold + 1) + [255] * (255 - threshold))
+    return image
+
+class OcrEngine:
+    """Bounded pool of tesseract workers with per-image timing.
+    
+    Durations are recorded as the ocr_preprocess and ocr_recognize stages, which
+    reach /metrics from the CPU pool workers like every other stage.
+    """
+    def __init__(self, workers: int, lang: str, psm: int, timeout: float):
+        self.lang = lang
+        self.config = f"--psm {psm}"
+        self.timeout = timeout
+        self._slots = threading.BoundedSemaphore(workers)
+
+    def recognize(self, image: 'Image.Image') -> str:
+        started = time.perf_counter()
+        original_size = image.size
+        with stage_timer('ocr_preprocess'):
+            image = preprocess_for_ocr(image)
+        preprocessed = time.perf_counter()
+        with self._slots:
+            recognize_started = time.perf_counter()
+            with stage_timer('ocr_recognize'):
+                try:
+                    text = pytesseract.image_to_string(
+                        image, lang=self.lang, config=self.config, timeout=self.timeout
+                    )
+                except RuntimeError as e:
+                    # pytesseract kills the process and raises RuntimeError on timeout
+                    raise HTTPException(status_code=504, detail=f"OCR timed out after {self.timeout:g} seconds") from e
+        finished = time.perf_counter()
+        
+        logging.info(
+            f"OCR {original_size[0]}x{original_size[1]} -> {image.width}x{image.height}: "
+            f"preprocess {preprocessed - started:.3f}s, wait {recognize_started - preprocessed:.3f}s, "
+            f"recognize {finished - recognize_started:.3f}s"
+        )
+        return text.strip()
+
+ocr_engine = OcrEngine(OCR_WORKERS_PER_PROCESS, OCR_LANG, OCR_PSM, OCR_TIMEOUT)
+
+def ocr_image(image: 'Image.Image') -> str:
+    return ocr_engine.recognize(image)
+
+@timed('extract_image')
+def extract_text_from_image_ocr(source: FileSource) -> str:
     """Extract text from image using OCR."""
+    record_metric(OCR_INVOCATIONS, 1, 'image')
     try:
-        image = Image.open(io.BytesIO(file_content))
-        text = pytesseract.image_to_string(image)
-        return text.strip()
+        with open_source(source) as stream:
+            return ocr_image(open_image(stream))
+    except HTTPException:
+        raise
+    except Image.DecompressionBombError as e:
+        raise HTTPException(status_code=413, detail=f"Image rejected as a decompression bomb: {str(e)}")
     except Exception as e:
         raise HTTPException(status_code=400, detail=f"Error processing image with OCR: {str(e)}")
 
+@timed('extract_txt')
+def extract_text_from_txt(source: FileSource) -> str:
+    """Decode a plain-text file."""
+    if isinstance(source, bytes):
+        return source.decode('utf-8')
+    with open(source, 'r', encoding='utf-8') as f:
+        return f.read()
+
+def get_file_extension(file: UploadFile) -> str:
+    """Validate the uploaded file and return its lowercase extension."""
+    if not file.filename:
+        raise HTTPException(status_code=400, detail="No file uploaded")
+    
+    file_extension = file.filename.lower().split('.')[-1]
+    if file_extension not in SUPPORTED_EXTENSIONS:
+        raise HTTPException(status_code=400, detail="Unsupported file format")
+    return file_extension
+
+def extract_text(file_extension: str, source: FileSource) -> str:
+    """Extract text from file content based on file type."""
+    if file_extension == 'pdf':
+        extracted_text = extract_text_from_pdf(source)
+    elif file_extension == 'docx':
+        extracted_text = extract_text_from_docx(source)
+    elif file_extension == 'txt':
+        extracted_text = extract_text_from_txt(source)
+    elif file_extension in ['jpg', 'jpeg', 'png']:
+        extracted_text = extract_text_from_image_ocr(source)
+    else:
+        raise HTTPException(status_code=400, detail="Unsupported file format")
+    
+    if not extracted_text.strip():
+        raise HTTPException(status_code=400, detail="Could not extract text from file")
+    return extracted_text
+
 def extract_entities_with_spacy(text: str) -> Dict[str, List[str]]:
     """Extract entities using spaCy NLP."""
-    if not nlp:
+    if not spacy_engine.nlp:
         return extract_entities_with_regex(text)
     
-    doc = nlp(text)
+    with stage_timer('entities_spacy'):
+        return extract_entities_from_doc(spacy_engine.parse(text))
+
+def extract_entities_with_spacy_batch(texts: List[str]) -> List[Dict[str, List[str]]]:
+    """Extract entities from many texts with a single nlp.pipe pass."""
+    if not spacy_engine.nlp:
+        return [extract_entities_with_regex(text) for text in texts]
     
-    skills = []
+    with stage_timer('entities_spacy_batch'):
+        return [extract_entities_from_doc(doc) for doc in spacy_engine.parse_many(texts)]
+
+def extract_entities_from_doc(doc) -> Dict[str, List[str]]:
+    """Build skills, experience, education and contact info from a parsed spaCy doc."""
+    text = doc.text
+    sections = segment_sections(text)
+    
+    skills = skill_matcher.match(text)
     experience = []
     education = []
     contact_info = {}
     
-    # Extract skills using common skill patterns
-    skill_patterns = [
-        r'(?i)\b(?:python|javascript|react|node\.js|sql|html|css|java|c\+\+|machine learning|data analysis|aws|azure|docker|kubernetes|git|agile|scrum|project management|leadership|communication|problem solving|analytical|teamwork|critical thinking)\b'
-    ]
-    
-    for pattern in skill_patterns:
-        matches = re.findall(pattern, text, re.IGNORECASE)
-        skills.extend([match.lower() for match in matches])
-    
-    # Extract experience sections
-    exp_sections = re.findall(r'(?i)(?:experience|work history|employment).*?(?=\n\n|\n[A-Z]|$)', text, re.DOTALL)
-    for section in exp_sections:
-        # Look for company names and dates
-        companies = re.findall(r'(\d{4}[-\s]*\d{0,4})\s*[-–]\s*(?:\d{4}|present|current)\s*[:\-]?\s*([A-Z][A-Za-z\s&,\.]+)', section)
-        experience.extend([f"{comp[1].strip()} ({comp[0]})" for comp in companies if len(comp[1].strip()) > 3])
-    
-    # Extract education
-    edu_patterns = [
-        r'(?i)\b(?:bachelor|master|phd|doctorate|degree|diploma|certification)\s+(?:of\s+)?(?:science|arts|engineering|business|computer|information)\b.*?(?=\n|$)',
-        r'(?i)\b(?:university|college|institute|school)\s+of\s+[A-Za-z\s]+',
-        r'(?i)\b[A-Z][a-z]+\s+(?:university|college|institute)\b'
-    ]
+    # Group ORG and DATE entities by line: an employer next to a date range is a position,
+    # an academic organisation is education. Entities are only taken from their own
+    # section when the resume has recognisable headers.
+    orgs_by_line: Dict[int, List[str]] = {}
+    dates_by_line: Dict[int, List[str]] = {}
+    for ent in doc.ents:
+        name = ent.text.strip()
+        if ent.label_ == 'ORG':
+            if ACADEMIC_ORG_PATTERN.search(name):
+                if in_section(sections, ent.start_char, 'education'):
+                    education.append(name)
+            elif len(name) > 3 and in_section(sections, ent.start_char, 'experience'):
+                orgs_by_line.setdefault(text.count('\n', 0, ent.start_char), []).append(name)
+        elif ent.label_ == 'DATE':
+            if in_section(sections, ent.start_char, 'experience'):
+                dates_by_line.setdefault(text.count('\n', 0, ent.start_char), []).append(name)
+        elif ent.label_ == 'GPE' and 'location' not in contact_info:
+            if in_section(sections, ent.start_char, 'header', 'contact'):
+                contact_info['location'] = name
     
-    for pattern in edu_patterns:
-        matches = re.findall(pattern, text)
-        education.extend([match.strip() for match in matches])
+    for line, orgs in orgs_by_line.items():
+        dates = dates_by_line.get(line) or dates_by_line.get(line + 1)
+        if dates:
+            experience.extend([f"{org} ({dates[0]})" for org in orgs])
     
-    # Extract contact information
-    email_match = re.search(r'\b[A-Za-z0-9._%+-]+@[A-Za-z0-9.-]+\.[A-Z|a-z]{2,}\b', text)
-    if email_match:
-        contact_info['email'] = email_match.group()
+    # Degrees are not named entities, so match them directly
+    education_text = section_text(text, sections, 'education')
+    education.extend([match.strip() for match in DEGREE_PATTERN.findall(education_text)])
     
-    phone_match = re.search(r'(?:\+?1[-.\s]?)?\(?[0-9]{3}\)?[-.\s]?[0-9]{3}[-.\s]?[0-9]{4}', text)
-    if phone_match:
-        contact_info['phone'] = phone_match.group()
+    contact_info.update(extract_contact_info(text, sections))
     
     return {
         'skills': list(set(skills)),
@@ -143,72 +1769,165 @@ def extract_entities_with_spacy(text: str) -> Dict[str, List[str]]:
         'contact_info': contact_info
     }
 
+@timed('entities_regex')
 def extract_entities_with_regex(text: str) -> Dict[str, List[str]]:
     """Fallback entity extraction using regex patterns."""
-    skills = []
+    sections = segment_sections(text)
+    
+    skills = skill_matcher.match(text)
     experience = []
     education = []
-    contact_info = {}
-    
-    # Common technical skills
-    tech_skills = [
-        'python', 'javascript', 'react', 'angular', 'vue', 'node.js', 'express',
-        'sql', 'mysql', 'postgresql', 'mongodb', 'html', 'css', 'java', 'c++',
-        'c#', 'php', 'ruby', 'go', 'rust', 'swift', 'kotlin', 'dart', 'flutter',
-        'machine learning', 'data science', 'artificial intelligence', 'deep learning',
-        'tensorflow', 'pytorch', 'scikit-learn', 'pandas', 'numpy', 'matplotlib',
-        'aws', 'azure', 'gcp', 'docker', 'kubernetes', 'jenkins', 'git', 'github',
-        'gitlab', 'ci/cd', 'devops', 'agile', 'scrum', 'project management'
-    ]
     
-    # Soft skills
-    soft_skills = [
-        'leadership', 'communication', 'teamwork', 'problem solving', 'analytical',
-        'critical thinking', 'time management', 'adaptability', 'creativity',
-        'attention to detail', 'multitasking', 'interpersonal', 'negotiation'
-    ]
-    
-    all_skills = tech_skills + soft_skills
-    text_lower = text.lower()
-    
-    for skill in all_skills:
-        if skill in text_lower:
-            skills.append(skill)
-    
-    # Extract years of experience
-    exp_matches = re.findall(r'(\d+)[\s\-]*(?:year|yr)s?\s*(?:of\s*)?(?:experience|exp)', text, re.IGNORECASE)
+    # Extract years of experience, usually stated in the summary
+    exp_matches = YEARS_OF_EXPERIENCE_PATTERN.findall(text)
     if exp_matches:
-        experience.append(f"{max(exp_matches)} years of experience")
-    
-    # Extract education degrees
-    degree_patterns = [
-        r'(?i)\b(?:bachelor|master|phd|doctorate|bs|ms|mba|ba|ma)\b.*?(?:degree|of|in)\s*([A-Za-z\s]+)',
-        r'(?i)\b[A-Z][a-z]+\s+(?:university|college|institute)\b'
-    ]
-    
-    for pattern in degree_patterns:
-        matches = re.findall(pattern, text)
-        education.extend([match.strip() if isinstance(match, str) else match[0].strip() for match in matches])
+        experience.append(f"{max(exp_matches, key=int)} years of experience")
     
-    # Extract contact info
-    email_match = re.search(r'\b[A-Za-z0-9._%+-]+@[A-Za-z0-9.-]+\.[A-Z|a-z]{2,}\b', text)
-    if email_match:
-        contact_info['email'] = email_match.group()
+    # Extract positions from date ranges in the experience section
+    experience_text = section_text(text, sections, 'experience')
+    for start, end, company in DATE_RANGE_COMPANY_PATTERN.findall(experience_text):
+        if len(company.strip()) > 3:
+            experience.append(f"{company.strip()} ({start}-{end})")
+    for company, start, end in COMPANY_DATE_RANGE_PATTERN.findall(experience_text):
+        experience.append(f"{company} ({start}-{end})")
     
-    phone_match = re.search(r'(?:\+?1[-.\s]?)?\(?[0-9]{3}\)?[-.\s]?[0-9]{3}[-.\s]?[0-9]{4}', text)
-    if phone_match:
-        contact_info['phone'] = phone_match.group()
+    # Extract education degrees
+    education_text = section_text(text, sections, 'education')
+    education.extend([match.strip() for match in REGEX_DEGREE_PATTERN.findall(education_text)])
+    education.extend([match.strip() for match in INSTITUTION_PATTERN.findall(education_text)])
     
     return {
         'skills': list(set(skills)),
         'experience': list(set(experience)),
         'education': list(set(education)),
-        'contact_info': contact_info
+        'contact_info': extract_contact_info(text, sections)
     }
 
+def extract_contact_info(text: str, sections: List[Tuple[str, int, int]]) -> Dict[str, str]:
+    """Find email and phone in the header or contact section, falling back to the whole text."""
+    contact_info = {}
+    for candidate in (section_text(text, sections, 'header', 'contact'), text):
+        # Only lines containing '@' can hold an email, which keeps the search linear
+        for line in candidate.split('\n'):
+            if 'email' not in contact_info and '@' in line:
+                email_match = EMAIL_PATTERN.search(line)
+                if email_match:
+                    contact_info['email'] = email_match.group()
+        if 'phone' not in contact_info:
+            phone_match = PHONE_PATTERN.search(candidate)
+            if phone_match:
+                contact_info['phone'] = phone_match.group()
+        if len(contact_info) == 2:
+            break
+    return contact_info
+
+# Job match scoring
+@functools.lru_cache(maxsize=None)
+def similarity_analyzer():
+    """Tokenizer shared by every scoring vectorizer: lowercase, English stop words removed, 1-2 grams."""
+    from sklearn.feature_extraction.text import TfidfVectorizer
+    return TfidfVectorizer(stop_words='english', ngram_range=(1, 2)).build_analyzer()
+
+class CorpusIdfModel:
+    """TF-IDF scoring with document frequencies taken from the whole corpus.
+    
+    The snapshot file holds the vocabulary and IDF weights from the last refit. It is
+    reloaded when its modification time changes, and the new vectorizer and weights are
+    swapped in with a single assignment so concurrent scoring always sees one model.
+    """
+    def __init__(self, path: str, reload_interval: float):
+        self.path = path
+        self.reload_interval = reload_interval
+        self.version: Optional[str] = None
+        self.documents = 0
+        self.size = 0
+        # (CountVectorizer, IDF weights)
+        self._model: Optional[Tuple[Any, np.ndarray]] = None
+        self._mtime: Optional[float] = None
+        self._checked_at = float('-inf')
+        self._lock = threading.Lock()
+
+    def load(self):
+        """Build a vectorizer from the snapshot file and swap it in."""
+        from sklearn.feature_extraction.text import CountVectorizer
+        with open(self.path, 'r', encoding='utf-8') as f:
+            snapshot = json.load(f)
+        vectorizer = CountVectorizer(
+            analyzer=similarity_analyzer(),
+            vocabulary={term: index for index, term in enumerate(snapshot['terms'])},
+            dtype=np.float64
+        )
+        idf = np.asarray(snapshot['idf'], dtype=np.float64)
+        self._model = (vectorizer, idf)
+        self.version = snapshot['version']
+        self.documents = snapshot['documents']
+        self.size = len(idf)
+
+    def maybe_reload(self):
+        """Reload the snapshot if the file changed, checking at most once per reload interval."""
+        now = time.monotonic()
+        if now - self._checked_at < self.reload_interval:
+            return
+        with self._lock:
+            if now - self._checked_at < self.reload_interval:
+                return
+            self._checked_at = now
+            try:
+                mtime = os.stat(self.path).st_mtime
+            except OSError:
+                return
+            if mtime == self._mtime:
+                return
+            try:
+                self.load()
+                self._mtime = mtime
+                logging.info(f"Loaded corpus IDF model {self.version} with {self.size} terms")
+            except (OSError, ValueError, KeyError) as e:
+                logging.error(f"Could not load corpus IDF model, keeping {self.version}: {str(e)}")
+
+    def scores(self, resume_texts: List[str], job_description: str) -> Optional[np.ndarray]:
+        """Cosine similarity of each resume to the job description.
+        
+        Returns None until a model has been fitted or when the job description shares no
+        terms with its vocabulary.
+        """
+        self.maybe_reload()
+        model = self._model
+        if model is None:
+            return None
+        from sklearn.preprocessing import normalize
+        vectorizer, idf = model
+        counts = vectorizer.transform([job_description] + resume_texts)
+        weighted = normalize(counts.multiply(idf).tocsr())
+        if weighted[0].nnz == 0:
+            return None
+        return (weighted[1:] @ weighted[0].T).toarray().ravel()
+
+    def term_idf(self, terms: List[str]) -> Optional[np.ndarray]:
+        """IDF weight of each term, treating terms outside the vocabulary as the rarest; None without a model."""
+        self.maybe_reload()
+        model = self._model
+        if model is None:
+            return None
+        vectorizer, idf = model
+        indices = [vectorizer.vocabulary.get(term, -1) for term in terms]
+        return np.array([idf[index] if index >= 0 else idf.max() for index in indices])
+
+corpus_idf = CorpusIdfModel(CORPUS_IDF_PATH, CORPUS_IDF_RELOAD_INTERVAL)
+
+@timed('similarity')
 def calculate_similarity_score(resume_text: str, job_description: str) -> float:
-    """Calculate similarity between resume and job description using TF-IDF."""
+    """Calculate similarity between resume and job description using TF-IDF.
+    
+    Uses the corpus IDF model once one has been fitted, otherwise fits TF-IDF on the
+    two documents.
+    """
     try:
+        scores = corpus_idf.scores([resume_text], job_description)
+        if scores is not None:
+            return float(scores[0] * 100)
+        from sklearn.feature_extraction.text import TfidfVectorizer
+        from sklearn.metrics.pairwise import cosine_similarity
         vectorizer = TfidfVectorizer(stop_words='english', ngram_range=(1, 2))
         tfidf_matrix = vectorizer.fit_transform([resume_text.lower(), job_description.lower()])
         similarity_matrix = cosine_similarity(tfidf_matrix[0:1], tfidf_matrix[1:2])
@@ -220,21 +1939,250 @@ def calculate_similarity_score(resume_text: str, job_description: str) -> float:
         common_words = resume_words.intersection(job_words)
         return (len(common_words) / len(job_words)) * 100 if job_words else 0
 
-async def generate_ai_feedback(resume_text: str, job_description: str, extracted_data: Dict, match_score: float) -> List[str]:
-    """Generate AI-powered feedback using LLM."""
+@timed('similarity_batch')
+def calculate_similarity_scores(resume_texts: List[str], job_description: str) -> List[float]:
+    """Score many resumes against one job description with one transform or TF-IDF fit."""
+    if not resume_texts:
+        return []
     try:
-        # Initialize LLM chat
-        api_key = os.environ.get('EMERGENT_LLM_KEY')
-        if not api_key:
-            return get_fallback_suggestions(match_score, extracted_data)
-        
-        chat = LlmChat(
-            api_key=api_key,
-            session_id=str(uuid.uuid4()),
-            system_message="You are an expert resume analyst and career advisor. Provide specific, actionable feedback to improve resumes for better job matching."
-        ).with_model("openai", "gpt-4o-mini")
-        
-        prompt = f"""
+        scores = corpus_idf.scores(resume_texts, job_description)
+        if scores is not None:
+            return [float(score * 100) for score in scores]
+        from sklearn.feature_extraction.text import TfidfVectorizer
+        vectorizer = TfidfVectorizer(stop_words='english', ngram_range=(1, 2))
+        tfidf_matrix = vectorizer.fit_transform(
+            [job_description.lower()] + [text.lower() for text in resume_texts]
+        )
+        # Rows are L2-normalised, so one sparse product yields every cosine similarity
+        similarities = (tfidf_matrix[1:] @ tfidf_matrix[0].T).toarray().ravel()
+        return [float(similarity * 100) for similarity in similarities]
+    except Exception:
+        return [calculate_similarity_score(text, job_description) for text in resume_texts]
+
+# Local suggestions
+# Words common to most job descriptions that say nothing about the role itself; with a
+# fitted corpus IDF model they also get low weights
+JOB_DESCRIPTION_BOILERPLATE = frozenset({
+    'ability', 'able', 'apply', 'candidate', 'candidates', 'company', 'develop', 'environment',
+    'excellent', 'experience', 'good', 'great', 'ideal', 'including', 'join', 'job', 'knowledge',
+    'looking', 'new', 'opportunity', 'plus', 'preferred', 'required', 'requirements',
+    'responsibilities', 'responsible', 'role', 'senior', 'skills', 'strong', 'team', 'using', 'work',
+    'working', 'year', 'years'
+})
+LOCAL_SUGGESTION_SECTIONS = ('experience', 'education', 'skills')
+MAX_GAP_SKILLS = 5
+MAX_GAP_KEYWORDS = 5
+YEAR_RANGE_PATTERN = re.compile(r'\b((?:19|20)\d{2})[ \t]*[-–][ \t]*((?:19|20)\d{2}|[Pp]resent|[Cc]urrent)\b')
+# The lookbehind starts each number run once instead of at every digit in it
+QUANTIFIED_RESULT_PATTERN = re.compile(
+    r'(?<![\d,.])\d[\d,.]*[ \t]*(?:%|percent|x\b|k\b|m\b|\+)|[$€£][ \t]*\d', re.IGNORECASE
+)
+GENERIC_SUGGESTIONS = [
+    "Use action verbs to describe your accomplishments (achieved, implemented, led, etc.)",
+    "Include quantifiable results and metrics where possible (increased sales by 20%, managed team of 10, etc.)",
+    "Ensure your resume is ATS-friendly with clear section headers and standard formatting"
+]
+
+def join_terms(terms: List[str]) -> str:
+    return terms[0] if len(terms) == 1 else f"{', '.join(terms[:-1])} and {terms[-1]}"
+
+def years_of_experience(text: str, sections: List[Tuple[str, int, int]]) -> Optional[int]:
+    """Years of experience stated in the text, else the span of the dated roles."""
+    stated = YEARS_OF_EXPERIENCE_PATTERN.findall(text)
+    if stated:
+        return max(int(years) for years in stated)
+    current_year = datetime.utcnow().year
+    ranges = [
+        (int(start), current_year if not end.isdigit() else int(end))
+        for start, end in YEAR_RANGE_PATTERN.findall(section_text(text, sections, 'experience'))
+    ]
+    if not ranges:
+        return None
+    return max(end for _, end in ranges) - min(start for start, _ in ranges)
+
+@timed('job_gaps')
+def analyze_job_gaps(resume_text: str, job_description: str, extracted_data: Dict) -> Dict[str, Any]:
+    """Compare a resume with a job description: missing skills and keywords, sections and experience.
+    
+    Keywords are the job description's terms, from the same analyzer as the match score,
+    that the resume lacks, ranked by frequency times corpus IDF weight. Runs in a few
+    milliseconds, against seconds for an LLM round trip.
+    """
+    # Both sides are canonical taxonomy names, so "Java" is not found in "JavaScript"
+    # and synonyms count as mentions
+    resume_skills = set(skill_matcher.match(resume_text))
+    resume_skills.update(skill.lower() for skill in extracted_data.get('skills', []))
+    job_skills = skill_matcher.find(job_description)
+    missing_skills = sorted(
+        (skill for skill in job_skills if skill not in resume_skills),
+        # In the order the job description names them
+        key=lambda skill: (job_skills[skill], skill)
+    )[:MAX_GAP_SKILLS]
+    
+    analyzer = similarity_analyzer()
+    resume_terms = set(analyzer(resume_text))
+    term_counts: Dict[str, int] = {}
+    for term in analyzer(job_description):
+        term_counts[term] = term_counts.get(term, 0) + 1
+    skill_words = {word for skill in missing_skills for word in skill.lower().split()}
+    candidates = [
+        term for term, count in term_counts.items()
+        if term not in resume_terms
+        and not any(word.isdigit() or word in JOB_DESCRIPTION_BOILERPLATE or word in skill_words for word in term.split())
+        and (' ' in term and count > 1 or ' ' not in term and len(term) > 2)
+    ]
+    missing_keywords = []
+    if candidates:
+        idf = corpus_idf.term_idf(candidates)
+        # Phrases count once per word so they win over their own words
+        weights = np.array([term_counts[term] * len(term.split()) for term in candidates], dtype=np.float64)
+        if idf is not None:
+            weights *= idf
+        covered = set()
+        for index in np.argsort(-weights, kind='stable'):
+            term = candidates[index]
+            words = set(term.split())
+            # Skip a word already covered by a chosen phrase, and phrases of chosen words
+            if words & covered:
+                continue
+            missing_keywords.append(term)
+            covered |= words
+            if len(missing_keywords) == MAX_GAP_KEYWORDS:
+                break
+    
+    sections = segment_sections(resume_text)
+    present = {name for name, _, _ in sections}
+    missing_sections = [name for name in LOCAL_SUGGESTION_SECTIONS if name not in present] if has_sections(sections) else None
+    experience_text = section_text(resume_text, sections, 'experience')
+    
+    required = YEARS_OF_EXPERIENCE_PATTERN.findall(job_description)
+    return {
+        'missing_skills': missing_skills,
+        'missing_keywords': missing_keywords,
+        # None when the resume has no section headers at all
+        'missing_sections': missing_sections,
+        'quantified': bool(QUANTIFIED_RESULT_PATTERN.search(experience_text)),
+        'required_years': max(int(years) for years in required) if required else None,
+        'resume_years': years_of_experience(resume_text, sections)
+    }
+
+def build_local_suggestions(gaps: Dict[str, Any], match_score: float) -> Tuple[List[str], int]:
+    """Turn job gaps into suggestions, padded with general advice.
+    
+    Returns up to five suggestions and how many of them are specific to the job.
+    """
+    suggestions = []
+    if gaps['missing_skills']:
+        suggestions.append(
+            f"Add {join_terms(gaps['missing_skills'])} if you have experience with them; "
+            f"the job description asks for them and your resume does not mention them."
+        )
+    required_years, resume_years = gaps['required_years'], gaps['resume_years']
+    if required_years and (resume_years is None or resume_years < required_years):
+        shown = f"your resume shows about {resume_years}" if resume_years is not None else "your resume does not show how many"
+        suggestions.append(
+            f"The role asks for {required_years}+ years of experience and {shown}; state your total "
+            f"years of experience in your summary and give dates for every position."
+        )
+    if gaps['missing_keywords']:
+        suggestions.append(
+            f"Use the job description's wording where it matches your experience; it mentions "
+            f"{join_terms(gaps['missing_keywords'])}, which your resume does not."
+        )
+    if gaps['missing_sections'] is None:
+        suggestions.append("Organize your resume under clear headings such as Experience, Education and Skills so screening software can parse it.")
+    elif gaps['missing_sections']:
+        names = join_terms([name.capitalize() for name in gaps['missing_sections']])
+        suggestions.append(f"Add a clearly headed {names} section{'s' if len(gaps['missing_sections']) > 1 else ''}; screening software looks for it.")
+    if not gaps['quantified']:
+        suggestions.append("None of your experience includes a measurable result; add numbers such as percentages, revenue, users or team size.")
+    specific = len(suggestions)
+    
+    if match_score < 30 and specific < 5:
+        suggestions.append("Your resume has low similarity to the job requirements. Consider tailoring it more specifically to the role.")
+    # General advice, leaving out what the findings above already say
+    action_verbs, metrics, formatting = GENERIC_SUGGESTIONS
+    suggestions.append(action_verbs)
+    if gaps['quantified']:
+        suggestions.append(metrics)
+    if gaps['missing_sections'] is not None:
+        suggestions.append(formatting)
+    return suggestions[:5], min(specific, 5)
+
+async def generate_local_suggestions(resume_text: str, job_description: str, extracted_data: Dict,
+                                     match_score: float) -> Tuple[List[str], int]:
+    """Job-specific suggestions computed locally, and how many of them are job-specific."""
+    gaps = await run_cpu_bound(analyze_job_gaps, resume_text, job_description, extracted_data)
+    return build_local_suggestions(gaps, match_score)
+
+def wants_llm_refinement(tier: str, specific: int) -> bool:
+    if tier != 'full' or LLM_REFINEMENT_MODE == 'never':
+        return False
+    return LLM_REFINEMENT_MODE == 'always' or specific < LLM_REFINEMENT_MIN_FINDINGS
+
+async def generate_ai_feedback(resume_text: str, job_description: str, extracted_data: Dict, match_score: float,
+                              duplicate_of_text: Optional[str] = None,
+                              local_suggestions: Optional[List[str]] = None,
+                              on_suggestion: Optional[Callable[[str], None]] = None) -> List[str]:
+    """Generate AI-powered feedback using LLM.
+    
+    Results are cached per resume/job description pair, and concurrent identical
+    requests share a single in-flight LLM call. For a near-duplicate resume, pass the
+    text of the original as duplicate_of_text to reuse its suggestions for the same
+    job description. local_suggestions are given to the LLM to refine and returned
+    as they are if it cannot be reached. When this call starts the LLM request,
+    on_suggestion is called with each suggestion as it is streamed, and any streamed
+    suggestions are what is returned.
+    """
+    api_key = os.environ.get('EMERGENT_LLM_KEY')
+    if not api_key:
+        return local_suggestions or get_fallback_suggestions(match_score, extracted_data)
+    
+    key = feedback_cache_key(resume_text, job_description)
+    cached = await get_cached_document(feedback_cache, db.feedback_cache, key)
+    if cached is not None:
+        return cached['suggestions']
+    cached = await get_duplicate_feedback(duplicate_of_text, job_description)
+    if cached is not None:
+        return cached['suggestions']
+    
+    task = feedback_in_flight.get(key)
+    if task is None:
+        task = asyncio.create_task(
+            request_ai_feedback(api_key, key, resume_text, job_description, extracted_data, match_score,
+                                local_suggestions, on_suggestion)
+        )
+        feedback_in_flight[key] = task
+        task.add_done_callback(lambda _: feedback_in_flight.pop(key, None))
+    else:
+        feedback_stats['coalesced'] += 1
+    
+    # Shield the shared call so one client disconnecting does not cancel it for the others
+    suggestions = await asyncio.shield(task)
+    return suggestions or local_suggestions or get_fallback_suggestions(match_score, extracted_data)
+
+async def get_duplicate_feedback(duplicate_of_text: Optional[str], job_description: str) -> Optional[Dict[str, Any]]:
+    """Look up the cached suggestions of the resume this one nearly duplicates."""
+    if duplicate_of_text is None:
+        return None
+    cached = await get_cached_document(
+        feedback_cache, db.feedback_cache, feedback_cache_key(duplicate_of_text, job_description)
+    )
+    if cached is not None:
+        near_duplicate_stats['reused_suggestions'] += 1
+    return cached
+
+def build_feedback_chat(api_key: str):
+    return llm_chat.LlmChat(
+        api_key=api_key,
+        session_id=str(uuid.uuid4()),
+        system_message="You are an expert resume analyst and career advisor. Provide specific, actionable feedback to improve resumes for better job matching."
+    ).with_model(LLM_PROVIDER, LLM_MODEL)
+
+def build_feedback_prompt(resume_text: str, job_description: str, extracted_data: Dict, match_score: float,
+                          local_suggestions: Optional[List[str]] = None) -> str:
+    findings = '\n'.join(f"        - {suggestion}" for suggestion in local_suggestions or []) or "        - None"
+    return f"""
         Analyze this resume against the job description and provide specific improvement suggestions.
         
         RESUME CONTENT:
@@ -250,6 +2198,9 @@ async def generate_ai_feedback(resume_text: str, job_description: str, extracted
         
         MATCH SCORE: {match_score:.1f}%
         
+        FINDINGS FROM KEYWORD ANALYSIS (refine, correct or replace these):
+{findings}
+        
         Please provide 3-5 specific, actionable suggestions to improve this resume for the target job. Focus on:
         1. Missing skills or keywords from the job description
         2. Experience gaps or improvements
@@ -258,29 +2209,88 @@ async def generate_ai_feedback(resume_text: str, job_description: str, extracted
         
         Return ONLY the suggestions as a numbered list, one suggestion per line.
         """
+
+def parse_suggestion_line(line: str) -> Optional[str]:
+    """Return the suggestion on a numbered or bulleted response line, if any."""
+    line = line.strip()
+    if line and (line[0].isdigit() or line.startswith('-') or line.startswith('•')):
+        # Remove numbering/bullets and clean up
+        clean_suggestion = re.sub(r'^[\d\-•.\s]+', '', line).strip()
+        if clean_suggestion:
+            return clean_suggestion
+    return None
+
+async def request_ai_feedback(api_key: str, key: str, resume_text: str, job_description: str, extracted_data: Dict,
+                              match_score: float, local_suggestions: Optional[List[str]] = None,
+                              on_suggestion: Optional[Callable[[str], None]] = None) -> List[str]:
+    """Ask the LLM for suggestions and cache them; returns an empty list on failure.
+    
+    With on_suggestion, uses the chat's token stream when the client exposes one and
+    reports each suggestion as soon as its line is complete. Suggestions streamed
+    before a failure are kept.
+    """
+    suggestions = []
+    
+    def add(line: str):
+        suggestion = parse_suggestion_line(line)
+        if suggestion and len(suggestions) < 5:
+            suggestions.append(suggestion)
+            if on_suggestion:
+                on_suggestion(suggestion)
+    
+    try:
+        feedback_stats['llm_calls'] += 1
+        chat = build_feedback_chat(api_key)
+        prompt = build_feedback_prompt(resume_text, job_description, extracted_data, match_score, local_suggestions)
         
-        user_message = UserMessage(text=prompt)
-        response = await chat.send_message(user_message)
-        
-        # Parse suggestions from response
-        suggestions = []
-        lines = response.split('\n')
-        for line in lines:
-            line = line.strip()
-            if line and (line[0].isdigit() or line.startswith('-') or line.startswith('•')):
-                # Remove numbering/bullets and clean up
-                clean_suggestion = re.sub(r'^[\d\-•.\s]+', '', line).strip()
-                if clean_suggestion:
-                    suggestions.append(clean_suggestion)
-        
-        return suggestions[:5] if suggestions else get_fallback_suggestions(match_score, extracted_data)
-        
+        user_message = llm_chat.UserMessage(text=prompt)
+        stream_message = getattr(chat, 'stream_message', None) if on_suggestion else None
+        LLM_CALLS_IN_FLIGHT.inc()
+        try:
+            with stage_timer('llm'):
+                if stream_message is None:
+                    response = await chat.send_message(user_message)
+                    for line in response.split('\n'):
+                        add(line)
+                else:
+                    buffer = ''
+                    async for chunk in stream_message(user_message):
+                        buffer += chunk
+                        *lines, buffer = buffer.split('\n')
+                        for line in lines:
+                            add(line)
+                    add(buffer)
+        finally:
+            LLM_CALLS_IN_FLIGHT.dec()
     except Exception as e:
         logging.error(f"Error generating AI feedback: {str(e)}")
-        return get_fallback_suggestions(match_score, extracted_data)
+    
+    if suggestions:
+        await store_cached_document(feedback_cache, db.feedback_cache, key, {'suggestions': suggestions})
+    return suggestions
+
+async def generate_suggestions(tier: str, resume_text: str, job_description: str, extracted_data: Dict,
+                               match_score: float, duplicate_of_text: Optional[str] = None,
+                               on_suggestion: Optional[Callable[[str], None]] = None) -> List[str]:
+    """Suggestions for an analysis tier.
+    
+    Standard and full analyses get suggestions from the local keyword-gap engine, which
+    the LLM refines at full as LLM_REFINEMENT_MODE allows; minimal analyses get none.
+    on_suggestion receives LLM suggestions as they are streamed.
+    """
+    if tier == 'minimal':
+        return []
+    suggestions, specific = await generate_local_suggestions(resume_text, job_description, extracted_data, match_score)
+    if wants_llm_refinement(tier, specific):
+        return await generate_ai_feedback(
+            resume_text, job_description, extracted_data, match_score, duplicate_of_text, suggestions, on_suggestion
+        )
+    feedback_stats['local_only'] += 1
+    return suggestions
 
 def get_fallback_suggestions(match_score: float, extracted_data: Dict) -> List[str]:
     """Fallback suggestions when AI is not available."""
+    FALLBACK_SUGGESTIONS.inc()
     suggestions = []
     
     if match_score < 30:
@@ -294,91 +2304,1260 @@ def get_fallback_suggestions(match_score: float, extracted_data: Dict) -> List[s
     if len(extracted_data.get('experience', [])) < 2:
         suggestions.append("Include more detailed work experience with specific achievements and responsibilities.")
     
-    suggestions.extend([
-        "Use action verbs to describe your accomplishments (achieved, implemented, led, etc.)",
-        "Include quantifiable results and metrics where possible (increased sales by 20%, managed team of 10, etc.)",
-        "Ensure your resume is ATS-friendly with clear section headers and standard formatting"
-    ])
+    suggestions.extend(GENERIC_SUGGESTIONS)
     
     return suggestions[:5]
 
+# Process pool execution
+class WorkerError(Exception):
+    """Picklable carrier for HTTP errors raised inside pool workers."""
+    def __init__(self, status_code: int, detail: Any):
+        super().__init__(status_code, detail)
+        self.status_code = status_code
+        self.detail = detail
+
+def warm_up_components() -> Dict[str, str]:
+    """Import every extractor's dependencies and load the models, so the first request does not pay for it.
+    
+    Returns the status of each component; a missing optional dependency is reported,
+    not raised, since the pipeline falls back without it.
+    """
+    def spacy_status():
+        if not spacy_engine.nlp:
+            return 'regex fallback'
+        spacy_engine.parse("warm up")
+        return 'ok'
+
+    def image_status():
+        preprocess_for_ocr(Image.new('L', (8, 8), color=255))
+
+    checks = [
+        ('pdf', lambda: PyPDF2.PdfReader),
+        ('docx', lambda: docx.Document),
+        ('image', image_status),
+        ('ocr', pytesseract.get_tesseract_version),
+        ('spacy', spacy_status),
+        ('skills', lambda: skill_matcher.match("warm up")),
+        ('entities', lambda: extract_entities_with_regex("warm up")),
+        ('similarity', lambda: calculate_similarity_score("warm up", "warm up")),
+        ('llm', lambda: llm_chat.LlmChat)
+    ]
+    components = {}
+    for name, check in checks:
+        try:
+            status = check()
+            components[name] = status if isinstance(status, str) else 'ok'
+        except Exception as e:
+            components[name] = f"unavailable: {str(e)}"
+    return components
+
+def warm_up_worker():
+    """Warm up a pool worker when it starts."""
+    warm_up_components()
+
+def call_in_worker(func, *args):
+    """Run func in a worker, returning its result with the metric events it recorded.
+    
+    HTTPException is converted to a picklable error.
+    """
+    task_metric_events.events = []
+    try:
+        return func(*args), task_metric_events.events
+    except HTTPException as e:
+        raise WorkerError(e.status_code, e.detail)
+    finally:
+        task_metric_events.events = None
+
+def create_cpu_pool() -> ProcessPoolExecutor:
+    return ProcessPoolExecutor(
+        max_workers=CPU_POOL_WORKERS,
+        mp_context=multiprocessing.get_context(CPU_POOL_START_METHOD),
+        initializer=warm_up_worker
+    )
+
+def terminate_cpu_pool(processes: List[multiprocessing.Process]):
+    for process in processes:
+        if process.is_alive():
+            process.terminate()
+
+def recycle_cpu_pool(pool: ProcessPoolExecutor, reason: str):
+    """Replace a pool whose worker is stuck on a timed-out task, or that broke when a worker died.
+    
+    Tasks already queued on the old pool still run there; its workers are terminated
+    once CPU_TASK_TIMEOUT has passed, by which time every caller has given up on them.
+    """
+    global cpu_pool
+    if cpu_pool is not pool:
+        # Another failed task already replaced it
+        return
+    cpu_pool = create_cpu_pool()
+    CPU_POOL_RECYCLES.inc()
+    processes = list((pool._processes or {}).values())
+    pool.shutdown(wait=False)
+    asyncio.get_running_loop().call_later(CPU_TASK_TIMEOUT, terminate_cpu_pool, processes)
+    logging.warning(f"Replaced the CPU pool: {reason}")
+
+async def run_cpu_bound(func, *args):
+    """Run a CPU-bound pipeline stage off the event loop with a timeout."""
+    loop = asyncio.get_running_loop()
+    pool = cpu_pool
+    CPU_TASKS_IN_FLIGHT.inc()
+    try:
+        result, events = await asyncio.wait_for(
+            loop.run_in_executor(pool, call_in_worker, func, *args),
+            timeout=CPU_TASK_TIMEOUT
+        )
+    except WorkerError as e:
+        raise HTTPException(status_code=e.status_code, detail=e.detail)
+    except asyncio.TimeoutError:
+        if pool is not None:
+            recycle_cpu_pool(pool, f"a task exceeded {CPU_TASK_TIMEOUT:g} seconds")
+        raise HTTPException(status_code=504, detail=f"Processing timed out after {CPU_TASK_TIMEOUT:g} seconds")
+    except BrokenProcessPool:
+        # A worker died, e.g. OOM-killed or crashed in a native parser; a broken pool
+        # refuses every later task
+        recycle_cpu_pool(pool, "a worker process died")
+        raise HTTPException(status_code=500, detail="Processing failed: a worker process exited unexpectedly")
+    finally:
+        CPU_TASKS_IN_FLIGHT.dec()
+    for name, value, labels in events:
+        apply_metric_event(name, value, labels)
+    return result
+
+# Signature rows written before this time have been loaded into the local index
+near_duplicate_watermark: Optional[datetime] = None
+near_duplicate_sync_task: Optional[asyncio.Task] = None
+
+async def sync_near_duplicate_index():
+    """Load signatures stored since the last sync, including those from other processes."""
+    global near_duplicate_watermark
+    query = {'created_at': {'$gte': near_duplicate_watermark}} if near_duplicate_watermark else {}
+    try:
+        async for document in db.resume_signatures.find(query).sort('created_at', 1):
+            near_duplicate_index.add(document['_id'], np.frombuffer(document['signature'], dtype=np.uint32))
+            near_duplicate_watermark = document['created_at']
+    except Exception as e:
+        logging.warning(f"Could not load resume signatures: {str(e)}")
+
+async def near_duplicate_sync_loop():
+    while True:
+        await sync_near_duplicate_index()
+        await asyncio.sleep(NEAR_DUPLICATE_SYNC_INTERVAL)
+
+async def find_near_duplicate(file_hash: str, extracted_text: str) -> Optional[Dict[str, Any]]:
+    """Return the cached extraction of an earlier resume nearly identical to this one.
+    
+    When there is none, the resume's signature is indexed so later uploads can match it.
+    """
+    if not NEAR_DUPLICATE_ENABLED:
+        return None
+    signature = await run_cpu_bound(minhash_signature, extracted_text)
+    if signature is None:
+        return None
+    near_duplicate_stats['lookups'] += 1
+    match = near_duplicate_index.query(signature)
+    if match is not None and match[0] != file_hash:
+        original_hash, similarity = match
+        # The original's extraction may have expired or predate the current extractor
+        original = await get_cached_extraction(extraction_cache_key(original_hash))
+        if original is not None:
+            near_duplicate_stats['matches'] += 1
+            return {**original, 'file_hash': original_hash, 'similarity': round(similarity, 3)}
+    
+    near_duplicate_index.add(file_hash, signature)
+    try:
+        await db.resume_signatures.update_one(
+            {'_id': file_hash},
+            {'$setOnInsert': {'signature': signature.tobytes(), 'created_at': datetime.utcnow()}},
+            upsert=True
+        )
+    except Exception as e:
+        logging.warning(f"Could not store resume signature: {str(e)}")
+    return None
+
+async def extract_resume(upload: SpooledUpload, parse_entities: bool = True, tier: str = 'full') -> Dict[str, Any]:
+    """Extract text and entities from file content, reusing cached results for identical uploads.
+    
+    With parse_entities=False a cache miss returns entities=None; the caller is expected to
+    parse them (e.g. in a batch) and store the result with store_cached_extraction.
+    Below the full tier a cache miss gets regex entities ('standard') or none ('minimal'),
+    which are not cached.
+    
+    A near duplicate of an earlier resume reuses its entities, with contact details taken
+    from the new text, and is returned with the earlier extraction under 'near_duplicate'.
+    """
+    file_hash = upload.sha256
+    key = extraction_cache_key(file_hash)
+    cached = await get_cached_extraction(key)
+    if cached is not None:
+        return {**cached, 'file_hash': file_hash, 'cache_key': key, 'cache_hit': True, 'near_duplicate': None}
+    
+    extracted_text = await run_cpu_bound(extract_text, upload.file_extension, upload.source)
+    entities = None
+    near_duplicate = None
+    if tier != 'minimal':
+        near_duplicate = await find_near_duplicate(file_hash, extracted_text)
+    if near_duplicate is not None:
+        contact_info = extract_contact_info(extracted_text, segment_sections(extracted_text))
+        entities = {**near_duplicate['entities'], 'contact_info': contact_info}
+        await store_cached_extraction(key, extracted_text, entities)
+    elif tier == 'standard':
+        entities = await run_cpu_bound(extract_entities_with_regex, extracted_text)
+    elif tier == 'minimal':
+        entities = {'skills': [], 'experience': [], 'education': [], 'contact_info': {}}
+    elif parse_entities:
+        entities = await run_cpu_bound(extract_entities_with_spacy, extracted_text)
+        await store_cached_extraction(key, extracted_text, entities)
+    return {
+        'extracted_text': extracted_text,
+        'entities': entities,
+        'file_hash': file_hash,
+        'cache_key': key,
+        'cache_hit': False,
+        'near_duplicate': near_duplicate
+    }
+
+def near_duplicate_fields(extraction: Dict[str, Any]) -> Dict[str, Any]:
+    """AnalysisSummary fields flagging a near-duplicate extraction."""
+    near_duplicate = extraction['near_duplicate']
+    if near_duplicate is None:
+        return {}
+    return {'near_duplicate_of': near_duplicate['file_hash'], 'near_duplicate_similarity': near_duplicate['similarity']}
+
+def near_duplicate_text(extraction: Dict[str, Any]) -> Optional[str]:
+    near_duplicate = extraction['near_duplicate']
+    return near_duplicate['extracted_text'] if near_duplicate else None
+
+# Analysis history
+ANALYSIS_PAGE_SIZE = 20
+MAX_ANALYSIS_PAGE_SIZE = 100
+DUPLICATE_KEY_ERROR = 11000
+
+class WriteBehindBuffer:
+    """Collect documents in memory and write them to a collection with batched insert_many.
+    
+    A flush happens when flush_size documents are pending or flush_interval seconds have
+    passed. add() waits while max_size documents are pending, which applies backpressure
+    to callers when MongoDB falls behind. Documents whose _id is already stored, e.g.
+    from a retried write, are dropped; other failed documents are retried.
+    """
+    def __init__(self, collection_name: str, max_size: int, flush_size: int, flush_interval: float):
+        self.collection_name = collection_name
+        self.max_size = max_size
+        self.flush_size = flush_size
+        self.flush_interval = flush_interval
+        self._documents: List[Dict[str, Any]] = []
+        self._space = asyncio.Condition()
+        self._flush_requested = asyncio.Event()
+        self._flush_lock = asyncio.Lock()
+        self._task: Optional[asyncio.Task] = None
+        self.flushes = 0
+        self.failed_flushes = 0
+        self.written = 0
+        self.duplicates = 0
+        self.dropped = 0
+        self.last_flush_seconds = 0.0
+        self.total_flush_seconds = 0.0
+
+    async def add(self, documents: List[Dict[str, Any]]):
+        async with self._space:
+            await self._space.wait_for(lambda: len(self._documents) < self.max_size)
+            self._documents.extend(documents)
+            if len(self._documents) >= self.flush_size:
+                self._flush_requested.set()
+
+    def start(self):
+        self._task = asyncio.create_task(self._run())
+
+    async def close(self):
+        """Stop the background flusher and write everything still pending."""
+        task, self._task = self._task, None
+        if task:
+            # Let a flush in progress finish so its batch is not cut off mid-write
+            async with self._flush_lock:
+                task.cancel()
+            await asyncio.gather(task, return_exceptions=True)
+        await self.flush()
+
+    async def _run(self):
+        while True:
+            try:
+                await asyncio.wait_for(self._flush_requested.wait(), timeout=self.flush_interval)
+            except asyncio.TimeoutError:
+                pass
+            self._flush_requested.clear()
+            await self.flush()
+
+    async def flush(self):
+        async with self._flush_lock:
+            while self._documents:
+                batch = self._documents[:self.flush_size]
+                del self._documents[:self.flush_size]
+                async with self._space:
+                    self._space.notify_all()
+                
+                started = time.perf_counter()
+                try:
+                    await db[self.collection_name].insert_many(batch, ordered=False)
+                    self.written += len(batch)
+                except BulkWriteError as e:
+                    # Unordered inserts write every document that has no error of its own
+                    errors = e.details.get('writeErrors', [])
+                    duplicates = [error for error in errors if error.get('code') == DUPLICATE_KEY_ERROR]
+                    failed = [batch[error['index']] for error in errors if error.get('code') != DUPLICATE_KEY_ERROR]
+                    self.written += len(batch) - len(errors)
+                    self.duplicates += len(duplicates)
+                    if failed:
+                        self.requeue(failed, e)
+                        return
+                except asyncio.CancelledError:
+                    # Already written documents come back as duplicates on the next flush
+                    self._documents[:0] = batch
+                    raise
+                except Exception as e:
+                    self.requeue(batch, e)
+                    return
+                finally:
+                    self.last_flush_seconds = time.perf_counter() - started
+                    self.total_flush_seconds += self.last_flush_seconds
+                    self.flushes += 1
+
+    def requeue(self, documents: List[Dict[str, Any]], error: Exception):
+        """Keep failed documents for the next flush as long as there is room for them."""
+        self.failed_flushes += 1
+        room = max(0, self.max_size - len(self._documents))
+        self._documents[:0] = documents[:room]
+        self.dropped += len(documents) - room
+        logging.error(f"Could not write {len(documents)} documents to {self.collection_name}: {str(error)}")
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            'buffered': len(self._documents),
+            'max_size': self.max_size,
+            'flushes': self.flushes,
+            'failed_flushes': self.failed_flushes,
+            'written': self.written,
+            'duplicates': self.duplicates,
+            'dropped': self.dropped,
+            'last_flush_seconds': round(self.last_flush_seconds, 4),
+            'total_flush_seconds': round(self.total_flush_seconds, 4)
+        }
+
+analysis_writer = WriteBehindBuffer(
+    'analyses', ANALYSIS_WRITE_BUFFER_SIZE, ANALYSIS_FLUSH_BATCH_SIZE, ANALYSIS_FLUSH_INTERVAL
+)
+
+async def save_analyses(analyses: List[ResumeAnalysis]):
+    """Queue analyses for a batched background write.
+    
+    They become visible to the history endpoints within ANALYSIS_FLUSH_INTERVAL seconds.
+    """
+    if analyses:
+        await analysis_writer.add(
+            [{'_id': analysis.id, **analysis.model_dump(exclude={'id'})} for analysis in analyses]
+        )
+
+def encode_analysis_cursor(document: Dict[str, Any]) -> str:
+    position = json.dumps([document['timestamp'].isoformat(), document['_id']])
+    return base64.urlsafe_b64encode(position.encode('utf-8')).decode('ascii')
+
+def decode_analysis_cursor(cursor: str) -> Tuple[datetime, str]:
+    try:
+        timestamp, analysis_id = json.loads(base64.urlsafe_b64decode(cursor.encode('ascii')))
+        return datetime.fromisoformat(timestamp), analysis_id
+    except Exception:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+
+# Corpus IDF refits
+def count_document_terms(texts: List[str]) -> Dict[str, int]:
+    """Count the number of texts each scoring term occurs in."""
+    analyzer = similarity_analyzer()
+    counts: Dict[str, int] = {}
+    for text in texts:
+        for term in set(analyzer(text)):
+            counts[term] = counts.get(term, 0) + 1
+    return counts
+
+def write_corpus_idf_snapshot(path: str, snapshot: Dict[str, Any]):
+    """Write the snapshot next to its destination and rename it over, so readers never see a partial file."""
+    fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path) or '.', suffix='.tmp')
+    try:
+        with os.fdopen(fd, 'w', encoding='utf-8') as f:
+            json.dump(snapshot, f)
+        os.replace(tmp_path, path)
+    except BaseException:
+        os.unlink(tmp_path)
+        raise
+
+class CorpusIdfTrainer:
+    """Accumulate document frequencies and periodically refit the corpus IDF model.
+    
+    Texts seen by this process are counted in the CPU pool and added to the corpus_terms
+    collection with $inc, so every server process contributes to one shared corpus. A
+    refit reads the most frequent terms back and publishes the snapshot that corpus_idf
+    reloads. Counts are kept for every term, not only those in the published
+    vocabulary, so a term that becomes common later enters it with its full history.
+    """
+    def __init__(self, max_pending: int, refit_interval: float, min_documents: int, max_terms: int):
+        self.max_pending = max_pending
+        self.refit_interval = refit_interval
+        self.min_documents = min_documents
+        self.max_terms = max_terms
+        self._pending: List[str] = []
+        # Hashes of recently counted texts, so resubmissions and shared job descriptions count once
+        self._seen: OrderedDict = OrderedDict()
+        self._refit_requested = asyncio.Event()
+        self._refit_lock = asyncio.Lock()
+        self._task: Optional[asyncio.Task] = None
+        self.version: Optional[str] = None
+        self.documents = 0
+        self.terms = 0
+        self.counted = 0
+        self.dropped = 0
+        self.refits = 0
+        self.failed_refits = 0
+        self.last_refit_seconds = 0.0
+
+    def observe(self, texts: List[str]):
+        """Queue texts to be counted at the next refit."""
+        for text in texts:
+            digest = hashlib.sha256(text.encode('utf-8')).digest()
+            if digest in self._seen:
+                self._seen.move_to_end(digest)
+                continue
+            self._seen[digest] = None
+            if len(self._seen) > self.max_pending * 10:
+                self._seen.popitem(last=False)
+            if len(self._pending) >= self.max_pending:
+                self.dropped += 1
+                continue
+            self._pending.append(text)
+        if len(self._pending) >= self.max_pending:
+            self._refit_requested.set()
+
+    def start(self):
+        self._task = asyncio.create_task(self._run())
+
+    async def close(self):
+        """Stop refitting and add what is still pending to the stored counts."""
+        if self._task:
+            self._task.cancel()
+            self._task = None
+        # The CPU pool is already shut down at this point
+        await self.flush(in_process=True)
+
+    async def _run(self):
+        while True:
+            await self.refit()
+            try:
+                await asyncio.wait_for(self._refit_requested.wait(), timeout=self.refit_interval)
+            except asyncio.TimeoutError:
+                pass
+            self._refit_requested.clear()
+
+    async def flush(self, in_process: bool = False):
+        texts, self._pending = self._pending, []
+        if not texts:
+            return
+        try:
+            if in_process:
+                counts = await asyncio.to_thread(count_document_terms, texts)
+            else:
+                counts = await run_cpu_bound(count_document_terms, texts)
+            if counts:
+                await db.corpus_terms.bulk_write(
+                    [UpdateOne({'_id': term}, {'$inc': {'df': df}}, upsert=True) for term, df in counts.items()],
+                    ordered=False
+                )
+            await db.corpus_stats.update_one({'_id': 'documents'}, {'$inc': {'count': len(texts)}}, upsert=True)
+            self.counted += len(texts)
+        except Exception as e:
+            # A partly applied bulk write cannot be retried without double counting
+            self.dropped += len(texts)
+            logging.error(f"Could not add {len(texts)} documents to the corpus IDF counts: {str(e)}")
+
+    async def refit(self):
+        """Add pending counts, then rebuild and publish the snapshot from the stored counts."""
+        async with self._refit_lock:
+            started = time.perf_counter()
+            try:
+                await self.flush()
+                stats = await db.corpus_stats.find_one({'_id': 'documents'})
+                documents = stats['count'] if stats else 0
+                if documents < self.min_documents:
+                    return
+                rows = await db.corpus_terms.find({}, {'df': 1}).sort('df', -1).limit(self.max_terms).to_list(length=self.max_terms)
+                if not rows:
+                    return
+                df = np.asarray([row['df'] for row in rows], dtype=np.float64)
+                # Same smoothed IDF as TfidfVectorizer
+                idf = np.log((1 + documents) / (1 + df)) + 1
+                version = datetime.utcnow().strftime('%Y%m%d%H%M%S')
+                await asyncio.to_thread(write_corpus_idf_snapshot, CORPUS_IDF_PATH, {
+                    'version': version,
+                    'documents': documents,
+                    'terms': [row['_id'] for row in rows],
+                    'idf': idf.round(6).tolist()
+                })
+                self.version, self.documents, self.terms = version, documents, len(rows)
+                self.refits += 1
+            except Exception as e:
+                self.failed_refits += 1
+                logging.error(f"Corpus IDF refit failed: {str(e)}")
+            finally:
+                self.last_refit_seconds = time.perf_counter() - started
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            'version': self.version,
+            'documents': self.documents,
+            'terms': self.terms,
+            'pending': len(self._pending),
+            'counted': self.counted,
+            'dropped': self.dropped,
+            'refits': self.refits,
+            'failed_refits': self.failed_refits,
+            'last_refit_seconds': round(self.last_refit_seconds, 4)
+        }
+
+corpus_trainer = CorpusIdfTrainer(
+    CORPUS_IDF_MAX_PENDING, CORPUS_IDF_REFIT_INTERVAL, CORPUS_IDF_MIN_DOCUMENTS, CORPUS_IDF_MAX_TERMS
+)
+
+# Analysis pipeline
+async def run_analysis_pipeline(upload: SpooledUpload, job_description: str, job_id: Optional[str] = None,
+                                include_timings: bool = False, tier: str = 'auto',
+                                on_event: Optional[Callable[[str, Any], None]] = None) -> ResumeAnalysis:
+    """Run extraction, scoring and feedback for one resume.
+    
+    With include_timings the analysis carries the seconds spent in each stage. tier is
+    one of QUALITY_TIERS or 'auto' to choose from the current load. on_event is called
+    as stages complete; see analyze_upload.
+    """
+    tier = quality_tier_selector.resolve(tier)
+    timings: Dict[str, float] = {}
+    token = request_stage_timings.set(timings)
+    ANALYSES_IN_FLIGHT.inc()
+    try:
+        with stage_timer('total'):
+            analysis = await analyze_upload(upload, job_description, job_id, tier, on_event)
+    finally:
+        ANALYSES_IN_FLIGHT.dec()
+        request_stage_timings.reset(token)
+    
+    quality_tier_selector.record(tier, timings['total'])
+    if include_timings:
+        analysis.stage_timings = {stage: round(seconds, 4) for stage, seconds in timings.items()}
+    await save_analyses([analysis])
+    return analysis
+
+async def analyze_upload(upload: SpooledUpload, job_description: str, job_id: Optional[str],
+                         tier: str = 'full', on_event: Optional[Callable[[str, Any], None]] = None) -> ResumeAnalysis:
+    """Build the analysis for one resume without persisting it.
+    
+    on_event(event, data) is called with 'entities' after extraction, 'score' after
+    scoring and 'suggestion' for each LLM suggestion as it is streamed.
+    """
+    start_time = datetime.now()
+    
+    # Extract text and entities, skipping both for previously seen files
+    extraction = await extract_resume(upload, tier=tier)
+    extracted_text = extraction['extracted_text']
+    entities = extraction['entities']
+    if on_event:
+        on_event('entities', {
+            'filename': upload.filename,
+            'file_hash': extraction['file_hash'],
+            'cache_hit': extraction['cache_hit'],
+            'tier': tier,
+            **near_duplicate_fields(extraction),
+            **entities
+        })
+    
+    # Calculate job match score
+    match_score = await run_cpu_bound(calculate_similarity_score, extracted_text, job_description)
+    corpus_trainer.observe([extracted_text, job_description])
+    if on_event:
+        on_event('score', {'job_match_score': round(match_score, 1)})
+    
+    # Generate suggestions for the tier
+    with stage_timer('feedback'):
+        suggestions = await generate_suggestions(
+            tier, extracted_text, job_description, entities, match_score, near_duplicate_text(extraction),
+            functools.partial(on_event, 'suggestion') if on_event else None
+        )
+    
+    # Calculate processing time
+    processing_time = (datetime.now() - start_time).total_seconds()
+    
+    # Create analysis result
+    return ResumeAnalysis(
+        filename=upload.filename,
+        extracted_text=extracted_text,
+        skills=entities['skills'],
+        experience=entities['experience'],
+        education=entities['education'],
+        contact_info=entities['contact_info'],
+        job_match_score=round(match_score, 1),
+        suggestions=suggestions,
+        processing_time=round(processing_time, 2),
+        file_hash=extraction['file_hash'],
+        cache_hit=extraction['cache_hit'],
+        job_id=job_id,
+        tier=tier,
+        **near_duplicate_fields(extraction)
+    )
+
+# Background jobs
+job_queue: Optional[asyncio.Queue] = None
+job_workers: List[asyncio.Task] = []
+running_jobs: set = set()
+# Queue slots promised to submissions still writing their job document
+reserved_job_slots = 0
+
+async def submit_job(upload: SpooledUpload, job_description: str, tier: str = 'auto') -> AnalysisJob:
+    """Persist an analysis job and queue it for a background worker."""
+    global reserved_job_slots
+    # Reserve the slot before awaiting the insert so concurrent submissions cannot all
+    # pass the check and overfill the queue
+    if job_queue is None or job_queue.qsize() + reserved_job_slots >= job_queue.maxsize:
+        raise HTTPException(status_code=503, detail="Analysis job queue is full, try again later")
+    reserved_job_slots += 1
+    
+    now = datetime.utcnow()
+    job = AnalysisJob(id=str(uuid.uuid4()), status='queued', filename=upload.filename, created_at=now, updated_at=now)
+    try:
+        await db.analysis_jobs.insert_one({
+            '_id': job.id,
+            'status': job.status,
+            'filename': upload.filename,
+            'file_extension': upload.file_extension,
+            'file_content': upload.read_bytes(),
+            'job_description': job_description,
+            'tier': tier,
+            'created_at': now,
+            'updated_at': now
+        })
+    finally:
+        reserved_job_slots -= 1
+    try:
+        job_queue.put_nowait(job.id)
+    except asyncio.QueueFull:
+        # Requeued jobs from a previous process can take the slot; do not leave a job
+        # document behind that nothing will run
+        await db.analysis_jobs.delete_one({'_id': job.id})
+        raise HTTPException(status_code=503, detail="Analysis job queue is full, try again later")
+    return job
+
+async def claim_job(job_id: str, lease_id: str) -> Optional[Dict[str, Any]]:
+    """Atomically mark a job as running, unless another worker holds a live lease on it."""
+    now = datetime.utcnow()
+    return await db.analysis_jobs.find_one_and_update(
+        {
+            '_id': job_id,
+            '$or': [
+                {'status': 'queued'},
+                {'status': 'running', 'lease_expires_at': {'$lt': now}}
+            ]
+        },
+        {'$set': {
+            'status': 'running',
+            'updated_at': now,
+            'lease_id': lease_id,
+            'lease_expires_at': now + timedelta(seconds=JOB_LEASE_SECONDS)
+        }}
+    )
+
+async def renew_job_lease(job_id: str, lease_id: str) -> bool:
+    """Extend a running job's lease; False once another worker has taken the job over."""
+    now = datetime.utcnow()
+    result = await db.analysis_jobs.update_one(
+        {'_id': job_id, 'status': 'running', 'lease_id': lease_id},
+        {'$set': {'updated_at': now, 'lease_expires_at': now + timedelta(seconds=JOB_LEASE_SECONDS)}}
+    )
+    return result.matched_count > 0
+
+async def keep_job_lease(job_id: str, lease_id: str):
+    while True:
+        await asyncio.sleep(JOB_LEASE_SECONDS / 3)
+        try:
+            if not await renew_job_lease(job_id, lease_id):
+                logging.warning(f"Analysis job {job_id} was taken over by another worker")
+                return
+        except Exception as e:
+            # The lease is still valid for a while, so try again on the next round
+            logging.warning(f"Could not renew the lease on analysis job {job_id}: {str(e)}")
+
+async def finish_job(job_id: str, lease_id: str, status: str, result: Optional[Dict[str, Any]] = None, error: Optional[str] = None):
+    """Store a job outcome and drop its input; finished jobs expire after the retention period."""
+    now = datetime.utcnow()
+    outcome = await db.analysis_jobs.update_one(
+        # A worker whose lease was taken over must not overwrite the new owner's outcome
+        {'_id': job_id, 'lease_id': lease_id},
+        {
+            '$set': {'status': status, 'result': result, 'error': error, 'updated_at': now, 'finished_at': now},
+            '$unset': {'file_content': '', 'job_description': '', 'tier': '', 'lease_id': '', 'lease_expires_at': ''}
+        }
+    )
+    if not outcome.matched_count:
+        logging.warning(f"Dropped the {status} outcome of analysis job {job_id}: its lease was lost")
+
+async def run_job(job_id: str):
+    lease_id = str(uuid.uuid4())
+    job = await claim_job(job_id, lease_id)
+    if job is None:
+        return
+    
+    running_jobs.add(job_id)
+    lease_keeper = asyncio.create_task(keep_job_lease(job_id, lease_id))
+    try:
+        upload = SpooledUpload.from_bytes(job['filename'], job['file_extension'], job['file_content'])
+        # The tier is chosen when the job runs, from the load at that time
+        analysis = await run_analysis_pipeline(upload, job['job_description'], job_id=job_id, tier=job.get('tier', 'auto'))
+        await finish_job(job_id, lease_id, 'completed', result=analysis.model_dump())
+    except HTTPException as e:
+        await finish_job(job_id, lease_id, 'failed', error=str(e.detail))
+    except Exception as e:
+        logging.error(f"Error running analysis job {job_id}: {str(e)}")
+        await finish_job(job_id, lease_id, 'failed', error=f"Error processing resume: {str(e)}")
+    finally:
+        lease_keeper.cancel()
+        running_jobs.discard(job_id)
+
+async def job_worker():
+    while True:
+        job_id = await job_queue.get()
+        try:
+            await run_job(job_id)
+        except Exception as e:
+            logging.error(f"Analysis job worker error for {job_id}: {str(e)}")
+        finally:
+            job_queue.task_done()
+
+async def resume_unfinished_jobs():
+    """Requeue jobs left queued, or running under an expired lease, by a previous process."""
+    now = datetime.utcnow()
+    cursor = db.analysis_jobs.find(
+        {'$or': [{'status': 'queued'}, {'status': 'running', 'lease_expires_at': {'$lt': now}}]},
+        {'_id': 1}
+    ).sort('created_at', 1)
+    resumed = 0
+    try:
+        async for job in cursor:
+            # Waits for free queue slots rather than dropping jobs
+            await job_queue.put(job['_id'])
+            resumed += 1
+    except Exception as e:
+        logging.error(f"Could not resume unfinished analysis jobs: {str(e)}")
+    if resumed:
+        logging.info(f"Resumed {resumed} unfinished analysis jobs")
+
+# Response serialization
+ANALYSIS_FIELDS = set(ResumeAnalysis.model_fields)
+
+def parse_field_list(value: Optional[str]) -> Optional[set]:
+    if not value:
+        return None
+    names = {name.strip() for name in value.split(',') if name.strip()}
+    unknown = names - ANALYSIS_FIELDS
+    if unknown:
+        raise HTTPException(status_code=400, detail=f"Unknown fields: {', '.join(sorted(unknown))}")
+    return names
+
+class AnalysisFieldSelection:
+    """Which analysis fields a response includes, from the fields/exclude/compact query parameters."""
+    def __init__(
+        self,
+        fields: Optional[str] = Query(None, description="Comma-separated analysis fields to return"),
+        exclude: Optional[str] = Query(None, description="Comma-separated analysis fields to leave out"),
+        compact: bool = Query(False, description="Leave out extracted_text")
+    ):
+        self.include = parse_field_list(fields)
+        self.exclude = parse_field_list(exclude) or set()
+        if compact:
+            self.exclude.add('extracted_text')
+
+    def dump(self, analysis: AnalysisSummary, mode: str = 'python') -> Dict[str, Any]:
+        return analysis.model_dump(mode=mode, include=self.include, exclude=self.exclude or None)
+
+    def projection(self, always: Tuple[str, ...] = ()) -> Optional[Dict[str, int]]:
+        """MongoDB projection reading only the selected fields; None when all are selected."""
+        if self.include is None:
+            return None
+        return {('_id' if name == 'id' else name): 1 for name in {*self.include, *always}}
+
+# Warm-up
+warm_up_state: Dict[str, Any] = {'ready': False, 'seconds': None, 'components': {}}
+warm_up_task: Optional[asyncio.Task] = None
+
+async def warm_up():
+    """Load models and start the CPU pool workers in the background after the app has bound."""
+    started = time.perf_counter()
+    warm_up_state['components'] = await asyncio.to_thread(warm_up_components)
+    if cpu_pool:
+        # Start every worker up front; each warms itself up in its initializer
+        loop = asyncio.get_running_loop()
+        await asyncio.gather(*[
+            loop.run_in_executor(cpu_pool, calculate_similarity_score, "warm up", "warm up")
+            for _ in range(CPU_POOL_WORKERS)
+        ])
+    warm_up_state['seconds'] = round(time.perf_counter() - started, 3)
+    warm_up_state['ready'] = True
+    logging.info(f"Warm-up finished in {warm_up_state['seconds']}s: {warm_up_state['components']}")
+
 # API Routes
 @api_router.get("/")
 async def root():
     return {"message": "AI-Powered Smart Resume Analyser API"}
 
+@api_router.get("/healthz")
+async def healthz():
+    """Liveness: the process is serving requests."""
+    return {"status": "ok"}
+
+@api_router.get("/readyz")
+async def readyz():
+    """Readiness: models are loaded and the CPU pool is started. 503 while warming up."""
+    if not warm_up_state['ready']:
+        return JSONResponse(status_code=503, content={"status": "warming_up", **warm_up_state})
+    return {"status": "ready", **warm_up_state}
+
+@api_router.get("/stats")
+async def stats():
+    """Report cache statistics."""
+    return {
+        "extraction_cache": extraction_cache.stats(),
+        "feedback_cache": {**feedback_cache.stats(), **feedback_stats, 'in_flight': len(feedback_in_flight)},
+        "skill_taxonomy": {"version": skill_matcher.version, "size": skill_matcher.size},
+        "analysis_writes": analysis_writer.stats(),
+        "corpus_idf": corpus_trainer.stats(),
+        "near_duplicates": {**near_duplicate_stats, 'indexed': len(near_duplicate_index)},
+        "admission": {**admission_controller.stats(), 'clients': len(client_rate_limiter)},
+        "quality_tiers": quality_tier_selector.stats()
+    }
+
 @api_router.post("/analyze-resume", response_model=ResumeAnalysis)
 async def analyze_resume(
     file: UploadFile = File(...),
-    job_description: str = Form(...)
+    job_description: str = Form(...),
+    run_async: bool = Query(False, alias="async"),
+    timings: bool = Query(False),
+    tier: str = Query('auto', pattern=QUALITY_TIER_PATTERN),
+    selection: AnalysisFieldSelection = Depends()
 ):
-    """Analyze uploaded resume against job description."""
-    start_time = datetime.now()
+    """Analyze uploaded resume against job description.
     
+    With ?async=true the analysis is queued and a job is returned immediately;
+    poll GET /api/jobs/{id} for its result. With ?timings=true the response includes
+    the time spent in each pipeline stage. tier picks the analysis quality (full,
+    standard or minimal), by default chosen from the current load. fields, exclude and
+    compact select which fields are returned.
+    """
+    upload = None
     try:
-        # Validate file
-        if not file.filename:
-            raise HTTPException(status_code=400, detail="No file uploaded")
+        # Read file content, spooling large files to disk
+        upload = await spool_upload(file)
+        
+        if run_async:
+            job = await submit_job(upload, job_description, tier)
+            return JSONResponse(status_code=202, content=job.model_dump(mode='json'))
         
-        file_extension = file.filename.lower().split('.')[-1]
-        if file_extension not in ['pdf', 'docx', 'txt', 'jpg', 'jpeg', 'png']:
-            raise HTTPException(status_code=400, detail="Unsupported file format")
+        analysis = await run_analysis_pipeline(upload, job_description, include_timings=timings, tier=tier)
+        return ORJSONResponse(selection.dump(analysis))
+        
+    except HTTPException:
+        raise
+    except Exception as e:
+        logging.error(f"Error analyzing resume: {str(e)}")
+        raise HTTPException(status_code=500, detail=f"Error processing resume: {str(e)}")
+    finally:
+        if upload:
+            upload.cleanup()
+
+def format_stream_event(event: str, data: Any, stream_format: str) -> str:
+    if stream_format == 'sse':
+        return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+    return json.dumps({'event': event, 'data': data}) + "\n"
+
+@api_router.post("/analyze-resume/stream")
+async def analyze_resume_stream(
+    file: UploadFile = File(...),
+    job_description: str = Form(...),
+    stream_format: str = Query('ndjson', alias="format", pattern="^(ndjson|sse)$"),
+    tier: str = Query('auto', pattern=QUALITY_TIER_PATTERN)
+):
+    """Analyze an uploaded resume, streaming each stage as soon as it completes.
+    
+    Emits 'entities', then 'score', then one 'suggestion' event per suggestion and a
+    final 'result' event holding the complete ResumeAnalysis, as NDJSON lines or
+    server-sent events. The analysis runs through run_analysis_pipeline; LLM
+    suggestions are sent as they are streamed, the others once the pipeline finishes.
+    """
+    upload = await spool_upload(file)
+    stage_events: asyncio.Queue = asyncio.Queue()
+    
+    def emit(event: Optional[str], data: Any):
+        stage_events.put_nowait((event, data))
+    
+    def finished(_):
+        upload.cleanup()
+        emit(None, None)
+    
+    pipeline = asyncio.create_task(run_analysis_pipeline(upload, job_description, tier=tier, on_event=emit))
+    pipeline.add_done_callback(finished)
+    
+    # Extraction errors are reported with a proper status before the stream starts
+    try:
+        first_event = await stage_events.get()
+    except asyncio.CancelledError:
+        pipeline.cancel()
+        raise
+    if first_event[0] is None:
+        try:
+            pipeline.result()
+        except HTTPException:
+            raise
+        except Exception as e:
+            logging.error(f"Error streaming resume analysis: {str(e)}")
+            raise HTTPException(status_code=500, detail=f"Error processing resume: {str(e)}")
+    
+    async def events():
+        suggestions = 0
+        event, data = first_event
+        try:
+            while event is not None:
+                if event == 'suggestion':
+                    data = {'index': suggestions, 'text': data}
+                    suggestions += 1
+                yield format_stream_event(event, data, stream_format)
+                event, data = await stage_events.get()
+            
+            analysis = pipeline.result()
+            # Suggestions that were not streamed, e.g. local or cached ones
+            for text in analysis.suggestions[suggestions:]:
+                yield format_stream_event('suggestion', {'index': suggestions, 'text': text}, stream_format)
+                suggestions += 1
+            yield format_stream_event('result', analysis.model_dump(mode='json'), stream_format)
+        except HTTPException as e:
+            yield format_stream_event('error', {'status_code': e.status_code, 'detail': e.detail}, stream_format)
+        except Exception as e:
+            logging.error(f"Error streaming resume analysis: {str(e)}")
+            yield format_stream_event('error', {'status_code': 500, 'detail': f"Error processing resume: {str(e)}"}, stream_format)
+        finally:
+            # The client went away; shared LLM calls are shielded and keep running
+            pipeline.cancel()
+    
+    media_type = 'text/event-stream' if stream_format == 'sse' else 'application/x-ndjson'
+    return StreamingResponse(events(), media_type=media_type, headers={'Cache-Control': 'no-cache'})
+
+@api_router.post("/analyze-archive")
+async def analyze_archive(
+    file: UploadFile = File(...),
+    job_description: str = Form(...),
+    stream_format: str = Query('ndjson', alias="format", pattern="^(ndjson|sse)$"),
+    tier: str = Query('auto', pattern=QUALITY_TIER_PATTERN),
+    selection: AnalysisFieldSelection = Depends()
+):
+    """Analyze every resume in a ZIP archive, streaming one event per file as it finishes.
+    
+    Up to ARCHIVE_CONCURRENCY members are analyzed at once, each holding an admission
+    slot; each is inflated on its own and held to the single-upload limits. With tier=auto each member's tier is chosen
+    from the load when its analysis starts. Emits a 'result' event with the analysis or an
+    'error' event per file, in completion order with the member's index, then a final
+    'summary' event.
+    """
+    start_time = datetime.now()
+    if not file.filename or not file.filename.lower().endswith('.zip'):
+        raise HTTPException(status_code=400, detail="Upload a .zip archive")
+    
+    # The archive is spooled to disk past the spool threshold; members are inflated one at a time
+    upload = await spool_upload(file, MAX_ARCHIVE_BYTES, file_extension='zip')
+    try:
+        archive = zipfile.ZipFile(io.BytesIO(upload.content) if upload.content is not None else upload.path)
+    except zipfile.BadZipFile:
+        upload.cleanup()
+        raise HTTPException(status_code=400, detail="Invalid ZIP archive")
+    
+    members = [
+        member for member in archive.infolist()
+        if not member.is_dir()
+        and not member.filename.startswith('__MACOSX/')
+        and not os.path.basename(member.filename).startswith('.')
+    ]
+    uncompressed_size = sum(member.file_size for member in members)
+    if len(members) > ARCHIVE_MAX_MEMBERS or uncompressed_size > ARCHIVE_MAX_UNCOMPRESSED_BYTES:
+        archive.close()
+        upload.cleanup()
+        raise HTTPException(
+            status_code=413,
+            detail=f"Archive holds {len(members)} files and {uncompressed_size} bytes; limits are "
+                   f"{ARCHIVE_MAX_MEMBERS} files and {ARCHIVE_MAX_UNCOMPRESSED_BYTES} bytes"
+        )
+    
+    async def analyze_member(index: int, member: zipfile.ZipInfo) -> Tuple[str, Dict[str, Any]]:
+        member_upload = None
+        try:
+            file_extension = check_archive_member(member)
+            UPLOADS.inc(file_extension)
+            async with admission_slots():
+                member_upload = await asyncio.to_thread(spool_archive_member, archive, member, file_extension)
+                analysis = await run_analysis_pipeline(member_upload, job_description, tier=tier)
+            return 'result', {'index': index, **selection.dump(analysis, mode='json')}
+        except HTTPException as e:
+            return 'error', {'index': index, 'filename': member.filename, 'status_code': e.status_code, 'detail': e.detail}
+        except Exception as e:
+            logging.error(f"Error analyzing {member.filename} from archive: {str(e)}")
+            return 'error', {
+                'index': index, 'filename': member.filename, 'status_code': 500,
+                'detail': f"Error processing resume: {str(e)}"
+            }
+        finally:
+            if member_upload:
+                member_upload.cleanup()
+    
+    async def events():
+        # Workers stop pulling members while the client is slower than the pipeline
+        finished: asyncio.Queue = asyncio.Queue(maxsize=ARCHIVE_CONCURRENCY)
+        pending = iter(enumerate(members))
         
-        # Read file content
-        file_content = await file.read()
+        async def worker():
+            for index, member in pending:
+                await finished.put(await analyze_member(index, member))
         
-        # Extract text based on file type
-        if file_extension == 'pdf':
-            extracted_text = extract_text_from_pdf(file_content)
-        elif file_extension == 'docx':
-            extracted_text = extract_text_from_docx(file_content)
-        elif file_extension == 'txt':
-            extracted_text = file_content.decode('utf-8')
-        elif file_extension in ['jpg', 'jpeg', 'png']:
-            extracted_text = extract_text_from_image_ocr(file_content)
+        workers = [asyncio.create_task(worker()) for _ in range(min(ARCHIVE_CONCURRENCY, len(members)))]
+        failed = 0
+        try:
+            for _ in range(len(members)):
+                event, data = await finished.get()
+                failed += event == 'error'
+                yield format_stream_event(event, data, stream_format)
+            yield format_stream_event('summary', {
+                'files': len(members),
+                'succeeded': len(members) - failed,
+                'failed': failed,
+                'processing_time': round((datetime.now() - start_time).total_seconds(), 2)
+            }, stream_format)
+        finally:
+            for task in workers:
+                task.cancel()
+            await asyncio.gather(*workers, return_exceptions=True)
+            archive.close()
+            upload.cleanup()
+    
+    media_type = 'text/event-stream' if stream_format == 'sse' else 'application/x-ndjson'
+    return StreamingResponse(events(), media_type=media_type, headers={'Cache-Control': 'no-cache'})
+
+@api_router.get("/analyses", response_model=AnalysisPage)
+async def list_analyses(
+    limit: int = Query(ANALYSIS_PAGE_SIZE, ge=1, le=MAX_ANALYSIS_PAGE_SIZE),
+    cursor: Optional[str] = None,
+    file_hash: Optional[str] = None,
+    job_id: Optional[str] = None,
+    selection: AnalysisFieldSelection = Depends()
+):
+    """List stored analyses, newest first, without their extracted text.
+    
+    Pass the returned next_cursor to fetch the following page. fields and exclude
+    select which fields each item includes.
+    """
+    query: Dict[str, Any] = {}
+    if file_hash:
+        query['file_hash'] = file_hash
+    if job_id:
+        query['job_id'] = job_id
+    if cursor:
+        timestamp, analysis_id = decode_analysis_cursor(cursor)
+        query['$or'] = [
+            {'timestamp': {'$lt': timestamp}},
+            {'timestamp': timestamp, '_id': {'$lt': analysis_id}}
+        ]
+    
+    # The cursor is built from timestamp and _id, so they are read even when not selected
+    projection = selection.projection(always=('timestamp',)) or {'extracted_text': 0}
+    documents = await db.analyses.find(query, projection) \
+        .sort([('timestamp', -1), ('_id', -1)]) \
+        .limit(limit + 1) \
+        .to_list(limit + 1)
+    
+    next_cursor = encode_analysis_cursor(documents[limit - 1]) if len(documents) > limit else None
+    items = []
+    for document in documents[:limit]:
+        document['id'] = document.pop('_id')
+        if selection.include is None:
+            items.append(selection.dump(AnalysisSummary(**document)))
         else:
-            raise HTTPException(status_code=400, detail="Unsupported file format")
+            # Projected documents are partial, so they are returned without validation
+            items.append({name: document.get(name) for name in selection.include - selection.exclude})
+    return ORJSONResponse({'items': items, 'next_cursor': next_cursor})
+
+@api_router.get("/analyses/{analysis_id}", response_model=ResumeAnalysis)
+async def get_analysis(analysis_id: str, selection: AnalysisFieldSelection = Depends()):
+    """Get a stored analysis without re-running the pipeline."""
+    document = await db.analyses.find_one({'_id': analysis_id})
+    if not document:
+        raise HTTPException(status_code=404, detail="Analysis not found")
+    return ORJSONResponse(selection.dump(ResumeAnalysis(id=document.pop('_id'), **document)))
+
+@api_router.get("/jobs/{job_id}", response_model=AnalysisJob)
+async def get_job(job_id: str, selection: AnalysisFieldSelection = Depends()):
+    """Get the status and, once completed, the result of an analysis job."""
+    job = await db.analysis_jobs.find_one({'_id': job_id}, {'file_content': 0, 'job_description': 0})
+    if not job:
+        raise HTTPException(status_code=404, detail="Job not found")
+    job = AnalysisJob(id=job.pop('_id'), **job)
+    return ORJSONResponse({
+        **job.model_dump(exclude={'result'}),
+        'result': selection.dump(job.result) if job.result else None
+    })
+
+@api_router.post("/analyze-resumes", response_model=BatchResumeAnalysis)
+async def analyze_resumes(
+    files: List[UploadFile] = File(...),
+    job_description: str = Form(...),
+    tier: str = Query('auto', pattern=QUALITY_TIER_PATTERN),
+    selection: AnalysisFieldSelection = Depends()
+):
+    """Analyze many uploaded resumes against one job description and rank them.
+    
+    The batch holds one admission slot per file and runs at one tier.
+    """
+    async with admission_slots(len(files)):
+        return await analyze_batch(files, job_description, tier, selection)
+
+async def analyze_batch(files: List[UploadFile], job_description: str, tier: str,
+                        selection: AnalysisFieldSelection):
+    start_time = datetime.now()
+    tier = quality_tier_selector.resolve(tier)
+    
+    try:
+        async def process(file: UploadFile):
+            upload = await spool_upload(file)
+            try:
+                extraction = await extract_resume(upload, parse_entities=False, tier=tier)
+            finally:
+                upload.cleanup()
+            return file.filename, extraction
         
-        if not extracted_text.strip():
-            raise HTTPException(status_code=400, detail="Could not extract text from file")
+        # Extract every file in parallel, collecting per-file errors instead of failing the batch
+        extracted = []
+        errors = []
+        outcomes = await asyncio.gather(*[process(file) for file in files], return_exceptions=True)
+        for file, outcome in zip(files, outcomes):
+            if isinstance(outcome, HTTPException):
+                errors.append(BatchFileError(filename=file.filename, detail=str(outcome.detail)))
+            elif isinstance(outcome, BaseException):
+                raise outcome
+            else:
+                extracted.append(outcome)
         
-        # Extract entities and information
-        entities = extract_entities_with_spacy(extracted_text)
+        # Parse entities for every cache miss in one spaCy pipe
+        unparsed = [extraction for _, extraction in extracted if extraction['entities'] is None]
+        if unparsed:
+            parsed = await run_cpu_bound(
+                extract_entities_with_spacy_batch,
+                [extraction['extracted_text'] for extraction in unparsed]
+            )
+            for extraction, entities in zip(unparsed, parsed):
+                extraction['entities'] = entities
+                await store_cached_extraction(extraction['cache_key'], extraction['extracted_text'], entities)
         
-        # Calculate job match score
-        match_score = calculate_similarity_score(extracted_text, job_description)
+        # Score all resumes in one vectorized pass
+        resume_texts = [extraction['extracted_text'] for _, extraction in extracted]
+        match_scores = await run_cpu_bound(calculate_similarity_scores, resume_texts, job_description)
+        corpus_trainer.observe(resume_texts + [job_description])
         
-        # Generate AI-powered suggestions
-        suggestions = await generate_ai_feedback(
-            extracted_text, job_description, entities, match_score
-        )
+        # Generate suggestions with bounded concurrency
+        semaphore = asyncio.Semaphore(BATCH_LLM_CONCURRENCY)
+        
+        async def feedback(extraction: Dict[str, Any], match_score: float) -> List[str]:
+            async with semaphore:
+                return await generate_suggestions(
+                    tier, extraction['extracted_text'], job_description, extraction['entities'], match_score,
+                    near_duplicate_text(extraction)
+                )
+        
+        all_suggestions = await asyncio.gather(*[
+            feedback(extraction, match_score)
+            for (_, extraction), match_score in zip(extracted, match_scores)
+        ])
         
-        # Calculate processing time
         processing_time = (datetime.now() - start_time).total_seconds()
         
-        # Create analysis result
-        analysis = ResumeAnalysis(
-            extracted_text=extracted_text,
-            skills=entities['skills'],
-            experience=entities['experience'],
-            education=entities['education'],
-            contact_info=entities['contact_info'],
-            job_match_score=round(match_score, 1),
-            suggestions=suggestions,
+        results = [
+            ResumeAnalysis(
+                filename=filename,
+                extracted_text=extraction['extracted_text'],
+                skills=extraction['entities']['skills'],
+                experience=extraction['entities']['experience'],
+                education=extraction['entities']['education'],
+                contact_info=extraction['entities']['contact_info'],
+                job_match_score=round(match_score, 1),
+                suggestions=suggestions,
+                processing_time=round(processing_time, 2),
+                file_hash=extraction['file_hash'],
+                cache_hit=extraction['cache_hit'],
+                tier=tier,
+                **near_duplicate_fields(extraction)
+            )
+            for (filename, extraction), match_score, suggestions
+            in zip(extracted, match_scores, all_suggestions)
+        ]
+        
+        await save_analyses(results)
+        
+        ranked = sorted(results, key=lambda analysis: analysis.job_match_score, reverse=True)
+        ranking = [
+            RankedResume(
+                rank=position,
+                id=analysis.id,
+                filename=analysis.filename,
+                job_match_score=analysis.job_match_score
+            )
+            for position, analysis in enumerate(ranked, start=1)
+        ]
+        
+        batch = BatchResumeAnalysis(
+            results=results,
+            ranking=ranking,
+            errors=errors,
             processing_time=round(processing_time, 2)
         )
-        
-        return analysis
+        return ORJSONResponse({
+            **batch.model_dump(exclude={'results'}),
+            'results': [selection.dump(analysis) for analysis in batch.results]
+        })
         
     except HTTPException:
         raise
     except Exception as e:
-        logging.error(f"Error analyzing resume: {str(e)}")
-        raise HTTPException(status_code=500, detail=f"Error processing resume: {str(e)}")
+        logging.error(f"Error analyzing resumes: {str(e)}")
+        raise HTTPException(status_code=500, detail=f"Error processing resumes: {str(e)}")
+
+@app.get("/metrics", include_in_schema=False)
+async def metrics():
+    """Expose metrics in Prometheus text format."""
+    return PlainTextResponse(render_metrics(), media_type="text/plain; version=0.0.4")
 
 # Include the router in the main app
 app.include_router(api_router)
 
+app.add_middleware(RequestSizeLimitMiddleware, max_bytes=MAX_REQUEST_BYTES, route_limits={
+    '/api/analyze-resume': MAX_UPLOAD_BYTES + MULTIPART_OVERHEAD_BYTES,
+    '/api/analyze-resume/stream': MAX_UPLOAD_BYTES + MULTIPART_OVERHEAD_BYTES,
+    '/api/analyze-archive': MAX_ARCHIVE_BYTES + MULTIPART_OVERHEAD_BYTES
+})
+
+app.add_middleware(GZipMiddleware, minimum_size=GZIP_MINIMUM_SIZE, compresslevel=GZIP_COMPRESS_LEVEL)
+
+app.add_middleware(
+    AdmissionControlMiddleware,
+    controller=admission_controller,
+    limiter=client_rate_limiter,
+    path_prefix=ADMISSION_PATH_PREFIX,
+    trust_forwarded_for=ADMISSION_TRUST_FORWARDED_FOR,
+    handler_paths=ADMISSION_HANDLER_PATHS
+)
+
 app.add_middleware(
     CORSMiddleware,
     allow_credentials=True,
@@ -394,6 +3573,100 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
+@app.on_event("startup")
+async def startup_cpu_pool():
+    global cpu_pool
+    if CPU_POOL_WORKERS <= 0:
+        return
+    cpu_pool = create_cpu_pool()
+    logger.info(f"Started CPU pool with {CPU_POOL_WORKERS} workers")
+
+@app.on_event("startup")
+async def startup_warm_up():
+    global warm_up_task
+    warm_up_task = asyncio.create_task(warm_up())
+
+@app.on_event("startup")
+async def create_cache_indexes():
+    try:
+        await db.extraction_cache.create_index('created_at', expireAfterSeconds=EXTRACTION_CACHE_TTL)
+        await db.feedback_cache.create_index('created_at', expireAfterSeconds=FEEDBACK_CACHE_TTL)
+        # Signatures are only useful while the extraction they point to is cached
+        await db.resume_signatures.create_index('created_at', expireAfterSeconds=EXTRACTION_CACHE_TTL)
+    except Exception as e:
+        logger.warning(f"Could not create cache indexes: {str(e)}")
+
+@app.on_event("startup")
+async def create_analysis_indexes():
+    # Listing sorts on (timestamp, _id); filtered listings use the compound indexes
+    try:
+        await db.analyses.create_index([('timestamp', -1), ('_id', -1)])
+        await db.analyses.create_index([('file_hash', 1), ('timestamp', -1), ('_id', -1)])
+        await db.analyses.create_index([('job_id', 1), ('timestamp', -1), ('_id', -1)], sparse=True)
+    except Exception as e:
+        logger.warning(f"Could not create analysis indexes: {str(e)}")
+
+@app.on_event("startup")
+async def startup_analysis_writer():
+    analysis_writer.start()
+
+@app.on_event("startup")
+async def startup_corpus_trainer():
+    try:
+        await db.corpus_terms.create_index('df')
+    except Exception as e:
+        logger.warning(f"Could not create corpus term indexes: {str(e)}")
+    corpus_trainer.start()
+
+@app.on_event("startup")
+async def startup_near_duplicate_sync():
+    global near_duplicate_sync_task
+    if NEAR_DUPLICATE_ENABLED:
+        near_duplicate_sync_task = asyncio.create_task(near_duplicate_sync_loop())
+
+Gauge('resume_jobs_queued', 'Analysis jobs waiting in the in-process queue',
+      function=lambda: job_queue.qsize() if job_queue else 0)
+Gauge('resume_analysis_writes_buffered', 'Analyses waiting to be written to MongoDB',
+      function=lambda: analysis_writer.stats()['buffered'])
+
+@app.on_event("startup")
+async def startup_job_workers():
+    global job_queue
+    job_queue = asyncio.Queue(maxsize=JOB_QUEUE_MAXSIZE)
+    job_workers.extend(asyncio.create_task(job_worker()) for _ in range(JOB_CONCURRENCY))
+    try:
+        await db.analysis_jobs.create_index('finished_at', expireAfterSeconds=JOB_RETENTION_SECONDS)
+        await db.analysis_jobs.create_index([('status', 1), ('created_at', 1)])
+    except Exception as e:
+        logger.warning(f"Could not create analysis job indexes: {str(e)}")
+    job_workers.append(asyncio.create_task(resume_unfinished_jobs()))
+
+@app.on_event("shutdown")
+async def shutdown_cpu_pool():
+    if warm_up_task:
+        warm_up_task.cancel()
+    if near_duplicate_sync_task:
+        near_duplicate_sync_task.cancel()
+    if cpu_pool:
+        cpu_pool.shutdown(wait=False, cancel_futures=True)
+
+@app.on_event("shutdown")
+async def shutdown_job_workers():
+    for task in job_workers:
+        task.cancel()
+    # Hand interrupted jobs back to the queue so the next process picks them up at once
+    if running_jobs:
+        try:
+            await db.analysis_jobs.update_many(
+                {'_id': {'$in': list(running_jobs)}, 'status': 'running'},
+                {'$set': {'status': 'queued'}, '$unset': {'lease_id': '', 'lease_expires_at': ''}}
+            )
+        except Exception as e:
+            logger.warning(f"Could not requeue interrupted analysis jobs: {str(e)}")
+
 @app.on_event("shutdown")
 async def shutdown_db_client():
+    # Write buffered analyses before the connection goes away
+    await analysis_writer.close()
+    await corpus_trainer.close()
     client.close()
\ No newline at end of file
@@ -0,0 +1,449 @@
+#!/usr/bin/env python3
+"""
+Offline Benchmark Suite for AI-Powered Smart Resume Analyser
+Benchmarks every pipeline stage against a synthetic resume corpus without a
+deployed server or LLM key, and compares the results with a stored baseline.
+
+    python backend_benchmark.py                        # run and print results
+    python backend_benchmark.py --save-baseline        # store results as the new baseline
+    python backend_benchmark.py --only extract,endpoint
+    python backend_benchmark.py --only import --max-import-seconds 1.5   # CI startup check
+
+Exits non-zero when a benchmark's p50 regresses beyond --tolerance and by more than
+--min-delta-ms, or when there is no baseline to compare with. Save baselines on a host
+with tesseract and the spaCy model installed, so the OCR and spaCy benchmarks are
+recorded and the endpoint timings include them.
+"""
+
+import argparse
+import asyncio
+import io
+import json
+import os
+import platform
+import shutil
+import statistics
+import subprocess
+import sys
+import time
+import tracemalloc
+from pathlib import Path
+from types import SimpleNamespace
+
+BACKEND_DIR = Path(__file__).parent / "backend"
+DEFAULT_BASELINE = Path(__file__).parent / "benchmark_baseline.json"
+
+# Keep every stage in this process so timings and tracemalloc see the work, and
+# never reach a real LLM
+os.environ.setdefault("CPU_POOL_WORKERS", "0")
+os.environ.setdefault("MONGO_URL", "mongodb://localhost:27017")
+os.environ.setdefault("DB_NAME", "resume_benchmark")
+os.environ.setdefault("EMERGENT_LLM_KEY", "benchmark")
+os.environ.setdefault("ANALYSIS_FLUSH_INTERVAL", "0.05")
+# Every benchmark request comes from one client; do not rate-limit it
+os.environ.setdefault("ADMISSION_CLIENT_RATE", "1000000")
+sys.path.insert(0, str(BACKEND_DIR))
+
+import docx
+from PIL import Image, ImageDraw, ImageFont
+
+JOB_DESCRIPTION = """
+We are looking for a Senior Software Engineer with experience in:
+- Python programming and web development with Django or FastAPI
+- React and JavaScript frameworks
+- Database management (SQL, PostgreSQL, MongoDB)
+- Cloud platforms (AWS, Azure) and Docker, Kubernetes
+- Team leadership and project management
+"""
+
+RESUME_HEADER = """John Smith
+Software Engineer
+Email: john.smith@email.com
+Phone: (555) 123-4567
+"""
+
+EXPERIENCE_BLOCK = """Senior Software Engineer at TechCorp {year_from}-{year_to}
+- Developed web applications using Python, JavaScript, React and PostgreSQL
+- Led a team of 5 developers delivering AWS and Docker based services
+- Implemented machine learning pipelines with pandas, numpy and scikit-learn
+- Increased system performance by 40 percent
+"""
+
+EDUCATION_BLOCK = """Bachelor of Science in Computer Science
+State University {year_from}-{year_to}
+"""
+
+SKILLS_BLOCK = """Python, JavaScript, React, Node.js, SQL, MongoDB, AWS, Docker, Kubernetes, Git
+Machine Learning, Data Analysis, Agile, Scrum, Project Management
+"""
+
+# Number of experience blocks per corpus size
+CORPUS_SIZES = {"short": 1, "medium": 4, "long": 12}
+
+class StubChat:
+    """Stands in for LlmChat with a fixed latency and a canned numbered list."""
+    latency = 0.02
+
+    def __init__(self, api_key=None, session_id=None, system_message=None):
+        pass
+
+    def with_model(self, provider, model):
+        return self
+
+    async def send_message(self, user_message):
+        await asyncio.sleep(self.latency)
+        return (
+            "1. Add Kubernetes projects to the experience section\n"
+            "2. Quantify the impact of the AWS migration\n"
+            "3. Mention FastAPI alongside Django\n"
+            "4. Move the skills section above education\n"
+            "5. Add a short professional summary"
+        )
+
+class StubUserMessage:
+    def __init__(self, text):
+        self.text = text
+
+# Replaces the emergentintegrations chat module, which the benchmark does not need installed
+STUB_LLM_CHAT = SimpleNamespace(LlmChat=StubChat, UserMessage=StubUserMessage)
+
+def resume_text(size: str, variant: int = 0) -> str:
+    blocks = CORPUS_SIZES[size]
+    experience = "".join(
+        EXPERIENCE_BLOCK.format(year_from=2000 + i, year_to=2001 + i) for i in range(blocks)
+    )
+    education = EDUCATION_BLOCK.format(year_from=1996, year_to=2000)
+    text = f"{RESUME_HEADER}\nEXPERIENCE\n{experience}\nEDUCATION\n{education}\nSKILLS\n{SKILLS_BLOCK}"
+    if variant:
+        # Distinct content so the extraction and feedback caches miss
+        text += f"\nReference {variant}\n"
+    return text
+
+def make_docx(text: str) -> bytes:
+    document = docx.Document()
+    for line in text.splitlines():
+        document.add_paragraph(line)
+    buffer = io.BytesIO()
+    document.save(buffer)
+    return buffer.getvalue()
+
+def make_pdf(text: str, lines_per_page: int = 45) -> bytes:
+    """Write a minimal PDF with a Helvetica text layer."""
+    lines = [
+        line.replace("\\", "\\\\").replace("(", "\\(").replace(")", "\\)")
+        for line in text.splitlines()
+    ]
+    pages = [lines[i:i + lines_per_page] for i in range(0, len(lines), lines_per_page)] or [[]]
+    font_id = 3 + 2 * len(pages)
+    objects = [
+        "<< /Type /Catalog /Pages 2 0 R >>",
+        "<< /Type /Pages /Kids [{}] /Count {} >>".format(
+            " ".join(f"{3 + 2 * i} 0 R" for i in range(len(pages))), len(pages)
+        ),
+    ]
+    for i, page_lines in enumerate(pages):
+        objects.append(
+            f"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 612 792] /Contents {4 + 2 * i} 0 R "
+            f"/Resources << /Font << /F1 {font_id} 0 R >> >> >>"
+        )
+        body = "BT /F1 11 Tf 50 750 Td 15 TL " + " ".join(f"({line}) Tj T*" for line in page_lines) + " ET"
+        objects.append(f"<< /Length {len(body)} >>\nstream\n{body}\nendstream")
+    objects.append("<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica >>")
+
+    output = b"%PDF-1.4\n"
+    offsets = []
+    for number, obj in enumerate(objects, start=1):
+        offsets.append(len(output))
+        output += f"{number} 0 obj\n{obj}\nendobj\n".encode("latin-1")
+    xref = len(output)
+    output += f"xref\n0 {len(objects) + 1}\n0000000000 65535 f \n".encode()
+    for offset in offsets:
+        output += f"{offset:010d} 00000 n \n".encode()
+    output += f"trailer\n<< /Size {len(objects) + 1} /Root 1 0 R >>\nstartxref\n{xref}\n%%EOF\n".encode()
+    return output
+
+def make_png(text: str) -> bytes:
+    lines = [line for line in text.splitlines() if line.strip()]
+    image = Image.new("L", (1700, 80 + 40 * len(lines)), color=255)
+    draw = ImageDraw.Draw(image)
+    try:
+        font = ImageFont.truetype("DejaVuSans.ttf", 28)
+    except OSError:
+        font = ImageFont.load_default()
+    for i, line in enumerate(lines):
+        draw.text((60, 40 + 40 * i), line, fill=0, font=font)
+    buffer = io.BytesIO()
+    image.save(buffer, format="PNG")
+    return buffer.getvalue()
+
+def build_corpus():
+    """Synthetic resumes keyed by (format, size)."""
+    corpus = {}
+    for size in CORPUS_SIZES:
+        text = resume_text(size)
+        corpus[("txt", size)] = text.encode("utf-8")
+        corpus[("docx", size)] = make_docx(text)
+        corpus[("pdf", size)] = make_pdf(text)
+        corpus[("png", size)] = make_png(text)
+    return corpus
+
+def percentile(samples, fraction):
+    ordered = sorted(samples)
+    index = min(len(ordered) - 1, max(0, round(fraction * (len(ordered) - 1))))
+    return ordered[index]
+
+class ResumeAnalyserBenchmark:
+    def __init__(self, iterations: int, warmup: int, groups):
+        self.iterations = iterations
+        self.warmup = warmup
+        self.groups = groups
+        self.results = {}
+        self.skipped = {}
+        self.components = {}
+
+    def measure(self, name: str, func, iterations: int = None):
+        """Time func over several iterations, then rerun it once under tracemalloc for peak memory."""
+        iterations = iterations or self.iterations
+        for _ in range(self.warmup):
+            func()
+        samples = []
+        started = time.perf_counter()
+        for _ in range(iterations):
+            t0 = time.perf_counter()
+            func()
+            samples.append(time.perf_counter() - t0)
+        elapsed = time.perf_counter() - started
+
+        tracemalloc.start()
+        try:
+            func()
+            _, peak = tracemalloc.get_traced_memory()
+        finally:
+            tracemalloc.stop()
+
+        self.results[name] = {
+            "iterations": iterations,
+            "throughput_per_second": round(iterations / elapsed, 2) if elapsed else None,
+            "mean_ms": round(statistics.mean(samples) * 1000, 3),
+            "p50_ms": round(percentile(samples, 0.50) * 1000, 3),
+            "p99_ms": round(percentile(samples, 0.99) * 1000, 3),
+            "peak_memory_kb": round(peak / 1024, 1),
+        }
+        print(f"  {name:<42} p50 {self.results[name]['p50_ms']:>9.3f} ms  "
+              f"p99 {self.results[name]['p99_ms']:>9.3f} ms  "
+              f"{self.results[name]['throughput_per_second']:>9} /s  "
+              f"peak {self.results[name]['peak_memory_kb']:>9} KB")
+
+    def skip(self, name: str, reason: str):
+        self.skipped[name] = reason
+        print(f"  {name:<42} skipped: {reason}")
+
+    def bench_extraction(self, server, corpus):
+        print("\n📄 Text extraction")
+        extractors = {
+            "txt": server.extract_text_from_txt,
+            "docx": server.extract_text_from_docx,
+            "pdf": server.extract_text_from_pdf,
+            "png": server.extract_text_from_image_ocr,
+        }
+        has_tesseract = shutil.which(server.pytesseract.pytesseract.tesseract_cmd) is not None
+        self.components["tesseract"] = has_tesseract
+        for (file_type, size), content in corpus.items():
+            name = f"extract_text_from_{file_type}[{size}]"
+            if file_type == "png" and not has_tesseract:
+                self.skip(name, "tesseract is not installed")
+                continue
+            # OCR is slow; a few iterations are enough for stable percentiles
+            iterations = max(3, self.iterations // 10) if file_type == "png" else None
+            self.measure(name, lambda f=extractors[file_type], c=content: f(c), iterations)
+
+    def bench_entities(self, server):
+        print("\n🧠 Entity extraction")
+        spacy_loaded = server.spacy_engine.nlp is not None
+        self.components["spacy_model"] = spacy_loaded
+        for size in CORPUS_SIZES:
+            text = resume_text(size)
+            self.measure(f"extract_entities_with_regex[{size}]",
+                         lambda t=text: server.extract_entities_with_regex(t))
+            name = f"extract_entities_with_spacy[{size}]"
+            if spacy_loaded:
+                self.measure(name, lambda t=text: server.extract_entities_with_spacy(t))
+            else:
+                self.skip(name, f"spaCy model {server.SPACY_MODEL} is not installed")
+
+    def bench_similarity(self, server):
+        print("\n📊 Job match scoring")
+        for size in CORPUS_SIZES:
+            text = resume_text(size)
+            self.measure(f"calculate_similarity_score[{size}]",
+                         lambda t=text: server.calculate_similarity_score(t, JOB_DESCRIPTION))
+            entities = server.extract_entities_with_regex(text)
+            self.measure(f"analyze_job_gaps[{size}]",
+                         lambda t=text, e=entities: server.analyze_job_gaps(t, JOB_DESCRIPTION, e))
+
+    def bench_endpoint(self, server, corpus):
+        print("\n🌐 /api/analyze-resume (local ASGI client, stubbed LLM)")
+        from fastapi.testclient import TestClient
+
+        server.llm_chat = STUB_LLM_CHAT
+        if os.environ["MONGO_URL"] == "mongodb://localhost:27017" and not os.environ.get("BENCHMARK_USE_MONGO"):
+            try:
+                from mongomock_motor import AsyncMongoMockClient
+            except ImportError:
+                print("  mongomock-motor is not installed; using MONGO_URL")
+            else:
+                server.client = AsyncMongoMockClient()
+                server.db = server.client[os.environ["DB_NAME"]]
+
+        counter = iter(range(1, 10 ** 9))
+        mime_types = {"txt": "text/plain", "docx": "application/octet-stream", "pdf": "application/pdf"}
+        with TestClient(server.app) as client:
+            def post(file_type, content):
+                response = client.post(
+                    "/api/analyze-resume",
+                    files={"file": (f"resume.{file_type}", content, mime_types[file_type])},
+                    data={"job_description": JOB_DESCRIPTION},
+                )
+                response.raise_for_status()
+
+            for file_type in ("txt", "docx", "pdf"):
+                content = corpus[(file_type, "medium")]
+                self.measure(f"analyze_resume_cached[{file_type}]",
+                             lambda f=file_type, c=content: post(f, c))
+
+            def post_uncached():
+                text = resume_text("medium", variant=next(counter))
+                post("txt", text.encode("utf-8"))
+            self.measure("analyze_resume_uncached[txt]", post_uncached)
+
+    def bench_import(self, runs: int = 5):
+        """Time `import server` in fresh interpreters, which is what a cold start pays."""
+        print("\n⏱️  Server import")
+        code = "import time; t = time.perf_counter(); import server; print(time.perf_counter() - t)"
+        samples = []
+        for _ in range(runs):
+            output = subprocess.run(
+                [sys.executable, "-c", code], cwd=BACKEND_DIR, env=os.environ.copy(),
+                capture_output=True, text=True, check=True
+            ).stdout
+            samples.append(float(output.strip().splitlines()[-1]))
+        self.results["import_server"] = {
+            "iterations": runs,
+            "mean_ms": round(statistics.mean(samples) * 1000, 3),
+            "p50_ms": round(percentile(samples, 0.50) * 1000, 3),
+            "p99_ms": round(percentile(samples, 0.99) * 1000, 3),
+        }
+        print(f"  {'import server':<42} p50 {self.results['import_server']['p50_ms']:>9.3f} ms  "
+              f"p99 {self.results['import_server']['p99_ms']:>9.3f} ms")
+
+    def run_all(self):
+        print("🚀 Starting Offline Backend Benchmarks for AI Resume Analyser")
+        print("=" * 70)
+        if "import" in self.groups:
+            self.bench_import()
+        import server
+
+        print("\n📁 Building synthetic corpus...")
+        corpus = build_corpus()
+        print(f"✅ Built {len(corpus)} files: "
+              + ", ".join(f"{t}/{s} {len(c) // 1024}KB" for (t, s), c in corpus.items()))
+
+        if "extract" in self.groups:
+            self.bench_extraction(server, corpus)
+        if "entities" in self.groups:
+            self.bench_entities(server)
+        if "similarity" in self.groups:
+            self.bench_similarity(server)
+        if "endpoint" in self.groups:
+            self.bench_endpoint(server, corpus)
+        return self.results
+
+    def report(self):
+        return {
+            "python": platform.python_version(),
+            "machine": platform.machine(),
+            "iterations": self.iterations,
+            "components": self.components,
+            "results": self.results,
+            "skipped": self.skipped,
+        }
+
+def compare_with_baseline(results, baseline, tolerance: float, min_delta_ms: float, components=None):
+    """Print the p50 change for every benchmark and return the names that regressed.
+
+    A slowdown only counts when it exceeds both the relative tolerance and min_delta_ms,
+    so microsecond-level noise on the fastest benchmarks is not reported.
+    """
+    print("\n" + "=" * 70)
+    print(f"📋 BASELINE COMPARISON (tolerance {tolerance:.0%}, min delta {min_delta_ms:g} ms)")
+    print("=" * 70)
+    for component, available in (components or {}).items():
+        recorded = baseline.get("components", {}).get(component)
+        if recorded is not None and recorded != available:
+            print(f"⚠️  {component} is {'' if available else 'not '}installed here but "
+                  f"{'was' if recorded else 'was not'} for the baseline; timings that use it are not comparable")
+    regressions = []
+    for name, result in results.items():
+        previous = baseline.get("results", {}).get(name)
+        if not previous or not previous.get("p50_ms"):
+            print(f"🆕 {name}: no baseline")
+            continue
+        change = result["p50_ms"] / previous["p50_ms"] - 1
+        regressed = change > tolerance and result["p50_ms"] - previous["p50_ms"] > min_delta_ms
+        icon = "❌" if regressed else "✅"
+        print(f"{icon} {name}: {previous['p50_ms']:.3f} → {result['p50_ms']:.3f} ms ({change:+.1%})")
+        if regressed:
+            regressions.append(name)
+    return regressions
+
+def main():
+    """Main benchmark function"""
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--iterations", type=int, default=50)
+    parser.add_argument("--warmup", type=int, default=3)
+    parser.add_argument("--only", default="import,extract,entities,similarity,endpoint",
+                        help="comma-separated groups: import, extract, entities, similarity, endpoint")
+    parser.add_argument("--baseline", type=Path, default=DEFAULT_BASELINE)
+    parser.add_argument("--save-baseline", action="store_true")
+    parser.add_argument("--tolerance", type=float, default=0.25,
+                        help="allowed p50 slowdown before a benchmark counts as a regression")
+    parser.add_argument("--min-delta-ms", type=float, default=0.1,
+                        help="p50 slowdowns smaller than this many ms are never regressions")
+    parser.add_argument("--output", type=Path, help="also write the results as JSON to this path")
+    parser.add_argument("--max-import-seconds", type=float,
+                        help="fail when the median server import takes longer, e.g. in CI")
+    args = parser.parse_args()
+
+    benchmark = ResumeAnalyserBenchmark(args.iterations, args.warmup, set(args.only.split(",")))
+    results = benchmark.run_all()
+    report = benchmark.report()
+
+    if args.output:
+        args.output.write_text(json.dumps(report, indent=2) + "\n")
+    import_result = results.get("import_server")
+    if args.max_import_seconds and import_result and import_result["p50_ms"] > args.max_import_seconds * 1000:
+        print(f"\n❌ Server import took {import_result['p50_ms']:.0f} ms, over the "
+              f"{args.max_import_seconds:g}s limit")
+        return 1
+    if args.save_baseline:
+        args.baseline.write_text(json.dumps(report, indent=2) + "\n")
+        print(f"\n💾 Saved baseline to {args.baseline}")
+        missing = [component for component, available in benchmark.components.items() if not available]
+        if missing:
+            print(f"⚠️  The baseline was recorded without {', '.join(missing)}; "
+                  "save it again on a host that has them")
+        return 0
+    if not args.baseline.exists():
+        print(f"\n❌ No baseline at {args.baseline}; run with --save-baseline to create one")
+        return 2
+
+    regressions = compare_with_baseline(results, json.loads(args.baseline.read_text()), args.tolerance,
+                                        args.min_delta_ms, benchmark.components)
+    if regressions:
+        print(f"\n❌ {len(regressions)} regression(s): {', '.join(regressions)}")
+        return 1
+    print("\n✅ No regressions")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
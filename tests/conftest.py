@@ -0,0 +1,10 @@
+import os
+import sys
+from pathlib import Path
+
+# server.py reads these at import time; the Motor client does not connect until used
+os.environ.setdefault('MONGO_URL', 'mongodb://localhost:27017')
+os.environ.setdefault('DB_NAME', 'resume_analyser_test')
+os.environ.setdefault('CPU_POOL_WORKERS', '0')
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / 'backend'))
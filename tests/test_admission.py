@@ -0,0 +1,229 @@
+import asyncio
+from types import SimpleNamespace
+
+import pytest
+from fastapi.responses import PlainTextResponse
+from fastapi.testclient import TestClient
+
+import server
+
+
+class Clock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(server.time, 'monotonic', clock)
+    return clock
+
+
+def test_token_bucket_refills_at_its_rate(clock):
+    limiter = server.TokenBucketLimiter(rate=2, burst=2, max_clients=10)
+    assert limiter.acquire('a') is None
+    assert limiter.acquire('a') is None
+    assert limiter.acquire('a') == pytest.approx(0.5)
+    # Other clients have their own bucket
+    assert limiter.acquire('b') is None
+
+    clock.now += 0.5
+    assert limiter.acquire('a') is None
+    # Refills never exceed the burst
+    clock.now += 60
+    assert [limiter.acquire('a') for _ in range(3)] == [None, None, pytest.approx(0.5)]
+
+
+def test_token_bucket_keeps_only_the_most_recent_clients(clock):
+    limiter = server.TokenBucketLimiter(rate=1, burst=1, max_clients=2)
+    for client in ('a', 'b', 'c'):
+        limiter.acquire(client)
+    assert len(limiter) == 2
+    # 'a' was evicted, so it starts with a full bucket again
+    assert limiter.acquire('a') is None
+
+
+def test_admission_queues_in_order_and_rejects_when_full():
+    async def run():
+        controller = server.AdmissionController(max_in_flight=1, max_queue=1, queue_timeout=5)
+        await controller.acquire()
+        waiting = asyncio.ensure_future(controller.acquire())
+        await asyncio.sleep(0)
+        assert controller.queue_depth == 1
+
+        with pytest.raises(server.AdmissionRejected) as rejected:
+            await controller.acquire()
+        assert rejected.value.reason == 'queue_full'
+
+        # The slot goes straight to the waiter
+        controller.release()
+        await waiting
+        assert controller.in_flight == 1
+        assert controller.queue_depth == 0
+        controller.release()
+        assert controller.in_flight == 0
+        return controller.stats()
+
+    stats = asyncio.run(run())
+    assert stats['admitted'] == 2
+    assert stats['queued'] == 1
+
+
+def test_admission_wait_times_out():
+    async def run():
+        controller = server.AdmissionController(max_in_flight=1, max_queue=4, queue_timeout=0.05)
+        await controller.acquire()
+        with pytest.raises(server.AdmissionRejected) as rejected:
+            await controller.acquire()
+        return controller, rejected.value
+
+    controller, rejected = asyncio.run(run())
+    assert rejected.reason == 'queue_timeout'
+    assert rejected.retry_after == 0.05
+    assert controller.queue_depth == 0
+    assert controller.in_flight == 1
+
+
+async def ok(scope, receive, send):
+    await PlainTextResponse('ok')(scope, receive, send)
+
+
+def middleware_client(controller, limiter):
+    app = server.AdmissionControlMiddleware(ok, controller, limiter, '/api/analyze', trust_forwarded_for=False)
+    return TestClient(app)
+
+
+def test_middleware_rate_limits_clients_with_429():
+    controller = server.AdmissionController(max_in_flight=4, max_queue=4, queue_timeout=5)
+    client = middleware_client(controller, server.TokenBucketLimiter(rate=0.1, burst=1, max_clients=10))
+    assert client.post('/api/analyze-resume').status_code == 200
+    response = client.post('/api/analyze-resume')
+    assert response.status_code == 429
+    assert response.headers['Retry-After'] == '10'
+    # Other paths are not limited
+    assert client.post('/api/jobs').status_code == 200
+    assert controller.rejected['rate_limited'] == 1
+
+
+def test_middleware_returns_503_when_the_queue_is_full():
+    controller = server.AdmissionController(max_in_flight=0, max_queue=0, queue_timeout=5)
+    client = middleware_client(controller, server.TokenBucketLimiter(rate=100, burst=100, max_clients=10))
+    response = client.post('/api/analyze-resume')
+    assert response.status_code == 503
+    assert response.headers['Retry-After'] == '5'
+    assert controller.rejected['queue_full'] == 1
+
+
+def selector(queue_depth=0):
+    controller = SimpleNamespace(queue_depth=queue_depth, max_queue=4)
+    return server.QualityTierSelector(
+        controller, standard_latency=8, minimal_latency=20, minimal_queue_fraction=0.5, window=60
+    )
+
+
+def test_tier_follows_queue_depth():
+    assert selector(queue_depth=0).select() == 'full'
+    assert selector(queue_depth=1).select() == 'standard'
+    assert selector(queue_depth=2).select() == 'minimal'
+
+
+def test_tier_follows_recent_full_latency(clock):
+    tiers = selector()
+    for _ in range(4):
+        tiers.record('full', 30)
+    # Too few samples to judge
+    assert tiers.select() == 'full'
+    tiers.record('full', 30)
+    assert tiers.select() == 'minimal'
+
+    clock.now += 61
+    for _ in range(5):
+        tiers.record('full', 10)
+    assert tiers.select() == 'standard'
+    # Degraded analyses are not timed
+    tiers.record('standard', 100)
+    assert tiers.recent_latency() == pytest.approx(10)
+
+
+def test_resolve_counts_requested_and_auto_tiers():
+    tiers = selector(queue_depth=1)
+    assert tiers.resolve('auto') == 'standard'
+    assert tiers.resolve('full') == 'full'
+    assert tiers.counts['auto']['standard'] == 1
+    assert tiers.counts['requested']['full'] == 1
+
+
+def test_weighted_requests_queue_in_order():
+    async def run():
+        controller = server.AdmissionController(max_in_flight=4, max_queue=4, queue_timeout=5)
+        await controller.acquire(3)
+        heavy = asyncio.ensure_future(controller.acquire(2))
+        light = asyncio.ensure_future(controller.acquire(1))
+        await asyncio.sleep(0)
+        # The light request fits but may not overtake the heavy one
+        assert controller.in_flight == 3
+        assert controller.queue_depth == 2
+
+        controller.release(3)
+        await asyncio.gather(heavy, light)
+        assert controller.in_flight == 3
+        controller.release(2)
+        controller.release(1)
+        assert controller.in_flight == 0
+
+        # A request heavier than the limit runs alone instead of waiting forever
+        await controller.acquire(10)
+        assert controller.in_flight == 4
+        controller.release(10)
+        assert controller.in_flight == 0
+
+    asyncio.run(run())
+
+
+def test_abandoned_heavy_waiter_lets_lighter_ones_in():
+    async def run():
+        controller = server.AdmissionController(max_in_flight=2, max_queue=4, queue_timeout=5)
+        await controller.acquire(1)
+        heavy = asyncio.ensure_future(controller.acquire(2))
+        await asyncio.sleep(0)
+        light = asyncio.ensure_future(controller.acquire(1))
+        await asyncio.sleep(0)
+        # The client behind the heavy request disconnects
+        heavy.cancel()
+        await asyncio.wait_for(light, timeout=1)
+        return controller.in_flight
+
+    assert asyncio.run(run()) == 2
+
+
+def test_handler_paths_are_rate_limited_but_take_slots_in_the_handler(monkeypatch):
+    controller = server.AdmissionController(max_in_flight=0, max_queue=0, queue_timeout=5)
+    app = server.AdmissionControlMiddleware(
+        ok, controller, server.TokenBucketLimiter(rate=0.1, burst=1, max_clients=10), '/api/analyze',
+        trust_forwarded_for=False, handler_paths=('/api/analyze-resumes',)
+    )
+    client = TestClient(app)
+    assert client.post('/api/analyze-resumes').status_code == 200
+    assert client.post('/api/analyze-resumes').status_code == 429
+
+
+def test_admission_slots_raise_503_with_retry_after(monkeypatch):
+    controller = server.AdmissionController(max_in_flight=1, max_queue=0, queue_timeout=5)
+    monkeypatch.setattr(server, 'admission_controller', controller)
+
+    async def run():
+        async with server.admission_slots(1):
+            with pytest.raises(server.HTTPException) as rejected:
+                async with server.admission_slots(1):
+                    pass
+        return rejected.value
+
+    error = asyncio.run(run())
+    assert error.status_code == 503
+    assert error.headers == {'Retry-After': '5'}
+    assert controller.in_flight == 0
+    assert controller.rejected['queue_full'] == 1
@@ -0,0 +1,122 @@
+from datetime import datetime, timedelta
+from types import SimpleNamespace
+
+import pytest
+from fastapi import HTTPException
+from fastapi.testclient import TestClient
+
+import server
+
+
+class FakeCursor:
+    def __init__(self, documents):
+        self.documents = documents
+
+    def sort(self, keys):
+        for key, direction in reversed(keys):
+            self.documents.sort(key=lambda document: document[key], reverse=direction < 0)
+        return self
+
+    def limit(self, count):
+        self.documents = self.documents[:count]
+        return self
+
+    async def to_list(self, length):
+        return self.documents[:length]
+
+
+class FakeAnalyses:
+    """Answers the equality and $lt queries list_analyses sends, and applies projections."""
+    def __init__(self, documents):
+        self.documents = documents
+        self.projections = []
+
+    def matches(self, document, query):
+        for key, value in query.items():
+            if key == '$or':
+                if not any(self.matches(document, option) for option in value):
+                    return False
+            elif isinstance(value, dict):
+                if not document[key] < value['$lt']:
+                    return False
+            elif document.get(key) != value:
+                return False
+        return True
+
+    def project(self, document, projection):
+        if set(projection.values()) == {0}:
+            return {key: value for key, value in document.items() if key not in projection}
+        return {key: value for key, value in document.items() if key == '_id' or key in projection}
+
+    def find(self, query, projection):
+        self.projections.append(projection)
+        return FakeCursor([
+            self.project(document, projection) for document in self.documents if self.matches(document, query)
+        ])
+
+
+def stored_analysis(analysis_id, timestamp):
+    return {
+        '_id': analysis_id, 'timestamp': timestamp, 'filename': f'{analysis_id}.txt',
+        'extracted_text': 'Python developer', 'skills': ['python'], 'experience': [], 'education': [],
+        'contact_info': {}, 'job_match_score': 42.0, 'suggestions': [], 'processing_time': 0.1
+    }
+
+
+@pytest.fixture
+def analyses(monkeypatch):
+    noon = datetime(2024, 5, 1, 12)
+    # Three analyses share a timestamp, as a batch written together does
+    collection = FakeAnalyses([
+        stored_analysis('a', noon - timedelta(minutes=1)),
+        stored_analysis('b', noon),
+        stored_analysis('c', noon),
+        stored_analysis('d', noon),
+        stored_analysis('e', noon + timedelta(minutes=1)),
+    ])
+    monkeypatch.setattr(server, 'db', SimpleNamespace(analyses=collection))
+    return collection
+
+
+def test_cursor_round_trips_and_rejects_garbage():
+    timestamp = datetime(2024, 5, 1, 12, 30, 15, 123000)
+    cursor = server.encode_analysis_cursor({'_id': 'abc', 'timestamp': timestamp})
+    assert server.decode_analysis_cursor(cursor) == (timestamp, 'abc')
+
+    with pytest.raises(HTTPException) as invalid:
+        server.decode_analysis_cursor('not a cursor')
+    assert invalid.value.status_code == 400
+
+
+def test_pages_across_equal_timestamps_without_gaps_or_repeats(analyses):
+    client = TestClient(server.app)
+    pages = []
+    cursor = None
+    while True:
+        params = {'limit': 2, **({'cursor': cursor} if cursor else {})}
+        page = client.get('/api/analyses', params=params).json()
+        pages.append([item['id'] for item in page['items']])
+        cursor = page['next_cursor']
+        if not cursor:
+            break
+
+    # Newest first, with _id breaking the tie inside the shared timestamp
+    assert pages == [['e', 'd'], ['c', 'b'], ['a']]
+
+
+def test_listing_leaves_out_the_extracted_text(analyses):
+    client = TestClient(server.app)
+    page = client.get('/api/analyses').json()
+    assert analyses.projections == [{'extracted_text': 0}]
+    assert all('extracted_text' not in item for item in page['items'])
+
+    # Selected fields still read timestamp so the next cursor can be built
+    page = client.get('/api/analyses', params={'fields': 'filename', 'limit': 1}).json()
+    assert analyses.projections[-1] == {'filename': 1, 'timestamp': 1}
+    assert page['items'] == [{'filename': 'e.txt'}]
+    assert page['next_cursor']
+
+
+def test_invalid_cursor_is_a_bad_request(analyses):
+    response = TestClient(server.app).get('/api/analyses', params={'cursor': 'garbage'})
+    assert response.status_code == 400
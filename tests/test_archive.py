@@ -0,0 +1,119 @@
+import io
+import json
+import zipfile
+
+import pytest
+from fastapi import HTTPException
+from fastapi.testclient import TestClient
+
+import server
+
+
+def build_archive(members, compression=zipfile.ZIP_DEFLATED):
+    buffer = io.BytesIO()
+    with zipfile.ZipFile(buffer, 'w', compression) as archive:
+        for name, content in members.items():
+            archive.writestr(name, content)
+    return buffer.getvalue()
+
+
+def member(name, file_size, compress_size):
+    info = zipfile.ZipInfo(name)
+    info.file_size = file_size
+    info.compress_size = compress_size
+    return info
+
+
+def test_member_checks_refuse_before_reading():
+    assert server.check_archive_member(member('cv/Resume.PDF', 1000, 900)) == 'pdf'
+
+    with pytest.raises(HTTPException) as unsupported:
+        server.check_archive_member(member('notes.exe', 1000, 900))
+    assert unsupported.value.status_code == 400
+
+    with pytest.raises(HTTPException) as too_large:
+        server.check_archive_member(member('resume.txt', server.MAX_UPLOAD_BYTES + 1, server.MAX_UPLOAD_BYTES))
+    assert too_large.value.status_code == 413
+
+    with pytest.raises(HTTPException) as bomb:
+        server.check_archive_member(member('resume.txt', 1_000_000, 1000))
+    assert bomb.value.status_code == 413
+    assert 'compressed more than' in bomb.value.detail
+
+
+def test_inflated_bytes_are_held_to_the_upload_limit(monkeypatch):
+    archive = zipfile.ZipFile(io.BytesIO(build_archive({'resume.txt': b'Python developer\n' * 1000})))
+    info = archive.getinfo('resume.txt')
+
+    upload = server.spool_archive_member(archive, info, 'txt')
+    assert upload.content == b'Python developer\n' * 1000
+
+    # Counted as the member inflates, not taken from its header
+    monkeypatch.setattr(server, 'MAX_UPLOAD_BYTES', 4096)
+    with pytest.raises(HTTPException) as too_large:
+        server.spool_archive_member(archive, info, 'txt')
+    assert too_large.value.status_code == 413
+
+
+@pytest.fixture
+def analyzed(monkeypatch):
+    filenames = []
+
+    async def pipeline(upload, job_description, tier='auto', **kwargs):
+        filenames.append(upload.filename)
+        return server.ResumeAnalysis(
+            filename=upload.filename, extracted_text='Python developer', skills=['python'], experience=[],
+            education=[], contact_info={}, job_match_score=42.0, suggestions=[], processing_time=0.1
+        )
+
+    monkeypatch.setattr(server, 'run_analysis_pipeline', pipeline)
+    return filenames
+
+
+def post_archive(content):
+    client = TestClient(server.app)
+    return client.post(
+        '/api/analyze-archive',
+        files={'file': ('resumes.zip', content, 'application/zip')},
+        data={'job_description': 'Python'}
+    )
+
+
+def test_hidden_files_and_directories_are_skipped(analyzed):
+    response = post_archive(build_archive({
+        'resumes/': b'',
+        'resumes/alice.txt': b'Python developer',
+        'resumes/.DS_Store': b'\x00\x01',
+        '__MACOSX/resumes/._alice.txt': b'\x00\x01',
+        'bob.txt': b'Python developer',
+    }))
+    assert response.status_code == 200
+    events = [json.loads(line) for line in response.text.splitlines()]
+    assert sorted(analyzed) == ['bob.txt', 'resumes/alice.txt']
+    assert events[-1]['event'] == 'summary'
+    assert events[-1]['data']['files'] == 2
+    assert events[-1]['data']['succeeded'] == 2
+
+
+def test_compressed_bomb_member_is_reported_without_being_inflated(analyzed):
+    response = post_archive(build_archive({
+        'bomb.txt': b'\x00' * 2_000_000,
+        'resume.txt': b'Python developer',
+    }))
+    errors = [event['data'] for event in map(json.loads, response.text.splitlines()) if event['event'] == 'error']
+    assert analyzed == ['resume.txt']
+    assert [(error['filename'], error['status_code']) for error in errors] == [('bomb.txt', 413)]
+
+
+def test_archives_over_the_member_count_are_refused(analyzed, monkeypatch):
+    monkeypatch.setattr(server, 'ARCHIVE_MAX_MEMBERS', 2)
+    response = post_archive(build_archive({f'{index}.txt': b'Python developer' for index in range(3)}))
+    assert response.status_code == 413
+    assert analyzed == []
+
+
+def test_archives_over_the_total_size_are_refused(analyzed, monkeypatch):
+    monkeypatch.setattr(server, 'ARCHIVE_MAX_UNCOMPRESSED_BYTES', 1000)
+    response = post_archive(build_archive({'a.txt': b'a' * 600, 'b.txt': b'b' * 600}, zipfile.ZIP_STORED))
+    assert response.status_code == 413
+    assert analyzed == []
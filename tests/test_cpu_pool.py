@@ -0,0 +1,56 @@
+import asyncio
+import os
+import time
+
+import pytest
+from fastapi import HTTPException
+
+import server
+
+
+def no_warm_up():
+    pass
+
+
+@pytest.fixture
+def single_worker_pool(monkeypatch):
+    monkeypatch.setattr(server, 'CPU_POOL_WORKERS', 1)
+    monkeypatch.setattr(server, 'CPU_POOL_START_METHOD', 'fork')
+    monkeypatch.setattr(server, 'CPU_TASK_TIMEOUT', 0.5)
+    monkeypatch.setattr(server, 'warm_up_worker', no_warm_up)
+    pool = server.create_cpu_pool()
+    monkeypatch.setattr(server, 'cpu_pool', pool)
+    yield pool
+    server.cpu_pool.shutdown(wait=True, cancel_futures=True)
+
+
+def test_timed_out_task_does_not_starve_the_pool(single_worker_pool):
+    async def run():
+        slow = asyncio.ensure_future(server.run_cpu_bound(time.sleep, 30))
+        await asyncio.sleep(0.1)
+        stuck = list(single_worker_pool._processes.values())
+        with pytest.raises(HTTPException) as timed_out:
+            await slow
+        # The only worker is still sleeping, so this only finishes on a fresh pool
+        result = await server.run_cpu_bound(len, 'abc')
+        # Wait for the retired pool's workers to be terminated
+        await asyncio.sleep(server.CPU_TASK_TIMEOUT * 2)
+        return timed_out.value, result, stuck
+
+    error, result, stuck = asyncio.run(run())
+    assert error.status_code == 504
+    assert result == 3
+    assert server.cpu_pool is not single_worker_pool
+    assert stuck and not any(process.is_alive() for process in stuck)
+
+
+def test_pool_is_replaced_after_a_worker_dies(single_worker_pool):
+    async def run():
+        with pytest.raises(HTTPException) as crashed:
+            await server.run_cpu_bound(os._exit, 1)
+        return crashed.value, await server.run_cpu_bound(len, 'abc')
+
+    error, result = asyncio.run(run())
+    assert error.status_code == 500
+    assert result == 3
+    assert server.cpu_pool is not single_worker_pool
@@ -0,0 +1,93 @@
+import json
+import os
+import time
+
+import pytest
+
+import server
+
+
+@pytest.fixture
+def matcher(tmp_path):
+    path = tmp_path / 'taxonomy.json'
+    path.write_text(json.dumps({'skills': {
+        'python': ['python3'],
+        'django': [],
+        'html': [],
+        'css': [],
+        'c++': ['cpp'],
+        'react': ['reactjs'],
+        'react native': [],
+        'ci/cd': [],
+        'kubernetes': ['k8s'],
+        'machine learning': ['ml'],
+        'go': ['golang'],
+        'node.js': ['nodejs'],
+    }}))
+    return server.SkillMatcher(str(path), reload_interval=0)
+
+
+def test_slash_separated_skills_are_matched(matcher):
+    assert set(matcher.match('Python/Django, HTML/CSS, C/C++')) == {'python', 'django', 'html', 'css', 'c++'}
+
+
+def test_hyphenated_skills_match_words_and_phrase(matcher):
+    assert set(matcher.match('Built apps in React-Native')) == {'react', 'react native'}
+
+
+def test_joined_taxonomy_phrase_matches(matcher):
+    assert matcher.match('Set up CI/CD pipelines') == ['ci/cd']
+
+
+def test_multi_word_phrases_and_synonyms(matcher):
+    assert set(matcher.match('Applied machine learning on k8s with nodejs')) == {'machine learning', 'kubernetes', 'node.js'}
+
+
+def test_word_boundaries(matcher):
+    assert matcher.match('A good manager who likes to go hiking') == ['go']
+    assert matcher.match('Good management') == []
+
+
+def test_taxonomy_reload(matcher, tmp_path):
+    assert matcher.match('rust') == []
+    path = tmp_path / 'taxonomy.json'
+    path.write_text(json.dumps({'skills': {'rust': []}}))
+    # Make sure the modification time changes even on coarse-grained filesystems
+    stat = path.stat()
+    os.utime(path, ns=(stat.st_atime_ns, stat.st_mtime_ns + 1_000_000_000))
+    assert matcher.match('rust') == ['rust']
+
+
+def test_shipped_taxonomy_matches_common_forms():
+    found = set(server.skill_matcher.match('Python/Django, HTML/CSS, React-Native, k8s, AWS'))
+    assert {'python', 'django', 'html', 'css', 'react', 'kubernetes', 'aws'} <= found
+
+
+def test_segment_sections_splits_on_known_headers():
+    text = 'Jane Doe\njane@example.com\nExperience\nAcme 2019 - 2021\nEducation:\nBSc Physics\nTECHNICAL SKILLS\nPython'
+    sections = server.segment_sections(text)
+    assert [name for name, _, _ in sections] == ['header', 'experience', 'education', 'skills']
+    assert server.section_text(text, sections, 'experience').strip() == 'Acme 2019 - 2021'
+    assert server.section_text(text, sections, 'education').strip() == 'BSc Physics'
+    assert server.section_text(text, sections, 'skills').strip() == 'Python'
+    assert 'jane@example.com' in server.section_text(text, sections, 'header')
+
+
+def test_segment_sections_ignores_long_lines_mentioning_headers():
+    text = 'Summary of my experience in many industries over the years\nMore text'
+    sections = server.segment_sections(text)
+    assert not server.has_sections(sections)
+    assert server.section_text(text, sections, 'experience') == text
+    assert server.in_section(sections, 5, 'education')
+
+
+def test_years_of_experience_pattern_is_linear_on_digit_runs():
+    started = time.perf_counter()
+    server.extract_entities_with_regex('1' * 20000)
+    server.years_of_experience('1' * 20000, [])
+    assert time.perf_counter() - started < 1
+
+
+def test_years_of_experience_are_still_found():
+    entities = server.extract_entities_with_regex('Summary\nEngineer with 12+ years of experience and 3 yrs exp')
+    assert '12 years of experience' in entities['experience']
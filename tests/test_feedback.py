@@ -0,0 +1,117 @@
+import asyncio
+import json
+from types import SimpleNamespace
+
+import pytest
+from fastapi import HTTPException
+from fastapi.testclient import TestClient
+
+import server
+
+
+class FakeCache:
+    name = 'feedback_cache'
+
+    def __init__(self):
+        self.documents = {}
+
+    async def find_one(self, query, projection=None):
+        return None
+
+    async def replace_one(self, query, document, upsert=False):
+        self.documents[query['_id']] = document
+
+
+class StreamingChat:
+    def __init__(self, chunks):
+        self.chunks = chunks
+        self.calls = 0
+
+    async def stream_message(self, message):
+        self.calls += 1
+        for chunk in self.chunks:
+            await asyncio.sleep(0)
+            yield chunk
+
+
+@pytest.fixture
+def feedback(monkeypatch):
+    cache = FakeCache()
+    monkeypatch.setattr(server, 'db', SimpleNamespace(feedback_cache=cache))
+    monkeypatch.setattr(server, 'feedback_cache', server.TTLCache(16, 60))
+    monkeypatch.setattr(server, 'llm_chat', SimpleNamespace(UserMessage=lambda text: text))
+    monkeypatch.setenv('EMERGENT_LLM_KEY', 'test-key')
+    return cache
+
+
+def test_chat_construction_failure_falls_back_to_local_suggestions(feedback, monkeypatch):
+    def unavailable(api_key):
+        raise ImportError('emergentintegrations is not installed')
+    monkeypatch.setattr(server, 'build_feedback_chat', unavailable)
+    streamed = []
+
+    suggestions = asyncio.run(server.generate_ai_feedback(
+        'resume', 'job', {}, 50.0, local_suggestions=['Add Kafka'], on_suggestion=streamed.append
+    ))
+    assert suggestions == ['Add Kafka']
+    assert streamed == []
+
+
+def test_suggestions_are_streamed_and_shared_with_coalesced_requests(feedback, monkeypatch):
+    chat = StreamingChat(['1. Add Ka', 'fka\n2. Quantify', ' results\nThanks'])
+    monkeypatch.setattr(server, 'build_feedback_chat', lambda api_key: chat)
+    streamed = []
+
+    async def run():
+        return await asyncio.gather(
+            server.generate_ai_feedback('resume', 'job', {}, 50.0, on_suggestion=streamed.append),
+            server.generate_ai_feedback('resume', 'job', {}, 50.0, on_suggestion=streamed.append)
+        )
+
+    first, second = asyncio.run(run())
+    assert chat.calls == 1
+    assert streamed == ['Add Kafka', 'Quantify results']
+    assert first == second == streamed
+    assert list(feedback.documents.values())[0]['suggestions'] == streamed
+
+
+def analysis(suggestions):
+    return server.ResumeAnalysis(
+        filename='resume.txt', extracted_text='Python developer', skills=['python'], experience=[],
+        education=[], contact_info={}, job_match_score=42.0, suggestions=suggestions, processing_time=0.1
+    )
+
+
+def stream(monkeypatch, pipeline):
+    monkeypatch.setattr(server, 'run_analysis_pipeline', pipeline)
+    client = TestClient(server.app)
+    return client.post(
+        '/api/analyze-resume/stream',
+        files={'file': ('resume.txt', b'Python developer', 'text/plain')},
+        data={'job_description': 'Python'}
+    )
+
+
+def test_stream_route_sends_pipeline_events_in_order(monkeypatch):
+    async def pipeline(upload, job_description, tier='auto', on_event=None, **kwargs):
+        on_event('entities', {'skills': ['python']})
+        on_event('score', {'job_match_score': 42.0})
+        on_event('suggestion', 'Add Kafka')
+        return analysis(['Add Kafka', 'Use action verbs'])
+
+    response = stream(monkeypatch, pipeline)
+    events = [json.loads(line) for line in response.text.splitlines()]
+    assert [event['event'] for event in events] == ['entities', 'score', 'suggestion', 'suggestion', 'result']
+    assert [event['data'] for event in events[2:4]] == [
+        {'index': 0, 'text': 'Add Kafka'}, {'index': 1, 'text': 'Use action verbs'}
+    ]
+    assert events[-1]['data']['suggestions'] == ['Add Kafka', 'Use action verbs']
+
+
+def test_stream_route_reports_extraction_errors_before_streaming(monkeypatch):
+    async def pipeline(upload, job_description, tier='auto', on_event=None, **kwargs):
+        raise HTTPException(status_code=400, detail='Unsupported file')
+
+    response = stream(monkeypatch, pipeline)
+    assert response.status_code == 400
+    assert response.json()['detail'] == 'Unsupported file'
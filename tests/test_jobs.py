@@ -0,0 +1,150 @@
+import asyncio
+from datetime import datetime, timedelta
+from types import SimpleNamespace
+
+import pytest
+from fastapi import HTTPException
+
+import server
+
+
+class FakeJobs:
+    def __init__(self):
+        self.documents = {}
+
+    async def insert_one(self, document):
+        # Yield like a real round trip so concurrent submissions interleave
+        await asyncio.sleep(0.01)
+        self.documents[document['_id']] = document
+
+    async def delete_one(self, query):
+        self.documents.pop(query['_id'], None)
+
+    def matches(self, document, query):
+        for key, value in query.items():
+            if key == '$or':
+                if not any(self.matches(document, option) for option in value):
+                    return False
+            elif isinstance(value, dict):
+                if not (key in document and document[key] < value['$lt']):
+                    return False
+            elif document.get(key) != value:
+                return False
+        return True
+
+    async def find_one_and_update(self, query, update):
+        document = self.documents.get(query['_id'])
+        if document is None or not self.matches(document, query):
+            return None
+        before = dict(document)
+        document.update(update['$set'])
+        return before
+
+    async def update_one(self, query, update):
+        document = self.documents.get(query['_id'])
+        if document is None or not self.matches(document, query):
+            return SimpleNamespace(matched_count=0)
+        document.update(update['$set'])
+        for key in update.get('$unset', {}):
+            document.pop(key, None)
+        return SimpleNamespace(matched_count=1)
+
+
+@pytest.fixture
+def jobs(monkeypatch):
+    jobs = FakeJobs()
+    monkeypatch.setattr(server, 'db', type('FakeDb', (), {'analysis_jobs': jobs})())
+    return jobs
+
+
+def upload(name):
+    return server.SpooledUpload.from_bytes(name, 'txt', b'Python developer')
+
+
+def test_concurrent_submissions_never_overfill_the_queue(jobs, monkeypatch):
+    async def run():
+        monkeypatch.setattr(server, 'job_queue', asyncio.Queue(maxsize=1))
+        return await asyncio.gather(
+            *[server.submit_job(upload(f'{index}.txt'), 'Python') for index in range(3)],
+            return_exceptions=True
+        )
+
+    outcomes = asyncio.run(run())
+    accepted = [outcome for outcome in outcomes if isinstance(outcome, server.AnalysisJob)]
+    rejected = [outcome for outcome in outcomes if isinstance(outcome, HTTPException)]
+    assert len(accepted) == 1
+    assert [error.status_code for error in rejected] == [503, 503]
+    # Only the accepted job is stored, and it is the one in the queue
+    assert list(jobs.documents) == [accepted[0].id]
+    assert server.reserved_job_slots == 0
+
+
+def test_job_taking_the_slot_during_insert_is_not_left_behind(jobs, monkeypatch):
+    async def run():
+        queue = asyncio.Queue(maxsize=1)
+        monkeypatch.setattr(server, 'job_queue', queue)
+        submission = asyncio.create_task(server.submit_job(upload('a.txt'), 'Python'))
+        await asyncio.sleep(0)
+        # A job resumed from a previous process fills the queue meanwhile
+        queue.put_nowait('resumed')
+        with pytest.raises(HTTPException) as error:
+            await submission
+        return error.value.status_code
+
+    assert asyncio.run(run()) == 503
+    assert jobs.documents == {}
+
+
+def queued_job(jobs, job_id='job'):
+    jobs.documents[job_id] = {
+        '_id': job_id, 'status': 'queued', 'filename': 'resume.txt', 'file_extension': 'txt',
+        'file_content': b'Python developer', 'job_description': 'Python', 'tier': 'auto'
+    }
+
+
+def slow_pipeline(seconds):
+    async def pipeline(upload, job_description, **kwargs):
+        await asyncio.sleep(seconds)
+        return server.ResumeAnalysis(
+            filename=upload.filename, extracted_text='Python developer', skills=['python'], experience=[],
+            education=[], contact_info={}, job_match_score=42.0, suggestions=[], processing_time=seconds
+        )
+    return pipeline
+
+
+def test_lease_is_renewed_while_a_long_job_runs(jobs, monkeypatch):
+    monkeypatch.setattr(server, 'JOB_LEASE_SECONDS', 0.15)
+    monkeypatch.setattr(server, 'run_analysis_pipeline', slow_pipeline(0.5))
+    queued_job(jobs)
+
+    async def run():
+        running = asyncio.create_task(server.run_job('job'))
+        await asyncio.sleep(0.3)
+        # Well past the first lease, yet another worker still may not take the job
+        taken_over = await server.claim_job('job', 'other-worker')
+        await running
+        return taken_over
+
+    assert asyncio.run(run()) is None
+    job = jobs.documents['job']
+    assert job['status'] == 'completed'
+    assert job['result']['job_match_score'] == 42.0
+    assert 'lease_id' not in job and 'lease_expires_at' not in job
+
+
+def test_worker_that_lost_its_lease_does_not_overwrite_the_outcome(jobs, monkeypatch):
+    queued_job(jobs)
+
+    async def run():
+        await server.claim_job('job', 'stale-worker')
+        # The stale worker stalled past its lease and another worker took over
+        jobs.documents['job']['lease_expires_at'] = datetime.utcnow() - timedelta(seconds=1)
+        await server.claim_job('job', 'new-worker')
+        await server.finish_job('job', 'stale-worker', 'failed', error='stale')
+        assert jobs.documents['job']['status'] == 'running'
+        assert await server.renew_job_lease('job', 'stale-worker') is False
+        await server.finish_job('job', 'new-worker', 'completed', result={})
+
+    asyncio.run(run())
+    assert jobs.documents['job']['status'] == 'completed'
+    assert jobs.documents['job']['error'] is None
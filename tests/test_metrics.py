@@ -0,0 +1,22 @@
+import server
+
+
+def test_help_and_type_use_the_family_name_of_the_samples():
+    server.UPLOADS.inc('txt')
+    server.STAGE_SECONDS.record(0.2, 'extract_txt')
+    families = {}
+    samples = []
+    for line in server.render_metrics().splitlines():
+        if line.startswith('# TYPE '):
+            _, _, family, metric_type = line.split(' ')
+            families[family] = metric_type
+        elif not line.startswith('#'):
+            samples.append(line.split('{')[0].split(' ')[0])
+
+    assert families['resume_uploads_total'] == 'counter'
+    assert 'resume_uploads' not in families
+    assert families['resume_stage_duration_seconds'] == 'histogram'
+    for sample in samples:
+        assert sample in families or sample.rsplit('_', 1)[0] in families
+        if sample.endswith('_total'):
+            assert families[sample] == 'counter'
@@ -0,0 +1,25 @@
+import io
+
+import pytest
+from PIL import Image
+
+import server
+
+
+def photo(size, dpi=None):
+    stream = io.BytesIO()
+    Image.new('RGB', size, 'white').save(stream, 'JPEG', **({'dpi': dpi} if dpi else {}))
+    stream.seek(0)
+    return Image.open(stream)
+
+
+@pytest.mark.parametrize('dpi', [None, (72, 72), (96, 96)])
+def test_phone_photos_are_downscaled_whatever_their_dpi_metadata(dpi):
+    assert server.preprocess_for_ocr(photo((4032, 3024), dpi)).size == (2550, 1912)
+
+
+def test_plausible_dpi_metadata_is_trusted():
+    # A 600 dpi letter-size scan
+    assert server.preprocess_for_ocr(photo((5100, 6600), (600, 600))).size == (2550, 3300)
+    # Already at the target resolution
+    assert server.preprocess_for_ocr(photo((2550, 3300), (300, 300))).size == (2550, 3300)
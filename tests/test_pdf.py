@@ -0,0 +1,49 @@
+from types import SimpleNamespace
+
+import pytest
+
+import server
+
+
+class FakePage:
+    def __init__(self, text):
+        self.text = text
+
+    def extract_text(self):
+        return self.text
+
+
+@pytest.fixture
+def pdf(monkeypatch):
+    def build(page_texts, ocr_text):
+        pages = [FakePage(text) for text in page_texts]
+        monkeypatch.setattr(server, 'PyPDF2', SimpleNamespace(PdfReader=lambda stream: SimpleNamespace(pages=pages)))
+        monkeypatch.setattr(server, 'PDF_OCR_FALLBACK', True)
+        monkeypatch.setattr(server, 'get_page_scan', lambda page: b'scan')
+        monkeypatch.setattr(server, 'ocr_page_scan', lambda image_data: ocr_text)
+        return server.extract_text_from_pdf(b'%PDF')
+    return build
+
+
+def test_short_text_layer_is_kept_when_ocr_finds_less(pdf):
+    assert pdf(['Jane Doe'], '') == 'Jane Doe'
+
+
+def test_ocr_text_replaces_a_shorter_text_layer(pdf):
+    assert pdf(['Jane Doe'], 'Jane Doe\nPython developer at Acme') == 'Jane Doe\nPython developer at Acme'
+
+
+def test_metrics_from_page_ocr_threads_reach_the_task(monkeypatch):
+    pages = [FakePage(''), FakePage(''), FakePage('')]
+    monkeypatch.setattr(server, 'PyPDF2', SimpleNamespace(PdfReader=lambda stream: SimpleNamespace(pages=pages)))
+    monkeypatch.setattr(server, 'PDF_OCR_FALLBACK', True)
+    monkeypatch.setattr(server, 'get_page_scan', lambda page: b'scan')
+
+    def ocr_page_scan(image_data):
+        server.record_metric(server.STAGE_SECONDS, 0.5, 'ocr_recognize')
+        return 'page'
+    monkeypatch.setattr(server, 'ocr_page_scan', ocr_page_scan)
+
+    text, events = server.call_in_worker(server.extract_text_from_pdf, b'%PDF')
+    assert text == 'page\npage\npage'
+    assert events.count((server.STAGE_SECONDS.name, 0.5, ('ocr_recognize',))) == 3
@@ -0,0 +1,52 @@
+import time
+
+import server
+
+JOB_DESCRIPTION = (
+    'Backend engineer with 5+ years of experience. We use Java and SQL daily, '
+    'deploy on k8s and stream events through Kafka.'
+)
+
+
+def gaps(resume_text, extracted_data=None):
+    return server.analyze_job_gaps(resume_text, JOB_DESCRIPTION, extracted_data or {'skills': []})
+
+
+def test_missing_skills_compare_canonical_skills():
+    # JavaScript and MySQL must not count as Java and SQL
+    result = gaps('Experience\nBuilt JavaScript apps on MySQL, 2018 - 2020')
+    assert result['missing_skills'][:2] == ['java', 'sql']
+
+
+def test_missing_skills_follow_job_description_order_including_synonyms():
+    result = gaps('Python developer')
+    assert result['missing_skills'] == ['java', 'sql', 'kubernetes', 'kafka']
+
+
+def test_synonyms_in_the_resume_count_as_present():
+    result = gaps('Java, SQL, Kubernetes and Apache Kafka')
+    assert result['missing_skills'] == []
+
+
+def test_years_of_experience_gap():
+    result = gaps('Experience\nAcme 2021 - 2023: built services, cut costs by 20%')
+    assert result['required_years'] == 5
+    assert result['resume_years'] == 2
+    assert result['quantified']
+    suggestions, specific = server.build_local_suggestions(result, 50.0)
+    assert any('5+ years' in suggestion for suggestion in suggestions)
+    assert 1 <= specific <= len(suggestions) <= 5
+
+
+def test_missing_sections():
+    assert gaps('No headings at all')['missing_sections'] is None
+    assert gaps('Experience\nAcme\nEducation\nBSc')['missing_sections'] == ['skills']
+
+
+def test_quantified_result_pattern_is_linear_on_number_runs():
+    started = time.perf_counter()
+    for text in ('1' * 10000, '1,' * 10000, '1.' * 10000):
+        assert server.QUANTIFIED_RESULT_PATTERN.search(text) is None
+    assert time.perf_counter() - started < 1
+    assert server.QUANTIFIED_RESULT_PATTERN.search('cut costs by 1,200.5 %')
+    assert server.QUANTIFIED_RESULT_PATTERN.search('grew revenue 3x')
@@ -0,0 +1,88 @@
+import asyncio
+import io
+import zipfile
+
+import pytest
+from fastapi import HTTPException, UploadFile
+from fastapi.testclient import TestClient
+from PIL import Image
+
+import server
+
+SINGLE_FILE_LIMIT = server.MAX_UPLOAD_BYTES + server.MULTIPART_OVERHEAD_BYTES
+
+
+def test_single_file_routes_refuse_bodies_over_the_upload_limit():
+    client = TestClient(server.app)
+    response = client.post(
+        '/api/analyze-resume',
+        files={'file': ('resume.txt', b'x' * SINGLE_FILE_LIMIT, 'text/plain')},
+        data={'job_description': 'Python'}
+    )
+    assert response.status_code == 413
+    assert response.json()['detail'] == f"Request body exceeds the {SINGLE_FILE_LIMIT} byte limit"
+
+
+def test_bodies_without_content_length_are_counted_as_they_stream():
+    received = []
+
+    async def app(scope, receive, send):
+        while True:
+            message = await receive()
+            received.append(len(message['body']))
+            if not message.get('more_body'):
+                break
+
+    middleware = server.RequestSizeLimitMiddleware(app, max_bytes=1000, route_limits={'/api/analyze-resume': 100})
+    chunks = iter([{'type': 'http.request', 'body': b'x' * 60, 'more_body': True}] * 3)
+
+    async def receive():
+        return next(chunks)
+
+    scope = {'type': 'http', 'path': '/api/analyze-resume', 'headers': []}
+    with pytest.raises(HTTPException) as rejected:
+        asyncio.run(middleware(scope, receive, None))
+    assert rejected.value.status_code == 413
+    # Stopped at the chunk that crossed the limit
+    assert received == [60]
+
+
+def upload(content, size):
+    return UploadFile(io.BytesIO(content), size=size, filename='resume.txt')
+
+
+@pytest.mark.parametrize('size', [100, None])
+def test_files_over_the_upload_limit_are_refused(size):
+    with pytest.raises(HTTPException) as rejected:
+        asyncio.run(server.spool_upload(upload(b'x' * 100, size), max_bytes=50))
+    assert rejected.value.status_code == 413
+
+
+def test_large_uploads_are_spooled_to_disk(monkeypatch):
+    monkeypatch.setattr(server, 'UPLOAD_SPOOL_THRESHOLD', 10)
+    spooled = asyncio.run(server.spool_upload(upload(b'x' * 100, 100), max_bytes=1000))
+    try:
+        assert spooled.content is None
+        assert spooled.read_bytes() == b'x' * 100
+    finally:
+        spooled.cleanup()
+
+
+def test_images_over_the_pixel_limit_are_refused_from_the_header(monkeypatch):
+    monkeypatch.setattr(server, 'MAX_IMAGE_PIXELS', 100 * 100 - 1)
+    stream = io.BytesIO()
+    Image.new('L', (100, 100)).save(stream, 'PNG')
+    stream.seek(0)
+    with pytest.raises(HTTPException) as rejected:
+        server.open_image(stream)
+    assert rejected.value.status_code == 413
+
+
+def test_docx_that_inflates_past_the_limit_is_refused(monkeypatch):
+    monkeypatch.setattr(server, 'MAX_DOCX_UNCOMPRESSED_BYTES', 1000)
+    stream = io.BytesIO()
+    with zipfile.ZipFile(stream, 'w', zipfile.ZIP_DEFLATED) as archive:
+        archive.writestr('word/document.xml', b'\0' * 2000)
+    with pytest.raises(HTTPException) as rejected:
+        server.extract_text_from_docx(stream.getvalue())
+    assert rejected.value.status_code == 413
@@ -0,0 +1,122 @@
+import asyncio
+
+import pytest
+from pymongo.errors import BulkWriteError
+
+import server
+
+
+class FakeCollection:
+    """Stores documents by _id and rejects duplicates like an unordered insert_many."""
+    def __init__(self, delay=0.0, fail=None):
+        self.documents = {}
+        self.delay = delay
+        self.fail = fail
+
+    async def insert_many(self, documents, ordered=True):
+        assert not ordered
+        await asyncio.sleep(self.delay)
+        if self.fail:
+            error, self.fail = self.fail, None
+            raise error
+        errors = []
+        for index, document in enumerate(documents):
+            if document['_id'] in self.documents:
+                errors.append({'index': index, 'code': 11000, 'errmsg': 'duplicate key'})
+            else:
+                self.documents[document['_id']] = document
+        if errors:
+            raise BulkWriteError({'writeErrors': errors, 'nInserted': len(documents) - len(errors)})
+
+
+@pytest.fixture
+def collection(monkeypatch):
+    collection = FakeCollection()
+    monkeypatch.setattr(server, 'db', {'analyses': collection})
+    return collection
+
+
+def make_buffer(**kwargs):
+    options = {'max_size': 100, 'flush_size': 10, 'flush_interval': 60}
+    options.update(kwargs)
+    return server.WriteBehindBuffer('analyses', **options)
+
+
+def test_duplicate_ids_are_dropped_and_the_rest_written(collection):
+    async def run():
+        collection.documents['b'] = {'_id': 'b'}
+        buffer = make_buffer()
+        await buffer.add([{'_id': key} for key in 'abcde'])
+        await buffer.flush()
+        return buffer.stats()
+
+    stats = asyncio.run(run())
+    assert set(collection.documents) == set('abcde')
+    assert stats['buffered'] == 0
+    assert stats['written'] == 4
+    assert stats['duplicates'] == 1
+    assert stats['failed_flushes'] == 0
+
+
+def test_failed_documents_are_retried(collection):
+    async def run():
+        buffer = make_buffer()
+        collection.fail = BulkWriteError({'writeErrors': [{'index': 1, 'code': 121, 'errmsg': 'validation'}]})
+        await buffer.add([{'_id': key} for key in 'abc'])
+        await buffer.flush()
+        first = buffer.stats()
+        await buffer.flush()
+        return first, buffer.stats()
+
+    first, second = asyncio.run(run())
+    assert first['buffered'] == 1
+    assert first['failed_flushes'] == 1
+    assert second['buffered'] == 0
+    assert set(collection.documents) == {'b'}
+
+
+def test_connection_failure_keeps_the_batch(collection):
+    async def run():
+        buffer = make_buffer()
+        collection.fail = ConnectionError('down')
+        await buffer.add([{'_id': key} for key in 'abc'])
+        await buffer.flush()
+        buffered = buffer.stats()['buffered']
+        await buffer.flush()
+        return buffered
+
+    assert asyncio.run(run()) == 3
+    assert set(collection.documents) == set('abc')
+
+
+def test_close_waits_for_the_flush_in_progress(collection):
+    collection.delay = 0.05
+
+    async def run():
+        buffer = make_buffer(flush_size=2)
+        buffer.start()
+        await buffer.add([{'_id': key} for key in 'abcd'])
+        # Let the background flusher start writing the first batch
+        await asyncio.sleep(0.01)
+        await buffer.close()
+        return buffer.stats()
+
+    stats = asyncio.run(run())
+    assert set(collection.documents) == set('abcd')
+    assert stats['buffered'] == 0
+    assert stats['written'] == 4
+
+
+def test_add_waits_while_the_buffer_is_full(collection):
+    async def run():
+        buffer = make_buffer(max_size=2, flush_size=10)
+        await buffer.add([{'_id': 'a'}, {'_id': 'b'}])
+        blocked = asyncio.create_task(buffer.add([{'_id': 'c'}]))
+        await asyncio.sleep(0.01)
+        assert not blocked.done()
+        await buffer.flush()
+        await asyncio.wait_for(blocked, 1)
+        await buffer.flush()
+
+    asyncio.run(run())
+    assert set(collection.documents) == set('abc')